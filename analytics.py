@@ -0,0 +1,196 @@
+"""
+Shared mental health analytics for the Gaming and Mental Health Analysis Platform.
+Holds the state vocabulary, the transition impact classification and the
+statistics shape returned by extract_game_statistics, so every engine
+(MongoDB scan, columnar, batch jobs) produces identical numbers.
+"""
+
+import math
+
+# Mental health states
+MENTAL_HEALTH_STATES = ["Stressed", "Neutral", "Relaxed", "Excited", "Anxious"]
+
+# Impact classes in the order used for charts and responses
+IMPACT_CLASSES = ["positive", "negative", "neutral"]
+
+
+def transition_key(baseline, after):
+    """Key used for a baseline -> after transition in statistics dicts"""
+    return f"{baseline} -> {after}"
+
+
+def classify_transition(baseline, after):
+    """Classify a baseline -> after transition as positive, negative or neutral impact"""
+    # Enhanced impact classification
+    # Define positive transitions (improving mental health or maintaining good state)
+    if (baseline in ["Stressed", "Anxious"] and after in ["Relaxed", "Neutral", "Excited"]) or \
+       (baseline == "Neutral" and after in ["Relaxed", "Excited"]) or \
+       (baseline in ["Relaxed", "Excited"] and after in ["Relaxed", "Excited"]):
+        return "positive"
+    # Define negative transitions (worsening mental health)
+    elif (baseline in ["Relaxed", "Excited", "Neutral"] and after in ["Stressed", "Anxious"]) or \
+         (baseline in ["Stressed", "Anxious"] and after in ["Stressed", "Anxious"]):
+        return "negative"
+    # Everything else is neutral impact (mainly maintaining neutral state)
+    else:
+        return "neutral"
+
+
+def compute_impact_stats(mental_health_transitions, total_sessions):
+    """Count and convert transitions into positive/negative/neutral impact percentages"""
+    counts = {impact: 0 for impact in IMPACT_CLASSES}
+    for key, count in mental_health_transitions.items():
+        baseline, after = key.split(" -> ")
+        counts[classify_transition(baseline, after)] += count
+    positive_impact = counts["positive"]
+    negative_impact = counts["negative"]
+    neutral_impact = counts["neutral"]
+
+    # Calculate percentages
+    min_percentage = 0.1  # Set minimum percentage to avoid zeros
+    min_negative_percentage = 5.0  # Set minimum percentage for negative impact
+
+    # Calculate raw percentages
+    positive_percentage = (positive_impact / total_sessions) * 100 if total_sessions > 0 else 0
+    negative_percentage = (negative_impact / total_sessions) * 100 if total_sessions > 0 else 0
+    neutral_percentage = (neutral_impact / total_sessions) * 100 if total_sessions > 0 else 0
+
+    # Apply minimum threshold to any zero values
+    if positive_percentage == 0:
+        positive_percentage = min_percentage
+    if negative_percentage < min_negative_percentage:
+        negative_percentage = min_negative_percentage
+    if neutral_percentage == 0:
+        neutral_percentage = min_percentage
+
+    # Normalize to ensure total is 100% if values were adjusted
+    total = positive_percentage + negative_percentage + neutral_percentage
+    if total != 100 and total > 0:
+        scaling_factor = 100 / total
+        positive_percentage *= scaling_factor
+        negative_percentage *= scaling_factor
+        neutral_percentage *= scaling_factor
+
+    return {
+        "positive_impact": positive_impact,
+        "negative_impact": negative_impact,
+        "neutral_impact": neutral_impact,
+        "positive_percentage": positive_percentage,
+        "negative_percentage": negative_percentage,
+        "neutral_percentage": neutral_percentage,
+    }
+
+
+def build_statistics(game, mental_health_transitions, total_sessions, avg_duration):
+    """Assemble the statistics dict returned by extract_game_statistics"""
+    if not total_sessions:
+        return {
+            "game_info": game,
+            "sessions": [],
+            "mental_health_impact": {},
+            "no_data": True
+        }
+
+    return {
+        "game_info": game,
+        "sessions": {
+            "total": total_sessions,
+            "avg_duration": avg_duration
+        },
+        "mental_health_transitions": mental_health_transitions,
+        "mental_health_impact": compute_impact_stats(mental_health_transitions, total_sessions),
+        "no_data": False
+    }
+
+
+def new_game_counters():
+    """Empty per-game counters: session count, duration sum and count, and transition counts"""
+    return {"sessions": 0, "duration_total": 0, "duration_count": 0, "transitions": {}}
+
+
+def add_to_counters(counters, baseline, after, duration, count=1):
+    """Fold sessions into per-game counters; sessions from unknown players only count towards the total"""
+    counters["sessions"] += count
+    if baseline:
+        key = transition_key(baseline, after)
+        counters["transitions"][key] = counters["transitions"].get(key, 0) + count
+        counters["duration_total"] += duration
+        counters["duration_count"] += count
+
+
+def counters_to_statistics(game, counters):
+    """Build extract_game_statistics output from per-game counters"""
+    avg_duration = counters["duration_total"] / counters["duration_count"] if counters["duration_count"] else 0
+    return build_statistics(game, dict(counters["transitions"]), counters["sessions"], avg_duration)
+
+
+def aggregate_game_counters(sessions_collection, match=None, session=None):
+    """Compute per-game counters for every game with one grouped aggregation
+
+    Sessions are first collapsed per (game, player, outcome) so the players
+    $lookup runs once per distinct player rather than once per session.
+    session is an optional pymongo ClientSession to read in (a snapshot session, say).
+    """
+    pipeline = []
+    if match:
+        pipeline.append({"$match": match})
+    pipeline += [
+        {"$group": {
+            "_id": {"game": "$game_id", "player": "$player_id", "after": "$mental_health_after"},
+            "count": {"$sum": 1},
+            "duration": {"$sum": "$duration_minutes"}
+        }},
+        {"$lookup": {"from": "players", "localField": "_id.player", "foreignField": "_id", "as": "player"}},
+        {"$unwind": {"path": "$player", "preserveNullAndEmptyArrays": True}},
+        {"$group": {
+            "_id": {"game": "$_id.game", "baseline": "$player.baseline_mental_health", "after": "$_id.after"},
+            "count": {"$sum": "$count"},
+            "duration": {"$sum": "$duration"}
+        }}
+    ]
+
+    counters = {}
+    for row in sessions_collection.aggregate(pipeline, allowDiskUse=True, session=session):
+        game_counters = counters.setdefault(row["_id"]["game"], new_game_counters())
+        add_to_counters(game_counters, row["_id"].get("baseline"), row["_id"]["after"], row["duration"], row["count"])
+    return counters
+
+
+def wilson_lower_bound(successes, trials, z=1.96):
+    """Lower bound of the Wilson score interval for a success rate; 0 when there are no trials"""
+    if trials <= 0:
+        return 0.0
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    centre = p + z * z / (2 * trials)
+    margin = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials))
+    return (centre - margin) / denominator
+
+
+# Age bands used for cohort filters, as (label, lowest age, highest age)
+AGE_BANDS = [("18-24", 18, 24), ("25-34", 25, 34), ("35-44", 35, 44), ("45-54", 45, 54), ("55+", 55, 200)]
+AGE_BAND_LABELS = [label for label, _, _ in AGE_BANDS]
+COHORT_DIMENSIONS = ("age_band", "gender", "baseline")
+
+
+def cohort_key(cohort):
+    """Stable string for a cohort filter dict, for cache keys and ETags; empty for no filter"""
+    if not cohort:
+        return ""
+    return ";".join(f"{dim}={','.join(sorted(cohort[dim]))}" for dim in COHORT_DIMENSIONS if cohort.get(dim))
+
+
+# Session duration buckets, as (label, lowest ratio, highest ratio) of the game's design session length
+DURATION_BUCKETS = [
+    ("0-25%", 0.0, 0.25), ("25-50%", 0.25, 0.5), ("50-75%", 0.5, 0.75), ("75-100%", 0.75, 1.0),
+    ("100-125%", 1.0, 1.25), ("125-150%", 1.25, 1.5), ("150-200%", 1.5, 2.0), ("200%+", 2.0, None)
+]
+
+
+def duration_bucket(duration, design_minutes):
+    """Index into DURATION_BUCKETS for a session duration; games without a design length count as 100%"""
+    ratio = duration / design_minutes if design_minutes else 1.0
+    for index, (_, low, high) in enumerate(DURATION_BUCKETS):
+        if high is None or ratio < high:
+            return index
+    return len(DURATION_BUCKETS) - 1
@@ -1,40 +1,100 @@
 import os
 import json
+import time
+import threading
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
-import google.generativeai as genai
-from pymongo import MongoClient
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse, ORJSONResponse
 from pydantic import BaseModel
-import pandas as pd
-import numpy as np
-import uvicorn
+from llm import get_llm_provider
+from llm_parsing import generate_json, LLMParseError
+import llm_budget
+import metrics
+from analytics import cohort_key
+from ingest import SessionBatcher, MentalHealthState, add_ingestion
+from live_updates import GameCounterStream, add_live_updates
+from profiling import add_profiling, require_admin, run_in_threadpool
+from cache import create_cache
+from data_versions import DataVersions, etag_for, etag_matches
+from recommendations import RecommendationIndex, add_recommendations, cohort_query
+from history import add_history
+from duration_effect import DurationEffectIndex, add_duration_effect, describe_optimal
+from sketches import SketchIndex
+import mongo_monitor
+import game_stats
+import database
 
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini API
-api_key = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=api_key)
+# The database override used by benchmarks and tests; normally the shared client in database.py
+_db = None
 
-# Connect to MongoDB
-mongo_uri = os.getenv("MONGODB_URI")
-db_name = os.getenv("DATABASE_NAME")
-client = MongoClient(mongo_uri)
-db = client[db_name]
+def get_db(workload="default"):
+    """Return the application database, connecting on first use"""
+    if _db is not None:
+        return _db
+    return database.get_database(workload)
+
+def set_db(db):
+    """Point the app at another database (benchmarks, tests)"""
+    global _db
+    _db = db
+
+def get_client():
+    return get_db().client
 
 # Collections
-players_collection = db["players"]
-games_collection = db["games"]
-sessions_collection = db["sessions"]
+def get_players_collection():
+    return get_db()["players"]
+
+def get_games_collection():
+    return get_db()["games"]
+
+def get_sessions_collection():
+    return get_db()["sessions"]
+
+def get_markov_collection():
+    # Written by the markov.py batch job
+    return get_db()["markov_transitions"]
+
+# Analytics engine: "mongo" scans sessions per request, "columnar" serves from in-memory NumPy columns
+ANALYTICS_ENGINE = os.getenv("ANALYTICS_ENGINE", "mongo").lower()
+COLUMNAR_REFRESH_SECONDS = float(os.getenv("COLUMNAR_REFRESH_SECONDS", 5))
+columnar_store = None
+columnar_refreshed_at = 0.0
+columnar_lock = threading.Lock()
+
+# Similar-games index over profile vectors, built on first use (it needs NumPy)
+similarity_index = None
+similarity_lock = threading.Lock()
+
+# Cohort bitmap index on top of the columnar store (see cohorts.py), also built on first use
+cohort_index = None
+cohort_lock = threading.Lock()
+
+# Shared result cache (see cache.py); analyses are cached longer than statistics because they cost an LLM call
+CACHE_ANALYSIS_TTL_SECONDS = float(os.getenv("CACHE_ANALYSIS_TTL_SECONDS", 3600))
+CACHE_FALLBACK_TTL_SECONDS = 60
+CACHE_WARMUP = os.getenv("CACHE_WARMUP", "1") == "1"
+API_WORKERS = int(os.getenv("API_WORKERS", 1))
+result_cache = create_cache(get_db)
+
+# HTTP caching: ETags come from per-game data versions, so unchanged data is answered with 304
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", 30))
+CACHE_CONTROL = f"public, max-age={HTTP_CACHE_MAX_AGE}"
+data_versions = DataVersions(get_db)
 
 # Create FastAPI app
 app = FastAPI(
     title="Game Mental Health Analysis API",
     description="API for analyzing the effect of games on mental health",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -46,6 +106,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large chart payloads
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Record latency and status for every request, labelled by route template"""
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    path = route.path if route else "unmatched"
+    metrics.observe("http_request_duration_seconds", time.perf_counter() - start, method=request.method, path=path)
+    metrics.inc("http_requests_total", method=request.method, path=path, status=response.status_code)
+    return response
+
+# Opt-in per-request profiling (enabled by PROFILE_ADMIN_TOKEN)
+add_profiling(app)
+
 # Pydantic models
 class GameAnalysisRequest(BaseModel):
     game_name: str
@@ -55,142 +132,136 @@ class ChartData(BaseModel):
     chart_type: str  # "bar", "pie", "line", etc.
     data: Dict[str, Any]
     
+# The JSON the analysis prompt asks the LLM for
+class LLMAnalysis(BaseModel):
+    summary: str
+    recommendations: List[str]
+
 class GameAnalysisResponse(BaseModel):
     game_name: str
     summary: str
     mental_health_impact: Dict[str, Any]
+    impact_confidence: Optional[Dict[str, Any]] = None
+    approximate: Optional[Dict[str, Any]] = None
     recommendations: List[str]
     charts: List[ChartData]
 
+class SimilarGame(BaseModel):
+    game_name: str
+    genre: str
+    similarity: float
+
+class SimilarGamesResponse(BaseModel):
+    game_name: str
+    similar: List[SimilarGame]
+
+class MarkovTransitionsResponse(BaseModel):
+    game_name: str
+    states: List[str]
+    counts: List[List[int]]
+    probabilities: List[List[float]]
+    pairs: int
+    computed_at: datetime
+
+def get_columnar_store():
+    """Return the columnar engine, loading it on first use and refreshing it periodically"""
+    global columnar_store, columnar_refreshed_at
+    with columnar_lock:
+        if columnar_store is None:
+            # NumPy is only needed by the columnar engine, so it is imported on first use
+            from columnar import ColumnarSessionStore
+            print("Loading sessions into the columnar analytics engine...")
+            columnar_store = ColumnarSessionStore().load(get_games_collection(), get_players_collection(), get_sessions_collection())
+            columnar_refreshed_at = time.monotonic()
+            print(f"Columnar engine ready: {columnar_store.size} sessions, {columnar_store.memory_bytes() / 1024 / 1024:.1f} MB")
+        elif not live_stream.active and time.monotonic() - columnar_refreshed_at > COLUMNAR_REFRESH_SECONDS:
+            columnar_store.refresh(get_games_collection(), get_players_collection(), get_sessions_collection())
+            columnar_refreshed_at = time.monotonic()
+    return columnar_store
+
+def get_cohort_index():
+    """Return the cohort bitmap index over the columnar store, catching up on new players and sessions"""
+    global cohort_index
+    store = get_columnar_store()
+    with cohort_lock:
+        if cohort_index is None or cohort_index.store is not store:
+            from cohorts import CohortIndex
+            cohort_index = CohortIndex(store)
+        cohort_index.sync_players(get_players_collection())
+        cohort_index.index_sessions()
+    return cohort_index
+
+def cohort_outcomes(baseline, cohort):
+    """Per-game outcome counts for /recommend restricted to a cohort, from the bitmap index
+
+    Cached per cohort and store size, the columnar store's data version, whichever engine serves /analyze.
+    """
+    index = get_cohort_index()
+    key = f"outcomes:{baseline}:{cohort_key(cohort)}:{index.store.size}"
+    return result_cache.get_or_compute(key, lambda: index.outcome_cells(baseline, cohort))
+
+def get_similarity_index():
+    """Return the similar-games index, creating it on first use"""
+    global similarity_index
+    with similarity_lock:
+        if similarity_index is None:
+            from similarity import SimilarityIndex
+            similarity_index = SimilarityIndex(get_db)
+    return similarity_index
+
+@metrics.timed("extract_game_statistics")
 def extract_game_statistics(game_name: str):
     """Extract statistics for a specific game from the database"""
     
+    if ANALYTICS_ENGINE == "columnar":
+        return get_columnar_store().game_statistics(game_name)
+    
     # Find game by name
-    game = games_collection.find_one({"name": game_name})
+    with metrics.span("mongo_find_game"):
+        game = get_games_collection().find_one({"name": game_name})
     if not game:
         return None
     
-    # Get sessions for this game
-    sessions = list(sessions_collection.find({"game_id": game["_id"]}))
-    
-    if not sessions:
-        return {
-            "game_info": game,
-            "sessions": [],
-            "mental_health_impact": {},
-            "no_data": True
-        }
-    
-    # Get player IDs from sessions
-    player_ids = [session["player_id"] for session in sessions]
-    
-    # Get player information
-    players = list(players_collection.find({"_id": {"$in": player_ids}}))
-    player_dict = {str(player["_id"]): player for player in players}
-    
-    # Analyze mental health transitions
-    mental_health_transitions = {}
-    session_durations = []
-    
-    for session in sessions:
-        player_id = str(session["player_id"])
-        if player_id in player_dict:
-            player = player_dict[player_id]
-            baseline = player["baseline_mental_health"]
-            after = session["mental_health_after"]
-            
-            key = f"{baseline} -> {after}"
-            if key not in mental_health_transitions:
-                mental_health_transitions[key] = 0
-            mental_health_transitions[key] += 1
-            
-            session_durations.append(session["duration_minutes"])
-    
-    # Calculate impact percentages
-    total_sessions = len(sessions)
-    positive_impact = 0
-    negative_impact = 0
-    neutral_impact = 0
-    for key, count in mental_health_transitions.items():
-        baseline, after = key.split(" -> ")
-        
-        # Enhanced impact classification
-        # Define positive transitions (improving mental health or maintaining good state)
-        if (baseline in ["Stressed", "Anxious"] and after in ["Relaxed", "Neutral", "Excited"]) or \
-           (baseline == "Neutral" and after in ["Relaxed", "Excited"]) or \
-           (baseline in ["Relaxed", "Excited"] and after in ["Relaxed", "Excited"]):
-            positive_impact += count
-        # Define negative transitions (worsening mental health)
-        elif (baseline in ["Relaxed", "Excited", "Neutral"] and after in ["Stressed", "Anxious"]) or \
-             (baseline in ["Stressed", "Anxious"] and after in ["Stressed", "Anxious"]):
-            negative_impact += count
-        # Everything else is neutral impact (mainly maintaining neutral state)
-        else:
-            neutral_impact += count# Calculate percentages
-    min_percentage = 0.1  # Set minimum percentage to avoid zeros
-    min_negative_percentage = 5.0  # Set minimum percentage for negative impact
-    
-    # Calculate raw percentages
-    positive_percentage = (positive_impact / total_sessions) * 100 if total_sessions > 0 else 0
-    negative_percentage = (negative_impact / total_sessions) * 100 if total_sessions > 0 else 0
-    neutral_percentage = (neutral_impact / total_sessions) * 100 if total_sessions > 0 else 0
-    
-    # Apply minimum threshold to any zero values
-    if positive_percentage == 0:
-        positive_percentage = min_percentage
-    if negative_percentage < min_negative_percentage:
-        negative_percentage = min_negative_percentage
-    if neutral_percentage == 0:
-        neutral_percentage = min_percentage
-        
-    # Normalize to ensure total is 100% if values were adjusted
-    total = positive_percentage + negative_percentage + neutral_percentage
-    if total != 100 and total > 0:
-        scaling_factor = 100 / total
-        positive_percentage *= scaling_factor
-        negative_percentage *= scaling_factor
-        neutral_percentage *= scaling_factor
-    
-    impact_stats = {
-        "positive_impact": positive_impact,
-        "negative_impact": negative_impact,
-        "neutral_impact": neutral_impact,
-        "positive_percentage": positive_percentage,
-        "negative_percentage": negative_percentage,
-        "neutral_percentage": neutral_percentage,
-    }
-    
-    # Calculate average session duration
-    avg_duration = sum(session_durations) / len(session_durations) if session_durations else 0
-    
-    # Compile statistics
-    statistics = {
-        "game_info": game,
-        "sessions": {
-            "total": total_sessions,
-            "avg_duration": avg_duration
-        },
-        "mental_health_transitions": mental_health_transitions,
-        "mental_health_impact": impact_stats,
-        "no_data": False
-    }
-    
-    return statistics
+    # Per-game counters kept up to date by the ingest batcher, rebuilt if other writes left them behind
+    with metrics.span("mongo_game_stats"):
+        return game_stats.game_statistics(get_db(), game)
 
-def analyze_game_with_gemini(game_statistics):
-    """Use Gemini to analyze the game statistics"""
+@metrics.timed("analyze_game_with_gemini")
+def analyze_game_with_gemini(game_statistics, duration_effect=None, priority=llm_budget.BACKGROUND):
+    """Use Gemini to analyze the game statistics (and the game's duration-response curve, if given)
+
+    priority is the llm_budget priority of the call; /analyze passes INTERACTIVE.
+    """
     
     if game_statistics.get("no_data", False):
         return {
             "summary": f"Insufficient data available for {game_statistics['game_info']['name']}. No sessions have been recorded yet.",
             "recommendations": ["Try playing this game and recording sessions to get an analysis."],
-            "charts": []
+            "charts": [],
+            "fallback": True
         }
     
-    model = genai.GenerativeModel('gemini-2.0-flash')
+    llm = get_llm_provider()
     
     game_info = game_statistics["game_info"]
     
+    # Precomputed duration buckets, so the optimal-duration advice is grounded in the data
+    optimal_duration = describe_optimal(duration_effect)
+    duration_section = ""
+    if optimal_duration:
+        curve = "\n".join(
+            f"    - {bucket['label']}: {bucket['sessions']} sessions, {round(bucket['positive_rate'] * 100, 1)}% positive, {round(bucket['negative_rate'] * 100, 1)}% negative"
+            for bucket in duration_effect["curve"] if bucket["sessions"]
+        )
+        duration_section = f"""
+    SESSION DURATION EFFECT (session length as a share of the design length):
+{curve}
+    - Best outcomes: {optimal_duration}
+    """
+    
+    # One "A -> B: n" line per transition costs a fraction of the tokens of indented JSON
+    transitions = "\n".join(f"    - {key}: {count}" for key, count in game_statistics['mental_health_transitions'].items())
+    
     # Prepare a detailed prompt with the statistics
     prompt = f"""
     You are a data scientist specializing in human-computer interaction and mental health. 
@@ -212,8 +283,9 @@ def analyze_game_with_gemini(game_statistics):
     - Negative Impact: {round(game_statistics['mental_health_impact']['negative_percentage'], 2)}%
     - Neutral Impact: {round(game_statistics['mental_health_impact']['neutral_percentage'], 2)}%
     
-    MENTAL HEALTH TRANSITIONS:
-    {json.dumps(game_statistics['mental_health_transitions'], indent=2)}
+    MENTAL HEALTH TRANSITIONS (baseline -> after: sessions):
+{transitions}
+    {duration_section}
     
     Please provide:
     
@@ -238,25 +310,13 @@ def analyze_game_with_gemini(game_statistics):
     """
     
     try:
-        response = model.generate_content(prompt)
-        analysis_text = response.text
-        
-        # Extract and parse JSON from the response
-        if "```json" in analysis_text:
-            json_text = analysis_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in analysis_text:
-            json_text = analysis_text.split("```")[1].split("```")[0].strip()
-        else:
-            # Try to find JSON block
-            start_idx = analysis_text.find('{')
-            end_idx = analysis_text.rfind('}') + 1
-            if start_idx != -1 and end_idx > start_idx:
-                json_text = analysis_text[start_idx:end_idx]
-            else:
-                raise ValueError("Couldn't find valid JSON in response")
-        
-        # Parse the extracted JSON
-        analysis_json = json.loads(json_text)
+        # Parse and validate the JSON while the response streams in
+        try:
+            with llm_budget.priority(priority):
+                analysis_json = generate_json(llm, prompt, LLMAnalysis).model_dump()
+        except LLMParseError:
+            metrics.inc("llm_parse_failures_total", path="analyze_game")
+            raise
         
         # Add chart data for visualization
         analysis_json["charts"] = create_chart_data(game_statistics)
@@ -265,19 +325,23 @@ def analyze_game_with_gemini(game_statistics):
     
     except Exception as e:
         print(f"Error analyzing game with Gemini: {e}")
+        metrics.inc("llm_fallbacks_total", path="analyze_game")
         # Fallback to simple analysis
         return {
             "summary": f"Analysis of {game_info['name']} shows that it has a {round(game_statistics['mental_health_impact']['positive_percentage'])}% positive impact on mental health based on {game_statistics['sessions']['total']} recorded sessions.",
             "recommendations": [
+                f"Aim for sessions of {optimal_duration}" if optimal_duration else
                 f"Keep sessions under {int(game_statistics['sessions']['avg_duration'] * 1.2)} minutes to avoid fatigue",
                 "Take regular breaks to stretch and rest your eyes",
                 "Play in a well-lit room to reduce eye strain",
                 "Set clear time limits before starting play sessions",
                 "Consider playing with friends for a more enjoyable experience"
             ],
-            "charts": create_chart_data(game_statistics)
+            "charts": create_chart_data(game_statistics),
+            "fallback": True
         }
 
+@metrics.timed("create_chart_data")
 def create_chart_data(game_statistics):
     """Create chart data for visualizations"""
     charts = []
@@ -315,51 +379,313 @@ def create_chart_data(game_statistics):
     
     return charts
 
+def with_confidence(game_statistics):
+    """Attach raw impact rates with confidence intervals (see confidence.py) to a statistics dict"""
+    if game_statistics:
+        # NumPy is only needed here, so confidence is imported on first use
+        from confidence import add_confidence
+        add_confidence([game_statistics])
+    return game_statistics
+
+def stats_cache_key(game_name: str, version=None):
+    return f"stats:{game_name}:{version}" if version else f"stats:{game_name}"
+
+def get_game_statistics(game_name: str, version=None):
+    """Game statistics with their confidence intervals through the shared cache
+
+    Passing the game's data version keys the entry by it, so new sessions are never served stale. Without one the
+    columnar engine, which is live, is read directly; the intervals' bootstrap is what the cache saves there.
+    """
+    if ANALYTICS_ENGINE == "columnar" and not version:
+        return with_confidence(extract_game_statistics(game_name))
+    return result_cache.get_or_compute(stats_cache_key(game_name, version),
+                                       lambda: with_confidence(extract_game_statistics(game_name)))
+
+def get_cohort_statistics(game_name: str, cohort, version=None):
+    """Game statistics restricted to a cohort, from the bitmap index and cached per data version"""
+    key = f"stats:{game_name}:{version}:{cohort_key(cohort)}"
+    return result_cache.get_or_compute(key, lambda: with_confidence(get_cohort_index().game_statistics(game_name, cohort)))
+
+def get_duration_effect(game_name: str):
+    """The game's duration-response curve, or None if it can't be read; the analysis works without it"""
+    try:
+        return duration_effect_index.curve(game_name)
+    except Exception as e:
+        print(f"Error reading duration effect for {game_name}: {e}")
+        return None
+
+def get_game_analysis(game_name: str, game_statistics, cohort=None, priority=llm_budget.BACKGROUND, version=None,
+                      approx=False):
+    """LLM analysis through the shared cache; fallback answers expire quickly so the LLM is retried
+
+    Passing the game's data version keys the entry by it, so the summary always describes the current statistics.
+    Sketch-based (approx) statistics get entries of their own.
+    """
+    key = f"analysis:{game_name}:approx" if approx else f"analysis:{game_name}"
+    if version:
+        key += f":{version}"
+    if cohort:
+        key += f":{cohort_key(cohort)}"
+    # The duration curve covers all players, so it is only given for whole-population analyses
+    return result_cache.get_or_compute(
+        key,
+        lambda: analyze_game_with_gemini(game_statistics, None if cohort else get_duration_effect(game_name), priority),
+        ttl=lambda analysis: CACHE_FALLBACK_TTL_SECONDS if analysis.get("fallback") else CACHE_ANALYSIS_TTL_SECONDS
+    )
+
+def warm_cache():
+    """Precompute statistics for every game so the first requests are served from the cache"""
+    start = time.perf_counter()
+    names = [game["name"] for game in get_games_collection().find({}, {"name": 1})]
+    if ANALYTICS_ENGINE == "columnar":
+        get_columnar_store()
+    # Each game is computed by whichever worker takes its lease first; the others skip it
+    batch = {}
+    leases = {}
+    try:
+        for name in names:
+            try:
+                key = stats_cache_key(name, data_versions.version(name))
+                if result_cache.get(key) is not None:
+                    continue
+                token = result_cache.acquire_lease(key)
+                if token is None:
+                    continue
+                leases[key] = token
+                batch[key] = extract_game_statistics(name)
+            except Exception as e:
+                print(f"Cache warmup failed for {name}: {e}")
+        # Confidence intervals for every game in one vectorised pass, stored with the statistics
+        from confidence import add_confidence
+        add_confidence(list(batch.values()))
+        for key, game_statistics in batch.items():
+            if game_statistics is not None:
+                result_cache.set(key, game_statistics)
+    finally:
+        for key, token in leases.items():
+            result_cache.release_lease(key, token)
+    try:
+        recommendation_index.ensure_fresh()
+    except Exception as e:
+        print(f"Recommendation index warmup failed: {e}")
+    try:
+        duration_effect_index.ensure_fresh()
+    except Exception as e:
+        print(f"Duration effect warmup failed: {e}")
+    try:
+        sketch_index.ensure_fresh()
+    except Exception as e:
+        print(f"Sketch warmup failed: {e}")
+    print(f"Cache warmed with statistics for {len(names)} games in {time.perf_counter() - start:.2f}s")
+
+def start_cache_warmup():
+    if CACHE_WARMUP:
+        # In the background, so the worker reports healthy straight away
+        threading.Thread(target=warm_cache, name="cache-warmup", daemon=True).start()
+
+app.add_event_handler("startup", start_cache_warmup)
+
+def publish_sessions(sessions):
+    """Feed newly stored sessions (with their player's baseline) to the in-memory indexes"""
+    data_versions.apply(sessions)
+    recommendation_index.apply(sessions)
+    duration_effect_index.apply(sessions)
+    sketch_index.apply(sessions)
+    if similarity_index is not None:
+        similarity_index.apply(sessions)
+    if columnar_store is not None:
+        # Serialised with refreshes; the store drops any session a refresh already picked up
+        with columnar_lock:
+            columnar_store.apply_sessions(sessions, get_players_collection())
+
+def publish_ingested_sessions(sessions):
+    """Publish sessions flushed by the ingest batcher, unless the change stream will deliver them"""
+    if not live_stream.active:
+        publish_sessions(sessions)
+
+# Recommendations: per-(baseline, game) outcome table ranked by Wilson lower bound
+recommendation_index = RecommendationIndex(get_db)
+add_recommendations(app, recommendation_index, cohort_outcomes)
+
+# Duration-response curves: per-game duration bucket x outcome histograms
+duration_effect_index = DurationEffectIndex(get_db)
+add_duration_effect(app, duration_effect_index)
+
+# Fixed-size per-game sketches for /analyze?approx=true
+sketch_index = SketchIndex(get_db)
+
+# Live per-game counters from the sessions change stream (enabled by LIVE_UPDATES=1)
+live_stream = GameCounterStream(get_db)
+live_stream.add_listener(publish_sessions)
+add_live_updates(app, live_stream)
+
+# Session ingestion: micro-batched inserts with backpressure
+session_batcher = SessionBatcher(lambda: get_db("ingest"))
+session_batcher.add_listener(publish_ingested_sessions)
+add_ingestion(app, session_batcher)
+
+# Per-player session history with keyset pagination
+add_history(app, get_db)
+
 # FastAPI Endpoints
 @app.get("/")
 async def root():
     return {"message": "Game Mental Health Analysis API is running. Use /games to list available games or /analyze/{game_name} to analyze a specific game."}
 
+@app.get("/health")
+async def health(deep: bool = False):
+    """Readiness probe; answers without touching MongoDB unless deep=true"""
+    if deep:
+        try:
+            await run_in_threadpool(get_client().admin.command, "ping")
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"MongoDB unavailable: {e}")
+    return {"status": "ok"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Expose hot-path timings and counters in the Prometheus text format"""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/slow-queries")
+async def slow_queries(request: Request):
+    """Explain captured slow queries and flag collection scans and missing indexes"""
+    require_admin(request)
+    if mongo_monitor.listener is None:
+        raise HTTPException(status_code=404, detail="Slow query capture is disabled; set MONGO_SLOW_QUERY_MS")
+    report = await run_in_threadpool(mongo_monitor.build_report, get_client())
+    return json.loads(json.dumps(report, default=str))
+
+def not_modified(etag):
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
 @app.get("/games", response_model=List[str])
-async def list_games():
+async def list_games(request: Request, response: Response):
     """Get a list of all available games in the database"""
-    games = games_collection.find({}, {"name": 1})
-    return [game["name"] for game in games]
+    names, etag = await run_in_threadpool(data_versions.games)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return names
+
+@app.get("/games/{game_name}/similar", response_model=SimilarGamesResponse)
+def similar_games(game_name: str, limit: int = Query(5, ge=1, le=50)):
+    """Games whose transition profile, session length and genre are closest to this one"""
+    similar = get_similarity_index().similar(game_name, limit)
+    if similar is None:
+        raise HTTPException(status_code=404, detail=f"Game '{game_name}' not found")
+    return {"game_name": game_name, "similar": similar}
+
+@app.get("/games/{game_name}/markov", response_model=MarkovTransitionsResponse)
+def markov_transitions(game_name: str):
+    """Transition matrix between the states of a player's consecutive sessions, as computed by markov.py"""
+    game_id = data_versions.game_id(game_name)
+    if game_id is None:
+        raise HTTPException(status_code=404, detail=f"Game '{game_name}' not found")
+    transitions = get_markov_collection().find_one({"_id": game_id})
+    if transitions is None:
+        raise HTTPException(status_code=404, detail=f"No transition matrix for '{game_name}' yet; run python markov.py")
+    return transitions
 
 @app.get("/analyze/{game_name}", response_model=GameAnalysisResponse)
-async def analyze_game(game_name: str):
-    """Analyze the mental health impact of a specific game"""
-    # Extract game statistics
-    game_statistics = extract_game_statistics(game_name)
+async def analyze_game(game_name: str, request: Request, response: Response,
+                       cohort: dict = Depends(cohort_query),
+                       baseline: List[MentalHealthState] = Query(None),
+                       approx: bool = False):
+    """Analyze the mental health impact of a specific game, optionally for a cohort of players
+
+    With approx=true the statistics come from fixed-size sketches and carry error bounds.
+    """
+    if baseline:
+        cohort["baseline"] = baseline
+    if approx and cohort:
+        raise HTTPException(status_code=400, detail="approx=true can't be combined with cohort filters")
+    if approx and not sketch_index.ensure_fresh():
+        # The sketches are still being built in the background; exact statistics answer meanwhile
+        approx = False
+    # Answer revalidations from the data version alone, before any statistics or LLM work
+    if approx:
+        version = await run_in_threadpool(sketch_index.version, game_name)
+    else:
+        version = await run_in_threadpool(data_versions.version, game_name, live_stream.active)
+    if version is None:
+        raise HTTPException(status_code=404, detail=f"Game '{game_name}' not found")
+    etag = etag_for(f"{version}|{cohort_key(cohort)}" if cohort else version)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    
+    # Extract game statistics (cached, and off the event loop since it may wait on another worker)
+    if approx:
+        game_statistics = await run_in_threadpool(sketch_index.statistics, game_name)
+    elif cohort:
+        game_statistics = await run_in_threadpool(get_cohort_statistics, game_name, cohort, version)
+    else:
+        game_statistics = await run_in_threadpool(get_game_statistics, game_name, version)
     
     if not game_statistics:
         raise HTTPException(status_code=404, detail=f"Game '{game_name}' not found")
       # Analyze with Gemini
-    analysis = analyze_game_with_gemini(game_statistics)
-    
-    # Create response
+    # Interactive priority: a user is waiting, so this call may use the LLM budget background jobs leave free
+    analysis = await run_in_threadpool(get_game_analysis, game_name, game_statistics, cohort, llm_budget.INTERACTIVE,
+                                       version, approx)
+    if analysis.get("fallback"):
+        # A fallback is replaced once the LLM answers, so it mustn't be revalidated against the data version alone
+        del response.headers["ETag"]
+        response.headers["Cache-Control"] = "no-store"
+    
+    # Create response (an empty cohort has no impact figures)
+    impact = game_statistics["mental_health_impact"]
     return {
         "game_name": game_name,
         "summary": analysis["summary"],
         "mental_health_impact": {
-            "positive": game_statistics["mental_health_impact"]["positive_percentage"],
-            "negative": game_statistics["mental_health_impact"]["negative_percentage"],
-            "neutral": game_statistics["mental_health_impact"]["neutral_percentage"]
+            "positive": impact.get("positive_percentage", 0.0),
+            "negative": impact.get("negative_percentage", 0.0),
+            "neutral": impact.get("neutral_percentage", 0.0)
         },
+        "impact_confidence": game_statistics.get("impact_confidence"),
+        "approximate": game_statistics.get("approximate"),
         "recommendations": analysis["recommendations"],
-        "charts": analysis["charts"]
+        # From the statistics of this request, not the cached analysis, so they always match the impact figures
+        "charts": create_chart_data(game_statistics)
     }
 
-def run_api():
-    """Run the FastAPI server"""
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+def run_api(workers=None):
+    """Run the FastAPI server, optionally as several worker processes"""
+    import uvicorn
+    workers = workers or API_WORKERS
+    if workers > 1:
+        # Each worker imports the app itself, so they can only share results through a cross-process cache
+        os.environ.setdefault("CACHE_BACKEND", "sqlite")
+        if os.environ["CACHE_BACKEND"].lower() == "memory":
+            print("Warning: CACHE_BACKEND=memory is per worker; use sqlite or mongo to share results")
+        print(f"Starting {workers} workers with the {os.environ['CACHE_BACKEND']} cache")
+        uvicorn.run("analyze_data:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
 
 if __name__ == "__main__":
     import sys
     
     if len(sys.argv) > 1 and sys.argv[1] == "api":
+        import argparse
+        parser = argparse.ArgumentParser(description="Run the FastAPI server")
+        parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: API_WORKERS or 1)")
+        args = parser.parse_args(sys.argv[2:])
         print("Starting FastAPI server...")
-        run_api()
+        run_api(args.workers)
+    elif len(sys.argv) > 1 and sys.argv[1] == "report":
+        import argparse
+        from report import generate_report, REPORT_CONCURRENCY
+        parser = argparse.ArgumentParser(description="Write game_mental_health_analysis.md/.html for every game")
+        parser.add_argument("--force", action="store_true", help="Regenerate every section, not just changed games")
+        parser.add_argument("--concurrency", type=int, default=REPORT_CONCURRENCY, help="Concurrent LLM calls")
+        args = parser.parse_args(sys.argv[2:])
+        generate_report(get_db(), concurrency=args.concurrency, force=args.force)
     else:
         print("Please use 'python analyze_data.py api' to run the API server")
+        print("or 'python analyze_data.py report' to write the analysis report for every game")
         print("For the Streamlit frontend, use 'streamlit run streamlit_app.py'")
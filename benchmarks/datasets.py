@@ -0,0 +1,114 @@
+"""
+Synthetic dataset seeding for the benchmark suite.
+Builds players, games and sessions of a configurable size and bulk loads them
+into a local mongod or an in-memory mongomock database.
+"""
+
+import random
+from datetime import datetime, timedelta, UTC
+
+from bson import ObjectId
+
+from analytics import MENTAL_HEALTH_STATES
+
+GAME_GENRES = ["Action", "Puzzle", "Strategy", "Simulation", "RPG", "Adventure", "Sports", "Racing", "Fighting", "Educational"]
+GAME_DIFFICULTIES = ["Easy", "Medium", "Hard"]
+
+INSERT_BATCH_SIZE = 50_000
+
+
+def connect(backend="mongomock", mongo_uri=None, db_name="bench_gaming_mental_health"):
+    """Return a (client, database) pair for the requested backend"""
+    if backend == "mongomock":
+        import mongomock
+        client = mongomock.MongoClient()
+    elif backend == "mongod":
+        from pymongo import MongoClient
+        client = MongoClient(mongo_uri or "mongodb://localhost:27017/")
+    else:
+        raise ValueError(f"Unknown backend '{backend}', expected 'mongomock' or 'mongod'")
+    return client, client[db_name]
+
+
+def make_games(count, rng):
+    """Create synthetic game documents"""
+    now = datetime.now(UTC)
+    return [
+        {
+            "_id": ObjectId(),
+            "name": f"BenchGame {i:04d}",
+            "genre": rng.choice(GAME_GENRES),
+            "type": rng.choice(["Singleplayer", "Multiplayer", "Both"]),
+            "avg_session_duration_minutes": rng.randint(5, 60),
+            "difficulty": rng.choice(GAME_DIFFICULTIES),
+            "created_at": now
+        }
+        for i in range(count)
+    ]
+
+
+def make_players(count, rng):
+    """Create synthetic player documents"""
+    now = datetime.now(UTC)
+    return [
+        {
+            "_id": ObjectId(),
+            "name": {"first": f"Player{i}", "last": "Bench"},
+            "age": rng.randint(18, 65),
+            "gender": rng.choice(["Male", "Female"]),
+            "baseline_mental_health": rng.choice(MENTAL_HEALTH_STATES),
+            "created_at": now
+        }
+        for i in range(count)
+    ]
+
+
+def iter_sessions(count, players, games, rng):
+    """Yield synthetic session documents"""
+    now = datetime.now(UTC)
+    for _ in range(count):
+        player = rng.choice(players)
+        game = rng.choice(games)
+        base_duration = game["avg_session_duration_minutes"]
+        duration = max(5, int(base_duration + rng.uniform(-0.4, 0.4) * base_duration))
+        yield {
+            "player_id": player["_id"],
+            "game_id": game["_id"],
+            "session_date": now - timedelta(days=rng.randint(0, 365)),
+            "duration_minutes": duration,
+            "mental_health_after": rng.choice(MENTAL_HEALTH_STATES),
+            "notes": "Synthetic benchmark session."
+        }
+
+
+def seed_dataset(db, sessions=10_000, players=None, games=25, seed=42):
+    """Drop and reseed the players, games and sessions collections in db"""
+    rng = random.Random(seed)
+    player_count = players or max(50, sessions // 20)
+
+    for name in ("players", "games", "sessions"):
+        db[name].drop()
+
+    game_docs = make_games(games, rng)
+    player_docs = make_players(player_count, rng)
+    db["games"].insert_many(game_docs)
+    for start in range(0, len(player_docs), INSERT_BATCH_SIZE):
+        db["players"].insert_many(player_docs[start:start + INSERT_BATCH_SIZE])
+
+    batch = []
+    for session in iter_sessions(sessions, player_docs, game_docs, rng):
+        batch.append(session)
+        if len(batch) >= INSERT_BATCH_SIZE:
+            db["sessions"].insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        db["sessions"].insert_many(batch, ordered=False)
+
+    db["sessions"].create_index("game_id")
+    db["sessions"].create_index("player_id")
+
+    return {
+        "players": player_docs,
+        "games": game_docs,
+        "session_count": sessions
+    }
@@ -0,0 +1,105 @@
+"""
+Import-time budget check for the API and generator entry points.
+
+Each module is imported in a fresh interpreter with `python -X importtime`,
+so the numbers match a cold process start. The check fails (exit code 1) if
+a module takes longer than its budget or pulls in one of the heavy
+dependencies that must only be imported on first use.
+
+Usage:
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --runs 10 --budget analyze_data=800 --verbose
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Median cold import budgets in milliseconds; FastAPI alone accounts for most of analyze_data
+BUDGETS_MS = {
+    "analyze_data": 1500,
+    "generate_data": 500,
+}
+
+# Heavy dependencies that have to stay out of the import path
+LAZY_MODULES = ["google.generativeai", "pandas", "numpy", "uvicorn", "faker", "pyarrow"]
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr):
+    """Return [(cumulative_us, self_us, module)] from -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), module.strip()))
+    return rows
+
+
+def import_once(module):
+    """Import module in a fresh interpreter and return its importtime rows"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True,
+        env={**os.environ, "DATABASE_NAME": os.getenv("DATABASE_NAME", "import_budget")}
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def check_module(module, budget_ms, runs, verbose=False):
+    """Measure a module's cold import time and return a list of budget violations"""
+    totals = []
+    rows = []
+    for _ in range(runs):
+        rows = import_once(module)
+        totals.append(next(cumulative for cumulative, _, name in rows if name == module) / 1000)
+    median_ms = statistics.median(totals)
+    loaded = {name for _, _, name in rows}
+
+    print(f"{module:<16} median {median_ms:>7.1f}ms  min {min(totals):>7.1f}ms  budget {budget_ms}ms")
+    if verbose:
+        for cumulative, self_us, name in sorted(rows, reverse=True)[:10]:
+            print(f"    {cumulative / 1000:>8.1f}ms  (self {self_us / 1000:>6.1f}ms)  {name.strip()}")
+
+    violations = []
+    if median_ms > budget_ms:
+        violations.append(f"{module} imports in {median_ms:.1f}ms, over its {budget_ms}ms budget")
+    for heavy in LAZY_MODULES:
+        if heavy in loaded:
+            violations.append(f"{module} eagerly imports {heavy}")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check cold import times against their budgets")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--budget", action="append", default=[], metavar="MODULE=MS",
+                        help="Override a module budget, e.g. analyze_data=800")
+    parser.add_argument("--verbose", action="store_true", help="Show the slowest imports per module")
+    args = parser.parse_args()
+
+    budgets = dict(BUDGETS_MS)
+    for override in args.budget:
+        module, _, ms = override.partition("=")
+        budgets[module] = float(ms)
+
+    violations = []
+    for module, budget_ms in budgets.items():
+        violations += check_module(module, budget_ms, args.runs, args.verbose)
+
+    if violations:
+        print("\nImport budget exceeded:")
+        for violation in violations:
+            print(f"- {violation}")
+        sys.exit(1)
+    print("\nAll imports within budget")
+
+
+if __name__ == "__main__":
+    main()
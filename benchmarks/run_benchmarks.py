@@ -0,0 +1,204 @@
+"""
+Benchmark suite for the analytics and generation hot paths.
+
+Usage:
+    python -m benchmarks.run_benchmarks --sessions 100000
+    python -m benchmarks.run_benchmarks --backend mongod --sessions 1000000 --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, UTC
+
+from benchmarks import datasets
+
+MEMORY_SAMPLE_CALLS = 20
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def measure(name, func, iterations, warmup=3):
+    """Time func over iterations calls and report throughput, latency percentiles and peak memory"""
+    for i in range(min(warmup, iterations)):
+        func(i)
+
+    latencies = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        call_start = time.perf_counter_ns()
+        func(i)
+        latencies.append((time.perf_counter_ns() - call_start) / 1e6)
+    elapsed = time.perf_counter() - start
+
+    # Memory is sampled in a separate pass so tracing overhead doesn't skew latency
+    tracemalloc.start()
+    for i in range(min(MEMORY_SAMPLE_CALLS, iterations)):
+        func(i)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    result = {
+        "name": name,
+        "iterations": iterations,
+        "total_seconds": elapsed,
+        "throughput_per_second": iterations / elapsed if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "mean": statistics.fmean(latencies),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1]
+        },
+        "peak_memory_bytes": peak
+    }
+    print(f"{name:<28} {result['throughput_per_second']:>10.1f}/s  "
+          f"p50 {result['latency_ms']['p50']:>9.3f}ms  p95 {result['latency_ms']['p95']:>9.3f}ms  "
+          f"p99 {result['latency_ms']['p99']:>9.3f}ms  peak {peak / 1024 / 1024:>8.2f}MB")
+    return result
+
+
+def bind_analyze_data(db, seed):
+    """Import analyze_data and point it at the benchmark database and the fake LLM provider"""
+    import analyze_data
+    from llm import FakeProvider, set_llm_provider
+
+    analyze_data.set_db(db)
+    # FAKE_LLM_LATENCY etc. still apply, so LLM-bound runs can be simulated too
+    set_llm_provider(FakeProvider(seed=seed))
+    return analyze_data
+
+
+def run_suite(args):
+    """Seed the dataset and run every benchmark"""
+    client, db = datasets.connect(args.backend, args.mongo_uri, args.db_name)
+
+    print(f"Seeding {args.sessions} sessions into {args.backend}...")
+    seed_start = time.perf_counter()
+    dataset = datasets.seed_dataset(db, sessions=args.sessions, players=args.players,
+                                    games=args.games, seed=args.seed)
+    seed_seconds = time.perf_counter() - seed_start
+    print(f"Seeded in {seed_seconds:.2f}s\n")
+
+    analyze_data = bind_analyze_data(db, args.seed)
+    import generate_data
+
+    game_names = [game["name"] for game in dataset["games"]]
+    players = dataset["players"]
+    games = dataset["games"]
+    rng = random.Random(args.seed)
+    session_date = datetime.now(UTC)
+
+    sample_statistics = [analyze_data.extract_game_statistics(name) for name in game_names]
+    from columnar import ColumnarSessionStore
+    columnar_store = ColumnarSessionStore().load(db["games"], db["players"], db["sessions"])
+    from fastapi.testclient import TestClient
+    api = TestClient(analyze_data.app)
+
+    benchmarks = {
+        "extract_game_statistics": lambda i: analyze_data.extract_game_statistics(game_names[i % len(game_names)]),
+        "columnar_game_statistics": lambda i: columnar_store.game_statistics(game_names[i % len(game_names)]),
+        "create_chart_data": lambda i: analyze_data.create_chart_data(sample_statistics[i % len(sample_statistics)]),
+        "generate_session_fallback": lambda i: generate_data.generate_session_fallback(
+            players[i % len(players)], games[i % len(games)], session_date,
+            rng.randint(5, 90)
+        ),
+        "analyze_endpoint": lambda i: api.get(f"/analyze/{game_names[i % len(game_names)]}"),
+    }
+    iterations = {
+        "extract_game_statistics": args.iterations,
+        "columnar_game_statistics": args.iterations * 100,
+        "create_chart_data": args.iterations * 100,
+        "generate_session_fallback": args.iterations * 100,
+        "analyze_endpoint": args.iterations,
+    }
+
+    results = []
+    for name, func in benchmarks.items():
+        if args.only and name not in args.only:
+            continue
+        results.append(measure(name, func, iterations[name]))
+
+    api.close()
+    client.close()
+
+    return {
+        "created_at": datetime.now(UTC).isoformat(),
+        "config": {
+            "backend": args.backend,
+            "sessions": args.sessions,
+            "players": len(players),
+            "games": len(games),
+            "seed": args.seed,
+            "iterations": args.iterations
+        },
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "seed_seconds": seed_seconds,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "results": results
+    }
+
+
+def compare(current, baseline_path):
+    """Print throughput and p95 deltas against a previous results file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {r["name"]: r for r in baseline["results"]}
+
+    print(f"\nComparison against {baseline_path}:")
+    for result in current["results"]:
+        before = previous.get(result["name"])
+        if not before:
+            print(f"{result['name']:<28} (no baseline)")
+            continue
+        throughput_delta = (result["throughput_per_second"] / before["throughput_per_second"] - 1) * 100
+        p95_delta = (result["latency_ms"]["p95"] / before["latency_ms"]["p95"] - 1) * 100 if before["latency_ms"]["p95"] else 0.0
+        print(f"{result['name']:<28} throughput {throughput_delta:+7.1f}%  p95 {p95_delta:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analytics and generation hot paths")
+    parser.add_argument("--backend", choices=["mongomock", "mongod"], default="mongomock")
+    parser.add_argument("--mongo-uri", default=os.getenv("BENCH_MONGODB_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db-name", default="bench_gaming_mental_health")
+    parser.add_argument("--sessions", type=int, default=10_000, help="Number of sessions to seed (10k-10M)")
+    parser.add_argument("--players", type=int, default=None, help="Number of players (default: sessions / 20)")
+    parser.add_argument("--games", type=int, default=25)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=50, help="Calls per benchmark (cheap benchmarks run 100x)")
+    parser.add_argument("--only", nargs="*", help="Run only the named benchmarks")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--compare", help="Compare against a previous results JSON file")
+    args = parser.parse_args()
+
+    report = run_suite(args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Shared result cache for the Gaming and Mental Health Analysis Platform.
+
+Game statistics and LLM analyses are cached so repeated /analyze calls (and
+every worker of a multi-worker deployment) reuse the same results. The
+backend is chosen with CACHE_BACKEND:
+- "memory": a dict in this process (the default for a single worker)
+- "sqlite": a WAL-mode SQLite file at CACHE_PATH, shared by every worker on the host
+- "mongo": the cache collection in MongoDB, shared by every host (expired
+  entries are removed by a TTL index)
+- "none": disable caching
+
+Keys carry data versions, so superseded entries are never read again; the
+memory and SQLite backends remove expired entries at most every
+CACHE_PURGE_SECONDS, from set() and add().
+
+get_or_compute() holds a short lease while computing a missing value, so when
+several workers miss the same key at once only one of them runs the query or
+the LLM call and the others wait for its result. Each lease carries a random
+token and is only released by its holder, so a worker whose lease expired
+can't release the one another worker took over.
+"""
+
+import os
+import time
+import uuid
+import pickle
+import sqlite3
+import threading
+from datetime import datetime, timedelta, UTC
+from bson import Binary
+from pymongo.errors import DuplicateKeyError
+import metrics
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_PATH = os.getenv("CACHE_PATH", ".cache/analysis_cache.sqlite3")
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", 300))
+CACHE_PURGE_SECONDS = float(os.getenv("CACHE_PURGE_SECONDS", 60))
+
+# How long a worker may hold the compute lease, and how often waiting workers look for the result
+LEASE_SECONDS = 60
+POLL_SECONDS = 0.05
+
+
+def namespace(key):
+    """Metric label for a key, e.g. "stats" for "stats:Chess" """
+    return key.split(":", 1)[0]
+
+
+class Cache:
+    """Base class; backends implement get, set, add, delete and delete_if, and purge_expired if expired entries
+    pile up"""
+
+    purged_at = 0.0
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=CACHE_TTL_SECONDS):
+        raise NotImplementedError
+
+    def add(self, key, value, ttl=CACHE_TTL_SECONDS):
+        """Store value only if key is missing or expired; returns True if it was stored"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def delete_if(self, key, value):
+        """Delete key only if it still holds value"""
+        raise NotImplementedError
+
+    def purge_expired(self):
+        pass
+
+    def maybe_purge(self):
+        """Purge expired entries if the last purge was more than CACHE_PURGE_SECONDS ago"""
+        now = time.monotonic()
+        if now - self.purged_at >= CACHE_PURGE_SECONDS:
+            self.purged_at = now
+            self.purge_expired()
+
+    def acquire_lease(self, key):
+        """Take the compute lease for key; returns its token, or None if another worker holds it"""
+        token = uuid.uuid4().hex
+        return token if self.add(f"lease:{key}", token, ttl=LEASE_SECONDS) else None
+
+    def release_lease(self, key, token):
+        self.delete_if(f"lease:{key}", token)
+
+    def get_or_compute(self, key, compute, ttl=CACHE_TTL_SECONDS):
+        """Return the cached value for key, computing and storing it once across workers on a miss
+
+        ttl may be a function of the computed value. None results are not cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            metrics.inc("cache_hits_total", cache=namespace(key))
+            return value
+        metrics.inc("cache_misses_total", cache=namespace(key))
+
+        token = self.acquire_lease(key)
+        if token is None:
+            # Another worker is computing this value; wait for it rather than repeating the work
+            deadline = time.monotonic() + LEASE_SECONDS
+            while time.monotonic() < deadline:
+                time.sleep(POLL_SECONDS)
+                value = self.get(key)
+                if value is not None:
+                    return value
+                token = self.acquire_lease(key)
+                if token is not None:
+                    break
+            else:
+                return compute()
+
+        try:
+            value = compute()
+            if value is not None:
+                self.set(key, value, ttl(value) if callable(ttl) else ttl)
+            return value
+        finally:
+            self.release_lease(key, token)
+
+
+class NullCache(Cache):
+    """Cache that never stores anything"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=CACHE_TTL_SECONDS):
+        pass
+
+    def add(self, key, value, ttl=CACHE_TTL_SECONDS):
+        return True
+
+    def delete(self, key):
+        pass
+
+    def delete_if(self, key, value):
+        pass
+
+
+class MemoryCache(Cache):
+    """Per-process cache in a dict"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[1] < time.time():
+            return None
+        return entry[0]
+
+    def set(self, key, value, ttl=CACHE_TTL_SECONDS):
+        self.maybe_purge()
+        with self.lock:
+            self.entries[key] = (value, time.time() + ttl)
+
+    def add(self, key, value, ttl=CACHE_TTL_SECONDS):
+        self.maybe_purge()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] >= time.time():
+                return False
+            self.entries[key] = (value, time.time() + ttl)
+            return True
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def delete_if(self, key, value):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == value:
+                del self.entries[key]
+
+    def purge_expired(self):
+        now = time.time()
+        with self.lock:
+            expired = [key for key, entry in self.entries.items() if entry[1] < now]
+            for key in expired:
+                del self.entries[key]
+
+
+class SQLiteCache(Cache):
+    """Cache in a WAL-mode SQLite file, shared by every process on the host"""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+
+    def connection(self):
+        """One connection per thread and process; SQLite connections can't cross either"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self.connection().execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl=CACHE_TTL_SECONDS):
+        self.maybe_purge()
+        self.connection().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), time.time() + ttl)
+        )
+
+    def add(self, key, value, ttl=CACHE_TTL_SECONDS):
+        self.maybe_purge()
+        conn = self.connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM cache WHERE key = ? AND expires_at < ?", (key, now))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), now + ttl)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount == 1
+
+    def delete(self, key):
+        self.connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def delete_if(self, key, value):
+        self.connection().execute("DELETE FROM cache WHERE key = ? AND value = ?",
+                                  (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    def purge_expired(self):
+        self.connection().execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+
+
+class MongoCache(Cache):
+    """Cache in a MongoDB collection, shared by every process that uses the database"""
+
+    def __init__(self, get_db, collection_name="cache"):
+        # get_db is called on use, like the ingest batcher, so creating the cache doesn't connect
+        self.get_db = get_db
+        self.collection_name = collection_name
+        self.indexed = False
+
+    @property
+    def collection(self):
+        collection = self.get_db()[self.collection_name]
+        if not self.indexed:
+            collection.create_index("expires_at", expireAfterSeconds=0)
+            self.indexed = True
+        return collection
+
+    def get(self, key):
+        entry = self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.now(UTC)}})
+        return pickle.loads(entry["value"]) if entry else None
+
+    def set(self, key, value, ttl=CACHE_TTL_SECONDS):
+        self.collection.replace_one(
+            {"_id": key},
+            {"value": Binary(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)),
+             "expires_at": datetime.now(UTC) + timedelta(seconds=ttl)},
+            upsert=True
+        )
+
+    def add(self, key, value, ttl=CACHE_TTL_SECONDS):
+        now = datetime.now(UTC)
+        # The TTL monitor only runs once a minute, so clear an expired entry ourselves
+        self.collection.delete_one({"_id": key, "expires_at": {"$lte": now}})
+        try:
+            self.collection.insert_one({
+                "_id": key,
+                "value": Binary(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)),
+                "expires_at": now + timedelta(seconds=ttl)
+            })
+        except DuplicateKeyError:
+            return False
+        return True
+
+    def delete(self, key):
+        self.collection.delete_one({"_id": key})
+
+    def delete_if(self, key, value):
+        self.collection.delete_one({"_id": key, "value": Binary(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))})
+
+
+def create_cache(get_db, backend=None):
+    """Build the cache selected by CACHE_BACKEND"""
+    backend = (backend or os.getenv("CACHE_BACKEND", CACHE_BACKEND)).lower()
+    if backend == "memory":
+        return MemoryCache()
+    if backend == "sqlite":
+        return SQLiteCache(os.getenv("CACHE_PATH", CACHE_PATH))
+    if backend == "mongo":
+        return MongoCache(get_db)
+    if backend == "none":
+        return NullCache()
+    raise ValueError(f"Unknown CACHE_BACKEND '{backend}', expected memory, sqlite, mongo or none")
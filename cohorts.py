@@ -0,0 +1,236 @@
+"""
+Cohort slicing (age band, gender, baseline) over the columnar session store.
+
+Every player has an ordinal in the ColumnarSessionStore. For each cohort
+value (an age band, a gender or a baseline state) CohortIndex keeps a packed
+bitset over those ordinals. A cohort filter ORs the bitsets within a
+dimension and ANDs across dimensions, so it never joins players to sessions.
+Per-game postings (the row numbers of each game's sessions in the store) are
+appended as sessions arrive. A cohort's statistics for one game are then a
+bit test over that game's postings followed by a bincount.
+
+Per-player postings serve queries across every game (cohort /recommend): the
+cohort's members are read off its bitset and only their sessions are
+gathered. They are kept as one array of rows sorted by player, rebuilt once
+the sessions appended since outgrow PLAYER_POSTINGS_TAIL or a tenth of the
+store; until then the newer rows are bit-tested directly.
+
+Cohort filters look like {"age_band": ["18-24", "25-34"], "gender": ["Female"],
+"baseline": ["Stressed"]}; a missing or empty dimension means "everyone".
+"""
+
+import numpy as np
+from analytics import (MENTAL_HEALTH_STATES, AGE_BANDS, IMPACT_CLASSES, COHORT_DIMENSIONS,
+                       classify_transition, build_statistics)
+from columnar import STATE_CODES, N_CODES, CELLS_PER_GAME, UNKNOWN_STATE
+
+# Outcome states by code, including the unknown-state code
+AFTER_STATES = MENTAL_HEALTH_STATES + ["Unknown"]
+PLAYER_POSTINGS_TAIL = 100_000
+
+
+class Bitset:
+    """Packed bitset over player ordinals"""
+
+    __slots__ = ("bits", "size")
+
+    def __init__(self, bits, size):
+        self.bits = bits
+        self.size = size
+
+    @classmethod
+    def from_mask(cls, mask):
+        return cls(np.packbits(mask, bitorder="little"), len(mask))
+
+    def __and__(self, other):
+        return Bitset(self.bits & other.bits, self.size)
+
+    def __or__(self, other):
+        return Bitset(self.bits | other.bits, self.size)
+
+    def contains(self, ordinals):
+        """Vectorised membership test for an array of player ordinals"""
+        ordinals = ordinals.astype(np.int64, copy=False)
+        if len(ordinals) and ordinals.max() >= self.size:
+            # Players added after the bitset was built aren't members yet
+            inside = ordinals < self.size
+            result = np.zeros(len(ordinals), dtype=bool)
+            result[inside] = self.contains(ordinals[inside])
+            return result
+        return ((self.bits[ordinals >> 3] >> (ordinals & 7).astype(np.uint8)) & 1).astype(bool)
+
+    def count(self):
+        return int(np.unpackbits(self.bits, count=self.size, bitorder="little").sum())
+
+
+class CohortIndex:
+    """Cohort bitsets and per-game session postings on top of a ColumnarSessionStore"""
+
+    def __init__(self, store):
+        self.store = store
+        self.ages = np.zeros(0, dtype=np.int16)
+        self.genders = np.zeros(0, dtype=np.int8)
+        self.gender_codes = {}
+        self.known_players = 0
+        self.bitsets = {}
+        self.postings = {}
+        self.indexed_size = 0
+        # Rows [0, player_indexed) sorted by player, and each player's start offset into them
+        self.player_order = np.zeros(0, dtype=np.int64)
+        self.player_starts = np.zeros(1, dtype=np.int64)
+        self.player_indexed = 0
+
+    # -- maintenance ------------------------------------------------------
+
+    def sync_players(self, players_collection):
+        """Load age and gender for players the store has added since the last sync"""
+        with self.store.lock:
+            total = len(self.store.player_codes)
+            if total == self.known_players:
+                return
+            if self.known_players == 0:
+                cursor = players_collection.find({}, {"age": 1, "gender": 1}).batch_size(100_000)
+            else:
+                new_ids = list(self.store.player_codes)[self.known_players:]
+                cursor = players_collection.find({"_id": {"$in": new_ids}}, {"age": 1, "gender": 1})
+
+            size = len(self.store.player_baselines)
+            if len(self.ages) < size:
+                self.ages = np.concatenate([self.ages, np.full(size - len(self.ages), -1, dtype=np.int16)])
+                self.genders = np.concatenate([self.genders, np.full(size - len(self.genders), -1, dtype=np.int8)])
+            for player in cursor:
+                code = self.store.player_codes.get(player["_id"])
+                if code is None:
+                    continue
+                self.ages[code] = player.get("age") if player.get("age") is not None else -1
+                gender = player.get("gender")
+                if gender is not None:
+                    self.genders[code] = self.gender_codes.setdefault(gender, len(self.gender_codes))
+            self.known_players = total
+            self.bitsets.clear()
+
+    def index_sessions(self):
+        """Append postings for sessions added to the store since the last call"""
+        with self.store.lock:
+            if self.store.size == self.indexed_size:
+                return
+            start = self.indexed_size
+            games = self.store.view("game")[start:]
+            order = np.argsort(games, kind="stable")
+            sorted_games = games[order]
+            codes, first = np.unique(sorted_games, return_index=True)
+            for code, rows in zip(codes, np.split(order + start, first[1:])):
+                self.postings.setdefault(int(code), []).append(rows.astype(np.int64))
+            self.indexed_size = self.store.size
+
+    def index_players(self):
+        """Rebuild the per-player postings once too many rows have been appended since the last build"""
+        tail = self.store.size - self.player_indexed
+        if tail <= max(PLAYER_POSTINGS_TAIL, self.player_indexed // 10):
+            return
+        players = self.store.view("player")
+        self.player_order = np.argsort(players, kind="stable").astype(np.int64)
+        self.player_starts = np.searchsorted(players[self.player_order], np.arange(len(self.store.player_codes) + 1))
+        self.player_indexed = self.store.size
+
+    def member_rows(self, bitset):
+        """Row numbers of the sessions of a bitset's players: their postings plus the matching unindexed rows"""
+        self.index_players()
+        members = np.flatnonzero(np.unpackbits(bitset.bits, count=bitset.size, bitorder="little"))
+        members = members[members < len(self.player_starts) - 1]
+        starts = self.player_starts[members]
+        lengths = self.player_starts[members + 1] - starts
+        # Each member's run of positions in player_order, concatenated without a Python loop
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        rows = self.player_order[np.repeat(starts, lengths) + offsets]
+        tail = np.arange(self.player_indexed, self.store.size)
+        tail = tail[bitset.contains(self.store.view("player")[tail])]
+        return np.concatenate([rows, tail])
+
+    def game_rows(self, code):
+        """Row numbers of a game's sessions, merging appended chunks on demand"""
+        chunks = self.postings.get(code)
+        if not chunks:
+            return np.zeros(0, dtype=np.int64)
+        if len(chunks) > 1:
+            chunks[:] = [np.concatenate(chunks)]
+        return chunks[0]
+
+    # -- bitsets ----------------------------------------------------------
+
+    def bitset(self, dim, value):
+        """Bitset of the players with one cohort value, built once per player set"""
+        key = (dim, value)
+        bitset = self.bitsets.get(key)
+        if bitset is None:
+            size = len(self.ages)
+            if dim == "age_band":
+                low, high = next((lo, hi) for label, lo, hi in AGE_BANDS if label == value)
+                ages = self.ages[:size]
+                mask = (ages >= low) & (ages <= high)
+            elif dim == "gender":
+                code = self.gender_codes.get(value)
+                mask = self.genders[:size] == code if code is not None else np.zeros(size, dtype=bool)
+            elif dim == "baseline":
+                mask = self.store.player_baselines[:size] == STATE_CODES.get(value, UNKNOWN_STATE)
+            else:
+                raise ValueError(f"Unknown cohort dimension '{dim}'")
+            bitset = self.bitsets[key] = Bitset.from_mask(mask)
+        return bitset
+
+    def cohort_bitset(self, cohort):
+        """OR the values within each dimension and AND the dimensions; None means no filter"""
+        result = None
+        for dim in COHORT_DIMENSIONS:
+            values = (cohort or {}).get(dim)
+            if not values:
+                continue
+            union = None
+            for value in values:
+                bitset = self.bitset(dim, value)
+                union = bitset if union is None else union | bitset
+            result = union if result is None else result & union
+        return result
+
+    # -- queries ----------------------------------------------------------
+
+    def game_statistics(self, game_name, cohort):
+        """extract_game_statistics for one game, restricted to a cohort's players"""
+        with self.store.lock:
+            code = self.store.game_names.get(game_name)
+            if code is None:
+                return None
+            rows = self.game_rows(code)
+            bitset = self.cohort_bitset(cohort)
+            if bitset is not None:
+                rows = rows[bitset.contains(self.store.view("player")[rows])]
+
+            baselines = self.store.view("baseline")[rows].astype(np.int64)
+            afters = self.store.view("after")[rows]
+            durations = self.store.view("duration")[rows]
+            cells = np.bincount(baselines * N_CODES + afters, minlength=CELLS_PER_GAME)
+            known = baselines != UNKNOWN_STATE
+            avg_duration = float(durations[known].mean()) if known.any() else 0
+            return build_statistics(self.store.games[code], self.store.transitions_from_cells(cells), len(rows), avg_duration)
+
+    def outcome_cells(self, baseline, cohort):
+        """Per-game outcome counts for a baseline within a cohort, in the shape RecommendationIndex uses
+
+        Returns ({game_id: {"sessions", "positive", "negative", "neutral"}}, {game_id: game}).
+        """
+        with self.store.lock:
+            n_games = len(self.store.games)
+            # The baseline is a cohort dimension too, so only the sessions of matching players are read
+            rows = self.member_rows(self.cohort_bitset({**(cohort or {}), "baseline": [baseline]}))
+            games = self.store.view("game")[rows].astype(np.int64)
+            afters = self.store.view("after")[rows]
+            counts = np.bincount(games * N_CODES + afters, minlength=n_games * N_CODES).reshape(n_games, N_CODES)
+
+            impact_of = [classify_transition(baseline, after) for after in AFTER_STATES]
+            cells = {}
+            for code in np.nonzero(counts.sum(axis=1))[0]:
+                cell = {"sessions": int(counts[code].sum()), **{impact: 0 for impact in IMPACT_CLASSES}}
+                for after_code, count in enumerate(counts[code]):
+                    cell[impact_of[after_code]] += int(count)
+                cells[self.store.games[code]["_id"]] = cell
+            return cells, {game["_id"]: game for game in self.store.games}
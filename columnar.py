@@ -0,0 +1,307 @@
+"""
+In-memory columnar analytics engine for gaming sessions.
+
+Sessions are held as compact NumPy columns: categorical codes for game,
+player, baseline and mental_health_after, int16 durations and int64 session
+dates (milliseconds since the epoch). Per-game transition counts and duration
+sums are maintained incrementally with bincount, so extract_game_statistics
+style queries are a table lookup rather than a scan, and ad-hoc filters (date
+ranges, player subsets) are answered with boolean masks over the columns.
+
+Enabled in the API with ANALYTICS_ENGINE=columnar.
+
+refresh() rescans the sessions whose ObjectId was generated in the
+COLUMNAR_REFRESH_WINDOW_SECONDS before the previous refresh started, and
+drops those already applied. ObjectIds from different writers aren't
+ordered, so an _id high-water mark would skip a late-arriving session with a
+lower id; the window only has to cover the writers' clock skew and insert
+latency.
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from datetime import datetime, UTC
+import numpy as np
+from bson import ObjectId
+from analytics import MENTAL_HEALTH_STATES, transition_key, build_statistics
+
+STATE_CODES = {state: code for code, state in enumerate(MENTAL_HEALTH_STATES)}
+N_STATES = len(MENTAL_HEALTH_STATES)
+# Extra code for players/outcomes outside the known state vocabulary
+UNKNOWN_STATE = N_STATES
+N_CODES = N_STATES + 1
+CELLS_PER_GAME = N_CODES * N_CODES
+
+MAX_GAMES = np.iinfo(np.uint16).max
+
+COLUMNAR_REFRESH_WINDOW_SECONDS = float(os.getenv("COLUMNAR_REFRESH_WINDOW_SECONDS", 300))
+
+SESSION_PROJECTION = {"player_id": 1, "game_id": 1, "session_date": 1, "duration_minutes": 1, "mental_health_after": 1}
+
+
+def to_epoch_ms(value):
+    """Convert a (naive UTC or aware) datetime to milliseconds since the epoch"""
+    if value is None:
+        return 0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return int(value.timestamp() * 1000)
+
+
+class ColumnarSessionStore:
+    """Append-only columnar copy of the sessions collection"""
+
+    COLUMNS = {
+        "game": np.uint16,
+        "player": np.int32,
+        "baseline": np.int8,
+        "after": np.int8,
+        "duration": np.int16,
+        "date": np.int64,
+    }
+
+    def __init__(self, capacity=1024):
+        self.lock = threading.RLock()
+        self.size = 0
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in self.COLUMNS.items()}
+
+        # Categorical dictionaries
+        self.game_codes = {}
+        self.games = []
+        self.game_names = {}
+        self.player_codes = {}
+        self.player_baselines = np.zeros(0, dtype=np.int8)
+
+        # Incrementally maintained aggregates
+        self.transition_counts = np.zeros((0, CELLS_PER_GAME), dtype=np.int64)
+        self.session_totals = np.zeros(0, dtype=np.int64)
+        self.duration_sums = np.zeros(0, dtype=np.int64)
+        self.duration_counts = np.zeros(0, dtype=np.int64)
+
+        # Sessions generated after window_start can be delivered again (by the next refresh or the ingest
+        # listener), so their ids are kept to drop the duplicates
+        self.scanned_at = None
+        self.recent_ids = set()
+        self.recent_order = deque()
+
+    # -- dictionaries -----------------------------------------------------
+
+    def add_game(self, game):
+        """Register (or update) a game document and return its code"""
+        with self.lock:
+            code = self.game_codes.get(game["_id"])
+            if code is not None:
+                self.games[code] = game
+                self.game_names[game["name"]] = code
+                return code
+            code = len(self.games)
+            if code >= MAX_GAMES:
+                raise ValueError("Too many games for uint16 game codes")
+            self.game_codes[game["_id"]] = code
+            self.games.append(game)
+            self.game_names[game["name"]] = code
+            self.transition_counts = np.vstack([self.transition_counts, np.zeros((1, CELLS_PER_GAME), dtype=np.int64)])
+            for name in ("session_totals", "duration_sums", "duration_counts"):
+                setattr(self, name, np.append(getattr(self, name), np.int64(0)))
+            return code
+
+    def add_player(self, player_id, baseline):
+        """Register (or update) a player's baseline and return its code"""
+        with self.lock:
+            baseline_code = STATE_CODES.get(baseline, UNKNOWN_STATE)
+            code = self.player_codes.get(player_id)
+            if code is None:
+                code = len(self.player_codes)
+                self.player_codes[player_id] = code
+                if code >= len(self.player_baselines):
+                    grown = np.full(max(1024, code * 2), UNKNOWN_STATE, dtype=np.int8)
+                    grown[:len(self.player_baselines)] = self.player_baselines
+                    self.player_baselines = grown
+            self.player_baselines[code] = baseline_code
+            return code
+
+    # -- loading ----------------------------------------------------------
+
+    def ensure_capacity(self, needed):
+        capacity = len(self.columns["game"])
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        for name, column in self.columns.items():
+            grown = np.zeros(new_capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+
+    def window_start(self):
+        """Generation time from which the next refresh rescans sessions"""
+        return datetime.fromtimestamp(self.scanned_at - COLUMNAR_REFRESH_WINDOW_SECONDS, UTC)
+
+    def load(self, games_collection, players_collection, sessions_collection, batch_size=100_000):
+        """Load every game, player and session from MongoDB"""
+        self.scanned_at = time.time()
+        for game in games_collection.find():
+            self.add_game(game)
+        for player in players_collection.find({}, {"baseline_mental_health": 1}).batch_size(batch_size):
+            self.add_player(player["_id"], player.get("baseline_mental_health"))
+
+        cursor = sessions_collection.find({}, SESSION_PROJECTION).sort("_id", 1).batch_size(batch_size)
+        batch = []
+        for session in cursor:
+            batch.append(session)
+            if len(batch) >= batch_size:
+                self.apply_sessions(batch)
+                batch = []
+        if batch:
+            self.apply_sessions(batch)
+        return self
+
+    def refresh(self, games_collection, players_collection, sessions_collection, batch_size=100_000):
+        """Pick up games, players and sessions added since the last load/refresh; returns the sessions applied"""
+        for game in games_collection.find():
+            self.add_game(game)
+        query = {"_id": {"$gte": ObjectId.from_datetime(self.window_start())}} if self.scanned_at is not None else {}
+        scanned_at = time.time()
+        sessions = list(sessions_collection.find(query, SESSION_PROJECTION).batch_size(batch_size))
+        with self.lock:
+            applied = self.apply_sessions(sessions, players_collection)
+            self.scanned_at = scanned_at
+            self.forget()
+        return applied
+
+    def apply_sessions(self, sessions, players_collection=None):
+        """Append new sessions to the columns and update the per-game aggregates; returns how many were new
+
+        Sessions already applied from the refresh window are skipped.
+        """
+        with self.lock:
+            sessions = [s for s in sessions if s.get("_id") not in self.recent_ids]
+            if not sessions:
+                return 0
+            # Resolve players we have not seen yet in one round trip
+            missing = {s["player_id"] for s in sessions if s["player_id"] not in self.player_codes}
+            if missing and players_collection is not None:
+                for player in players_collection.find({"_id": {"$in": list(missing)}}, {"baseline_mental_health": 1}):
+                    self.add_player(player["_id"], player.get("baseline_mental_health"))
+
+            count = len(sessions)
+            games = np.empty(count, dtype=np.uint16)
+            players = np.empty(count, dtype=np.int32)
+            afters = np.empty(count, dtype=np.int8)
+            durations = np.empty(count, dtype=np.int16)
+            dates = np.empty(count, dtype=np.int64)
+            keep = np.ones(count, dtype=bool)
+            for i, session in enumerate(sessions):
+                game_code = self.game_codes.get(session["game_id"])
+                if game_code is None:
+                    # Session for a game we have never loaded
+                    keep[i] = False
+                    game_code = 0
+                player_code = self.player_codes.get(session["player_id"])
+                if player_code is None:
+                    player_code = self.add_player(session["player_id"], session.get("baseline"))
+                games[i] = game_code
+                players[i] = player_code
+                afters[i] = STATE_CODES.get(session.get("mental_health_after"), UNKNOWN_STATE)
+                durations[i] = min(int(session.get("duration_minutes") or 0), np.iinfo(np.int16).max)
+                dates[i] = to_epoch_ms(session.get("session_date"))
+
+            if not keep.all():
+                games, players, afters, durations, dates = (a[keep] for a in (games, players, afters, durations, dates))
+            baselines = self.player_baselines[players]
+
+            start = self.size
+            end = start + len(games)
+            self.ensure_capacity(end)
+            self.columns["game"][start:end] = games
+            self.columns["player"][start:end] = players
+            self.columns["baseline"][start:end] = baselines
+            self.columns["after"][start:end] = afters
+            self.columns["duration"][start:end] = durations
+            self.columns["date"][start:end] = dates
+            self.size = end
+
+            self.accumulate(games, baselines, afters, durations)
+            self.remember(s["_id"] for s in sessions if "_id" in s)
+            return len(sessions)
+
+    def remember(self, ids):
+        """Record the ids a later refresh can see again, i.e. those generated inside its window"""
+        window_start = self.window_start() if self.scanned_at is not None else None
+        for session_id in ids:
+            if isinstance(session_id, ObjectId) and (window_start is None or session_id.generation_time >= window_start):
+                self.recent_ids.add(session_id)
+                self.recent_order.append(session_id)
+
+    def forget(self):
+        """Drop remembered ids generated before the refresh window, which no refresh reads again"""
+        window_start = self.window_start()
+        while self.recent_order and self.recent_order[0].generation_time < window_start:
+            self.recent_ids.discard(self.recent_order.popleft())
+
+    def accumulate(self, games, baselines, afters, durations):
+        """Fold a batch of coded sessions into the per-game aggregates"""
+        n_games = len(self.games)
+        if len(games) == 0:
+            return
+        cells = games.astype(np.int64) * CELLS_PER_GAME + baselines.astype(np.int64) * N_CODES + afters
+        self.transition_counts += np.bincount(cells, minlength=n_games * CELLS_PER_GAME).reshape(n_games, CELLS_PER_GAME)
+        self.session_totals += np.bincount(games, minlength=n_games)
+        known = baselines != UNKNOWN_STATE
+        self.duration_sums += np.bincount(games[known], weights=durations[known], minlength=n_games).astype(np.int64)
+        self.duration_counts += np.bincount(games[known], minlength=n_games)
+
+    # -- queries ----------------------------------------------------------
+
+    def view(self, name):
+        """Return the filled part of a column (no copy)"""
+        return self.columns[name][:self.size]
+
+    def transitions_from_cells(self, cells):
+        """Turn a flat (baseline, after) count vector into a transitions dict"""
+        matrix = cells.reshape(N_CODES, N_CODES)
+        transitions = {}
+        for b, a in zip(*np.nonzero(matrix[:N_STATES, :N_STATES])):
+            transitions[transition_key(MENTAL_HEALTH_STATES[b], MENTAL_HEALTH_STATES[a])] = int(matrix[b, a])
+        return transitions
+
+    def game_statistics(self, game_name):
+        """extract_game_statistics for one game, served from the maintained aggregates"""
+        with self.lock:
+            code = self.game_names.get(game_name)
+            if code is None:
+                return None
+            total = int(self.session_totals[code])
+            durations = int(self.duration_counts[code])
+            avg_duration = self.duration_sums[code] / durations if durations else 0
+            transitions = self.transitions_from_cells(self.transition_counts[code])
+            return build_statistics(self.games[code], transitions, total, avg_duration)
+
+    def filtered_statistics(self, game_name, mask=None, since=None, until=None):
+        """extract_game_statistics for one game over sessions matching a mask and/or date range"""
+        with self.lock:
+            code = self.game_names.get(game_name)
+            if code is None:
+                return None
+            selected = self.view("game") == code
+            if mask is not None:
+                selected &= mask
+            if since is not None:
+                selected &= self.view("date") >= to_epoch_ms(since)
+            if until is not None:
+                selected &= self.view("date") < to_epoch_ms(until)
+
+            baselines = self.view("baseline")[selected].astype(np.int64)
+            afters = self.view("after")[selected]
+            durations = self.view("duration")[selected]
+            cells = np.bincount(baselines * N_CODES + afters, minlength=CELLS_PER_GAME)
+            known = baselines != UNKNOWN_STATE
+            avg_duration = float(durations[known].mean()) if known.any() else 0
+            return build_statistics(self.games[code], self.transitions_from_cells(cells), int(selected.sum()), avg_duration)
+
+    def memory_bytes(self):
+        """Approximate memory held by the columns and aggregates"""
+        arrays = list(self.columns.values()) + [self.player_baselines, self.transition_counts,
+                                                self.session_totals, self.duration_sums, self.duration_counts]
+        return sum(a.nbytes for a in arrays)
@@ -0,0 +1,124 @@
+"""
+Confidence intervals for the mental health impact percentages.
+
+The percentages in mental_health_impact are floored and rescaled for display,
+and say nothing about sample size. This module reports the raw positive,
+negative and neutral rates of each game with a confidence interval, computed
+for many games at once:
+- "bootstrap" (the default): percentile intervals from CONFIDENCE_RESAMPLES
+  multinomial resamples of each game's outcome counts. A class seen in none
+  or all of a game's sessions never varies under resampling, so those cells
+  use the Wilson interval instead of collapsing to a single point
+- "wilson": closed-form Wilson score intervals
+
+Each class count of a multinomial resample is Binomial(n, p), so the
+per-class percentile intervals are drawn from those marginals directly: one
+(resamples x games x classes) binomial draw replaces a loop over games.
+"""
+
+import os
+import numpy as np
+from analytics import IMPACT_CLASSES, classify_transition
+
+CONFIDENCE_METHOD = os.getenv("CONFIDENCE_METHOD", "bootstrap").lower()
+CONFIDENCE_LEVEL = float(os.getenv("CONFIDENCE_LEVEL", 0.95))
+CONFIDENCE_RESAMPLES = int(os.getenv("CONFIDENCE_RESAMPLES", 2000))
+CONFIDENCE_SEED = 42
+
+# Games per resampling block, to bound memory at BLOCK_GAMES x resamples x classes
+BLOCK_GAMES = 256
+
+
+def impact_counts(mental_health_transitions):
+    """[positive, negative, neutral] session counts for a transitions dict"""
+    counts = dict.fromkeys(IMPACT_CLASSES, 0)
+    for key, count in mental_health_transitions.items():
+        baseline, after = key.split(" -> ")
+        counts[classify_transition(baseline, after)] += count
+    return [counts[impact] for impact in IMPACT_CLASSES]
+
+
+def z_score(level=CONFIDENCE_LEVEL):
+    """Two-sided normal quantile for a confidence level, without SciPy"""
+    from statistics import NormalDist
+    return NormalDist().inv_cdf(0.5 + level / 2)
+
+
+def wilson_intervals(counts, level=CONFIDENCE_LEVEL):
+    """Wilson score intervals for every cell of a (games x classes) count matrix"""
+    counts = np.asarray(counts, dtype=np.float64)
+    trials = counts.sum(axis=1, keepdims=True)
+    z = z_score(level)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = counts / trials
+        denominator = 1 + z * z / trials
+        centre = p + z * z / (2 * trials)
+        margin = z * np.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials))
+        low = (centre - margin) / denominator
+        high = (centre + margin) / denominator
+    empty = trials[:, 0] == 0
+    low[empty], high[empty] = 0.0, 1.0
+    return np.clip(low, 0, 1), np.clip(high, 0, 1)
+
+
+def bootstrap_intervals(counts, level=CONFIDENCE_LEVEL, resamples=CONFIDENCE_RESAMPLES, seed=CONFIDENCE_SEED):
+    """Percentile bootstrap intervals for every cell of a (games x classes) count matrix"""
+    counts = np.asarray(counts, dtype=np.int64)
+    trials = counts.sum(axis=1)
+    rates = np.divide(counts, trials[:, None], out=np.zeros(counts.shape), where=trials[:, None] > 0)
+    rng = np.random.default_rng(seed)
+    quantiles = [(1 - level) / 2, (1 + level) / 2]
+    low = np.zeros(counts.shape)
+    high = np.ones(counts.shape)
+    for start in range(0, len(counts), BLOCK_GAMES):
+        block = slice(start, start + BLOCK_GAMES)
+        n = trials[block]
+        draws = rng.binomial(n[None, :, None], rates[block][None], size=(resamples,) + rates[block].shape)
+        resampled = draws / np.maximum(n, 1)[None, :, None]
+        low[block], high[block] = np.quantile(resampled, quantiles, axis=0)
+    empty = trials == 0
+    low[empty], high[empty] = 0.0, 1.0
+    return low, high
+
+
+def impact_intervals(count_rows, method=CONFIDENCE_METHOD, level=CONFIDENCE_LEVEL):
+    """Raw impact rates with confidence intervals (in percent) for each row of counts
+
+    Returns one dict per row: {"method", "level", "sessions", "positive": {"rate", "low", "high"}, ...}.
+    """
+    counts = np.asarray(count_rows, dtype=np.int64).reshape(-1, len(IMPACT_CLASSES))
+    if method == "wilson":
+        low, high = wilson_intervals(counts, level)
+    elif method == "bootstrap":
+        low, high = bootstrap_intervals(counts, level)
+        degenerate = (counts == 0) | (counts == counts.sum(axis=1, keepdims=True))
+        if degenerate.any():
+            wilson_low, wilson_high = wilson_intervals(counts, level)
+            low = np.where(degenerate, wilson_low, low)
+            high = np.where(degenerate, wilson_high, high)
+    else:
+        raise ValueError(f"Unknown CONFIDENCE_METHOD '{method}', expected bootstrap or wilson")
+    trials = counts.sum(axis=1)
+    rates = np.divide(counts, trials[:, None], out=np.zeros(counts.shape), where=trials[:, None] > 0)
+
+    results = []
+    for row in range(len(counts)):
+        interval = {"method": method, "level": level, "sessions": int(trials[row])}
+        for col, impact in enumerate(IMPACT_CLASSES):
+            interval[impact] = {
+                "rate": float(rates[row, col] * 100),
+                "low": float(low[row, col] * 100),
+                "high": float(high[row, col] * 100)
+            }
+        results.append(interval)
+    return results
+
+
+def add_confidence(statistics_list, method=CONFIDENCE_METHOD):
+    """Attach impact_confidence to a batch of extract_game_statistics results in one vectorised pass"""
+    statistics_list = [stats for stats in statistics_list if stats]
+    if not statistics_list:
+        return
+    counts = [impact_counts(stats.get("mental_health_transitions", {})) for stats in statistics_list]
+    for stats, interval in zip(statistics_list, impact_intervals(counts, method)):
+        stats["impact_confidence"] = interval
@@ -0,0 +1,105 @@
+"""
+Per-game data versions for HTTP conditional requests.
+
+A game's version is its session count plus the newest session _id. Versions
+are kept in memory: sessions published by the ingest batcher or the change
+stream bump them directly, and each one is re-read from MongoDB at most once
+every VERSION_TTL_SECONDS to pick up writes made by other processes. The API
+builds ETags from them, so an If-None-Match that still matches can be
+answered with 304 without querying sessions or calling the LLM.
+"""
+
+import os
+import time
+import hashlib
+import threading
+
+VERSION_TTL_SECONDS = float(os.getenv("VERSION_TTL_SECONDS", 5))
+
+
+class DataVersions:
+    """In-memory registry of per-game data versions"""
+
+    def __init__(self, get_db, ttl=VERSION_TTL_SECONDS):
+        # get_db is called on use, like the ingest batcher, so creating the registry doesn't connect
+        self.get_db = get_db
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.versions = {}
+        self.game_ids = {}
+        self.game_names = []
+        self.games_checked_at = 0.0
+
+    def refresh_games(self):
+        games = list(self.get_db()["games"].find({}, {"name": 1}))
+        with self.lock:
+            self.game_ids = {game["name"]: game["_id"] for game in games}
+            self.game_names = [game["name"] for game in games]
+            self.games_checked_at = time.monotonic()
+
+    def games(self):
+        """Return (game names, ETag of the list), re-reading the games at most once per TTL"""
+        if time.monotonic() - self.games_checked_at > self.ttl:
+            self.refresh_games()
+        names = self.game_names
+        digest = hashlib.blake2b("\n".join(names).encode(), digest_size=8).hexdigest()
+        return names, f'W/"games-{digest}"'
+
+    def game_id(self, game_name):
+        game_id = self.game_ids.get(game_name)
+        if game_id is None and time.monotonic() - self.games_checked_at > 1:
+            # Unknown name: the game may have been added since the last refresh
+            self.refresh_games()
+            game_id = self.game_ids.get(game_name)
+        return game_id
+
+    def read_version(self, game_id):
+        """Session count and newest session _id for a game, from two indexed queries"""
+        sessions = self.get_db()["sessions"]
+        count = sessions.count_documents({"game_id": game_id})
+        last = sessions.find_one({"game_id": game_id}, {"_id": 1}, sort=[("_id", -1)])
+        return count, last["_id"] if last else None
+
+    def version(self, game_name, trust_updates=False):
+        """Return the version string for a game, or None if the game doesn't exist
+
+        With trust_updates (every insert is being published, e.g. from the
+        change stream) a known version is never re-read from MongoDB.
+        """
+        game_id = self.game_id(game_name)
+        if game_id is None:
+            return None
+        entry = self.versions.get(game_id)
+        if entry is None or (not trust_updates and time.monotonic() - entry[2] > self.ttl):
+            count, last_id = self.read_version(game_id)
+            entry = (count, last_id, time.monotonic())
+            with self.lock:
+                self.versions[game_id] = entry
+        return f"{game_id}-{entry[0]}-{entry[1]}"
+
+    def apply(self, sessions):
+        """Bump the versions of games that received new sessions"""
+        with self.lock:
+            for session in sessions:
+                entry = self.versions.get(session["game_id"])
+                if entry is None:
+                    continue
+                count, last_id, checked_at = entry
+                newest = session["_id"] if last_id is None else max(last_id, session["_id"])
+                self.versions[session["game_id"]] = (count + 1, newest, checked_at)
+
+
+def etag_for(version):
+    """Weak ETag for a version string (weak, because gzip changes the bytes)"""
+    return f'W/"{version}"'
+
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header value matches etag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
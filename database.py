@@ -0,0 +1,129 @@
+"""
+Shared MongoDB connection management for the Gaming and Mental Health Analysis Platform.
+
+Every entry point gets its client from get_client(), so pool sizing, wire
+compression and slow-query monitoring are configured here only. The client
+is created on first use, once per process, and is rebuilt in forked
+children (pymongo clients must not be shared across fork()), which keeps
+multi-worker uvicorn deployments safe.
+
+Write concern is chosen per workload with get_database(workload):
+- "default": the deployment default (or whatever the URI says)
+- "seed": w=1 without journaling, for bulk loads that can simply be re-run
+- "ingest": w="majority", so accepted sessions survive a primary failover
+
+Settings:
+- MONGO_MAX_POOL_SIZE / MONGO_MIN_POOL_SIZE: connection pool bounds (default 100 / 0)
+- MONGO_MAX_IDLE_TIME_MS: close pooled connections idle for this long
+- MONGO_COMPRESSORS: preferred wire compressors (default "zstd,snappy,zlib");
+  ones whose Python package isn't installed are skipped
+- MONGO_SEED_W / MONGO_INGEST_W: override the seed and ingest write concerns
+  (MONGO_SEED_W=0 makes seeding fully unacknowledged)
+"""
+
+import os
+import threading
+import importlib.util
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from pymongo.write_concern import WriteConcern
+import mongo_monitor
+
+# Load environment variables
+load_dotenv()
+
+MONGODB_URI = os.getenv("MONGODB_URI")
+DATABASE_NAME = os.getenv("DATABASE_NAME")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_IDLE_TIME_MS = os.getenv("MONGO_MAX_IDLE_TIME_MS")
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zstd,snappy,zlib")
+
+# Python package each wire compressor needs
+COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+_databases = {}
+
+
+def parse_w(value):
+    """Write concern "w" from an env value: a node count or a tag such as "majority" """
+    return int(value) if value.isdigit() else value
+
+
+WRITE_CONCERNS = {
+    "default": None,
+    "seed": WriteConcern(w=parse_w(os.getenv("MONGO_SEED_W", "1")), j=False),
+    "ingest": WriteConcern(w=parse_w(os.getenv("MONGO_INGEST_W", "majority")), wtimeout=10000),
+}
+
+
+def available_compressors(preferred=MONGO_COMPRESSORS):
+    """Filter a comma separated compressor list down to the ones that are installed"""
+    names = [name.strip() for name in preferred.split(",") if name.strip()]
+    return [name for name in names
+            if name in COMPRESSOR_MODULES and importlib.util.find_spec(COMPRESSOR_MODULES[name])]
+
+
+def client_options():
+    """Keyword arguments for MongoClient built from the environment"""
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "event_listeners": mongo_monitor.get_event_listeners(),
+    }
+    compressors = available_compressors()
+    if compressors:
+        options["compressors"] = ",".join(compressors)
+    if MONGO_MAX_IDLE_TIME_MS:
+        options["maxIdleTimeMS"] = int(MONGO_MAX_IDLE_TIME_MS)
+    return options
+
+
+def _reset_after_fork():
+    """Forget the parent's client in a forked child; it is recreated on next use"""
+    global _lock, _client, _client_pid
+    _lock = threading.Lock()
+    _client = None
+    _client_pid = None
+    _databases.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_client():
+    """Return this process's shared MongoClient, creating it on first use"""
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _lock:
+            if _client is None or _client_pid != os.getpid():
+                _databases.clear()
+                _client = MongoClient(MONGODB_URI, **client_options())
+                _client_pid = os.getpid()
+    return _client
+
+
+def get_database(workload="default"):
+    """Return the application database with the write concern for a workload"""
+    if workload not in WRITE_CONCERNS:
+        raise ValueError(f"Unknown workload '{workload}', expected one of {sorted(WRITE_CONCERNS)}")
+    client = get_client()
+    database = _databases.get(workload)
+    if database is None:
+        database = _databases[workload] = client.get_database(DATABASE_NAME, write_concern=WRITE_CONCERNS[workload])
+    return database
+
+
+def close_client():
+    """Close the shared client, e.g. at the end of a batch job"""
+    global _client, _client_pid
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+        _databases.clear()
@@ -0,0 +1,198 @@
+"""
+Duration-response curves: how session length relates to mental health outcomes.
+
+DurationEffectIndex keeps a per-game histogram of sessions by duration bucket
+(the session length as a share of the game's design avg_session_duration_minutes,
+see DURATION_BUCKETS) and impact class. Like the recommendation index, the
+histogram is built from one grouped aggregation, updated from published
+sessions and rebuilt in the background every DURATION_REFRESH_SECONDS, so a
+curve is read from the in-memory counters rather than a scan of raw sessions.
+
+The optimal duration is the bucket with the highest Wilson lower bound of its
+positive rate, so a bucket with a handful of lucky sessions doesn't win.
+"""
+
+import os
+import time
+import threading
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from analytics import IMPACT_CLASSES, DURATION_BUCKETS, classify_transition, duration_bucket, wilson_lower_bound
+import metrics
+
+DURATION_REFRESH_SECONDS = float(os.getenv("DURATION_REFRESH_SECONDS", 300))
+WILSON_Z = float(os.getenv("WILSON_Z", 1.96))
+
+
+class DurationBucket(BaseModel):
+    label: str
+    min_minutes: float
+    max_minutes: Optional[float] = None
+    sessions: int
+    positive_rate: float
+    negative_rate: float
+    neutral_rate: float
+    score: float
+
+
+class DurationEffectResponse(BaseModel):
+    game_name: str
+    design_minutes: int
+    sessions: int
+    optimal: Optional[DurationBucket] = None
+    curve: List[DurationBucket]
+
+
+def new_histogram():
+    return [dict.fromkeys(IMPACT_CLASSES, 0) for _ in DURATION_BUCKETS]
+
+
+def duration_pipeline():
+    """Sessions collapsed to (game, baseline, outcome, duration) counts, with one players $lookup per distinct player"""
+    return [
+        {"$group": {
+            "_id": {"game": "$game_id", "player": "$player_id", "after": "$mental_health_after",
+                    "duration": "$duration_minutes"},
+            "count": {"$sum": 1}
+        }},
+        {"$lookup": {"from": "players", "localField": "_id.player", "foreignField": "_id", "as": "player"}},
+        {"$unwind": "$player"},
+        {"$group": {
+            "_id": {"game": "$_id.game", "baseline": "$player.baseline_mental_health", "after": "$_id.after",
+                    "duration": "$_id.duration"},
+            "count": {"$sum": "$count"}
+        }}
+    ]
+
+
+class DurationEffectIndex:
+    """Per-game duration bucket x impact histograms"""
+
+    def __init__(self, get_db, refresh_seconds=DURATION_REFRESH_SECONDS, z=WILSON_Z):
+        # get_db is called on use, like the ingest batcher, so creating the index doesn't connect
+        self.get_db = get_db
+        self.refresh_seconds = refresh_seconds
+        self.z = z
+        self.lock = threading.Lock()
+        self.games = {}
+        self.game_ids = {}
+        self.histograms = {}
+        self.built_at = None
+        self.rebuilding = False
+
+    def rebuild(self):
+        """Recompute every histogram with one grouped aggregation"""
+        with metrics.span("duration_effect_rebuild"):
+            games = {game["_id"]: game for game in self.get_db()["games"].find()}
+            histograms = {}
+            for row in self.get_db()["sessions"].aggregate(duration_pipeline(), allowDiskUse=True):
+                game = games.get(row["_id"]["game"])
+                if game is None or not row["_id"].get("baseline"):
+                    continue
+                histogram = histograms.setdefault(game["_id"], new_histogram())
+                bucket = duration_bucket(row["_id"]["duration"], game.get("avg_session_duration_minutes"))
+                histogram[bucket][classify_transition(row["_id"]["baseline"], row["_id"]["after"])] += row["count"]
+        with self.lock:
+            self.games = games
+            self.game_ids = {game["name"]: game_id for game_id, game in games.items()}
+            self.histograms = histograms
+            self.built_at = time.monotonic()
+
+    def rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception as e:
+            print(f"Error rebuilding duration effects: {e}")
+        finally:
+            self.rebuilding = False
+
+    def ensure_fresh(self):
+        """Build the histograms on first use, and refresh them in the background once they are stale"""
+        if self.built_at is None:
+            self.rebuild()
+        elif time.monotonic() - self.built_at > self.refresh_seconds and not self.rebuilding:
+            self.rebuilding = True
+            threading.Thread(target=self.rebuild_in_background, name="duration-effect-rebuild", daemon=True).start()
+
+    def apply(self, sessions):
+        """Fold published sessions (which carry their player's baseline) into the histograms"""
+        if self.built_at is None:
+            return
+        with self.lock:
+            for session in sessions:
+                game = self.games.get(session["game_id"])
+                if game is None or not session.get("baseline"):
+                    continue
+                histogram = self.histograms.setdefault(game["_id"], new_histogram())
+                bucket = duration_bucket(session["duration_minutes"], game.get("avg_session_duration_minutes"))
+                histogram[bucket][classify_transition(session["baseline"], session["mental_health_after"])] += 1
+
+    def curve(self, game_name):
+        """Duration-response curve and optimal bucket for a game, or None if the game isn't known"""
+        self.ensure_fresh()
+        if game_name not in self.game_ids:
+            # Rebuild only for a game added since the last rebuild, not for every unknown name
+            if not self.get_db()["games"].find_one({"name": game_name}, {"_id": 1}):
+                return None
+            self.rebuild()
+        with self.lock:
+            game_id = self.game_ids.get(game_name)
+            if game_id is None:
+                return None
+            game = self.games[game_id]
+            histogram = [dict(cell) for cell in self.histograms.get(game_id, new_histogram())]
+
+        design = game.get("avg_session_duration_minutes") or 0
+        curve = []
+        for (label, low, high), cell in zip(DURATION_BUCKETS, histogram):
+            sessions = sum(cell.values())
+            curve.append({
+                "label": label,
+                "min_minutes": low * design,
+                "max_minutes": high * design if high is not None else None,
+                "sessions": sessions,
+                **{f"{impact}_rate": cell[impact] / sessions if sessions else 0.0 for impact in IMPACT_CLASSES},
+                "score": wilson_lower_bound(cell["positive"], sessions, self.z)
+            })
+        observed = [bucket for bucket in curve if bucket["sessions"]]
+        return {
+            "game_name": game_name,
+            "design_minutes": design,
+            "sessions": sum(bucket["sessions"] for bucket in curve),
+            "optimal": max(observed, key=lambda bucket: bucket["score"]) if observed else None,
+            "curve": curve
+        }
+
+
+def describe_optimal(effect):
+    """One-line description of the best duration bucket, for prompts and fallback recommendations"""
+    optimal = (effect or {}).get("optimal")
+    if not optimal:
+        return None
+    if optimal["max_minutes"] is None:
+        span = f"over {round(optimal['min_minutes'])} minutes"
+    else:
+        span = f"{round(optimal['min_minutes'])}-{round(optimal['max_minutes'])} minutes"
+    return (f"{span} ({optimal['label']} of the design length): "
+            f"{round(optimal['positive_rate'] * 100, 1)}% positive over {optimal['sessions']} sessions")
+
+
+def create_router(index):
+    """Build the duration-effect route for a DurationEffectIndex"""
+    router = APIRouter(tags=["duration"])
+
+    @router.get("/games/{game_name}/duration-effect", response_model=DurationEffectResponse)
+    def duration_effect(game_name: str):
+        """Outcome rates by session length relative to the game's design length, with the best bucket"""
+        effect = index.curve(game_name)
+        if effect is None:
+            raise HTTPException(status_code=404, detail=f"Game '{game_name}' not found")
+        return effect
+
+    return router
+
+
+def add_duration_effect(app, index):
+    """Register the duration-effect route"""
+    app.include_router(create_router(index))
@@ -0,0 +1,51 @@
+"""
+Per-game aggregate counters in the game_stats collection.
+
+Each document holds a game's counters in the new_game_counters() shape
+(session count, duration sum and count, transition counts). The ingest
+batcher increments them after every flush, so the MongoDB statistics path
+reads one document instead of scanning the game's sessions.
+
+Sessions written some other way (data generation, a snapshot restore) don't
+touch the counters. A document whose session count differs from the game's
+actual count is rebuilt from one aggregation over that game's sessions, so
+the counters heal themselves after such writes or a failed increment.
+"""
+
+from datetime import datetime, UTC
+from pymongo import UpdateOne
+from analytics import transition_key, aggregate_game_counters, new_game_counters, counters_to_statistics
+
+
+def counter_updates(sessions):
+    """UpdateOne operations adding a batch of sessions (carrying their player's baseline) to the counters"""
+    increments = {}
+    for session in sessions:
+        inc = increments.setdefault(session["game_id"], {})
+        inc["sessions"] = inc.get("sessions", 0) + 1
+        if session.get("baseline"):
+            key = f"transitions.{transition_key(session['baseline'], session['mental_health_after'])}"
+            inc[key] = inc.get(key, 0) + 1
+            inc["duration_total"] = inc.get("duration_total", 0) + session["duration_minutes"]
+            inc["duration_count"] = inc.get("duration_count", 0) + 1
+
+    now = datetime.now(UTC)
+    return [
+        UpdateOne({"_id": game_id}, {"$inc": inc, "$set": {"updated_at": now}}, upsert=True)
+        for game_id, inc in increments.items()
+    ]
+
+
+def rebuild_counters(db, game_id):
+    """Recompute a game's counters from its sessions and store them"""
+    counters = aggregate_game_counters(db["sessions"], match={"game_id": game_id}).get(game_id, new_game_counters())
+    db["game_stats"].replace_one({"_id": game_id}, {**counters, "updated_at": datetime.now(UTC)}, upsert=True)
+    return counters
+
+
+def game_statistics(db, game):
+    """extract_game_statistics for a game document, read from its counters"""
+    counters = db["game_stats"].find_one({"_id": game["_id"]})
+    if counters is None or counters.get("sessions") != db["sessions"].count_documents({"game_id": game["_id"]}):
+        counters = rebuild_counters(db, game["_id"])
+    return counters_to_statistics(game, {**new_game_counters(), **counters})
@@ -1,40 +1,100 @@
 import os
-import json
+import argparse
 import random
-import re  # Add regex module for cleaning JSON
+from typing import List
 from datetime import datetime, timedelta, UTC  # Add UTC for timezone-aware datetime
 from dotenv import load_dotenv
-import google.generativeai as genai
-from pymongo import MongoClient
 from tqdm import tqdm
-from faker import Faker
+from pydantic import BaseModel, Field, TypeAdapter
+from llm import get_llm_provider
+from llm_parsing import generate_json, LLMParseError
+from llm_budget import BudgetExceeded
+import metrics
+from pipeline import Pipeline
+import mongo_monitor
+import database
+from analytics import MENTAL_HEALTH_STATES
 
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini API
-api_key = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=api_key)
+# Faker is created on first use so importing stays fast
+_fake = None
 
-# Connect to MongoDB
-mongo_uri = os.getenv("MONGODB_URI")
-db_name = os.getenv("DATABASE_NAME")
-client = MongoClient(mongo_uri)
-db = client[db_name]
+def get_db():
+    """Return the database with the bulk-load write concern"""
+    return database.get_database("seed")
 
-# Initialize Faker
-fake = Faker(['en_IN'])
+def get_faker():
+    """Return the shared Faker instance for Indian names"""
+    global _fake
+    if _fake is None:
+        from faker import Faker
+        _fake = Faker(['en_IN'])
+    return _fake
 
 # Collections
-players_collection = db["players"]
-games_collection = db["games"]
-sessions_collection = db["sessions"]
+def get_players_collection():
+    return get_db()["players"]
 
-# Mental health states
-MENTAL_HEALTH_STATES = ["Stressed", "Neutral", "Relaxed", "Excited", "Anxious"]
+def get_games_collection():
+    return get_db()["games"]
+
+def get_sessions_collection():
+    return get_db()["sessions"]
+
+# Mental health states (MENTAL_HEALTH_STATES lives in analytics)
 GAME_GENRES = ["Action", "Puzzle", "Strategy", "Simulation", "RPG", "Adventure", "Sports", "Racing", "Fighting", "Educational"]
 GAME_DIFFICULTIES = ["Easy", "Medium", "Hard"]
 
+PLAYER_COUNT = int(os.getenv("PLAYER_COUNT", 50))
+SESSIONS_PER_PLAYER = int(os.getenv("SESSIONS_PER_PLAYER", 5))
+GENERATE_SEED = int(os.getenv("GENERATE_SEED")) if os.getenv("GENERATE_SEED") else None
+INSERT_BATCH_SIZE = int(os.getenv("INSERT_BATCH_SIZE", 1000))
+
+# Shapes the LLM answers are validated into
+class GeneratedPlayer(BaseModel):
+    first: str
+    last: str
+    age: int
+    gender: str
+
+class SessionEffect(BaseModel):
+    mental_health_after: str = Field(min_length=1)
+    notes: str = Field(min_length=1)
+
+GENERATED_PLAYERS = TypeAdapter(List[GeneratedPlayer])
+
+# Common games that most people would recognize
+GAME_CATALOG = [
+    {"name": "Candy Crush", "genre": "Puzzle", "type": "Singleplayer", "avg_session_duration_minutes": 15, "difficulty": "Easy"},
+    {"name": "PUBG Mobile", "genre": "Action", "type": "Multiplayer", "avg_session_duration_minutes": 25, "difficulty": "Medium"},
+    {"name": "Minecraft", "genre": "Simulation", "type": "Both", "avg_session_duration_minutes": 60, "difficulty": "Medium"},
+    {"name": "Subway Surfers", "genre": "Action", "type": "Singleplayer", "avg_session_duration_minutes": 10, "difficulty": "Easy"},
+    {"name": "Ludo King", "genre": "Board", "type": "Multiplayer", "avg_session_duration_minutes": 20, "difficulty": "Easy"},
+    {"name": "Chess", "genre": "Strategy", "type": "Multiplayer", "avg_session_duration_minutes": 30, "difficulty": "Hard"},
+    {"name": "FIFA Mobile", "genre": "Sports", "type": "Both", "avg_session_duration_minutes": 20, "difficulty": "Medium"},
+    {"name": "Call of Duty Mobile", "genre": "Action", "type": "Multiplayer", "avg_session_duration_minutes": 25, "difficulty": "Medium"},
+    {"name": "Temple Run", "genre": "Action", "type": "Singleplayer", "avg_session_duration_minutes": 8, "difficulty": "Easy"},
+    {"name": "Among Us", "genre": "Strategy", "type": "Multiplayer", "avg_session_duration_minutes": 15, "difficulty": "Medium"},
+    {"name": "Angry Birds", "genre": "Puzzle", "type": "Singleplayer", "avg_session_duration_minutes": 12, "difficulty": "Easy"},
+    {"name": "Wordle", "genre": "Puzzle", "type": "Singleplayer", "avg_session_duration_minutes": 5, "difficulty": "Medium"},
+    {"name": "Clash of Clans", "genre": "Strategy", "type": "Multiplayer", "avg_session_duration_minutes": 15, "difficulty": "Medium"},
+    {"name": "Roblox", "genre": "Simulation", "type": "Multiplayer", "avg_session_duration_minutes": 40, "difficulty": "Easy"},
+    {"name": "Free Fire", "genre": "Action", "type": "Multiplayer", "avg_session_duration_minutes": 20, "difficulty": "Medium"},
+    {"name": "Tetris", "genre": "Puzzle", "type": "Singleplayer", "avg_session_duration_minutes": 10, "difficulty": "Medium"},
+    {"name": "Sudoku", "genre": "Puzzle", "type": "Singleplayer", "avg_session_duration_minutes": 15, "difficulty": "Medium"},
+    {"name": "8 Ball Pool", "genre": "Sports", "type": "Multiplayer", "avg_session_duration_minutes": 10, "difficulty": "Easy"},
+    {"name": "Fruit Ninja", "genre": "Action", "type": "Singleplayer", "avg_session_duration_minutes": 5, "difficulty": "Easy"},
+    {"name": "Asphalt 9", "genre": "Racing", "type": "Both", "avg_session_duration_minutes": 15, "difficulty": "Medium"},
+    {"name": "CalmQuest", "genre": "Puzzle", "type": "Singleplayer", "avg_session_duration_minutes": 45, "difficulty": "Medium"},
+    {"name": "MindfulMaze", "genre": "Puzzle", "type": "Singleplayer", "avg_session_duration_minutes": 30, "difficulty": "Easy"},
+    {"name": "ZenGarden", "genre": "Simulation", "type": "Singleplayer", "avg_session_duration_minutes": 25, "difficulty": "Easy"},
+    {"name": "RelaxRiver", "genre": "Adventure", "type": "Singleplayer", "avg_session_duration_minutes": 20, "difficulty": "Easy"},
+    {"name": "ThoughtfulThicket", "genre": "RPG", "type": "Singleplayer", "avg_session_duration_minutes": 45, "difficulty": "Medium"}
+]
+
+@metrics.timed("generate_player_data")
 def generate_player_data(count=50):
     """Generate player data using Gemini API for Indian names"""
     print("Generating player data...")
@@ -52,44 +112,43 @@ def generate_player_data(count=50):
     Output should be valid JSON array.
     """
     
-    model = genai.GenerativeModel('gemini-2.0-flash')
-    response = model.generate_content(prompt.format(count=count))
+    llm = get_llm_provider()
     
     # Parse the response to get the JSON array
     try:
-        # Extract JSON from the response
-        json_text = response.text
-        if "```json" in json_text:
-            json_text = json_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in json_text:
-            json_text = json_text.split("```")[1].split("```")[0].strip()
-        
-        players_data = json.loads(json_text)
+        # Parse the JSON array as the response streams in
+        players_data = generate_json(llm, prompt.format(count=count), GENERATED_PLAYERS)
         
-        # Add additional fields and insert into the collection
+        # Add additional fields, then insert INSERT_BATCH_SIZE at a time
+        players = []
         for player in tqdm(players_data):
             player_doc = {
                 "name": {
-                    "first": player["first"],
-                    "last": player["last"]
-                },                "age": player["age"],
-                "gender": player["gender"],
+                    "first": player.first,
+                    "last": player.last
+                },                "age": player.age,
+                "gender": player.gender,
                 "baseline_mental_health": random.choice(MENTAL_HEALTH_STATES),
                 "created_at": datetime.now(UTC)
             }
-            players_collection.insert_one(player_doc)
+            players.append(player_doc)
+
+        for start in range(0, len(players), INSERT_BATCH_SIZE):
+            get_players_collection().insert_many(players[start:start + INSERT_BATCH_SIZE], ordered=False)
         
         print(f"Successfully inserted {len(players_data)} player documents")
-        return players_collection.find()
+        return get_players_collection().find()
     
     except Exception as e:
         print(f"Error generating player data: {e}")
+        metrics.inc("llm_fallbacks_total", path="generate_player_data")
         # Fallback to Faker if Gemini API fails
         return generate_player_data_fallback(count)
 
 def generate_player_data_fallback(count=50):
     """Fallback method using Faker to generate Indian names"""
     print("Using fallback method to generate player data...")
+    fake = get_faker()
     
     players = []
     for _ in tqdm(range(count)):
@@ -104,59 +163,41 @@ def generate_player_data_fallback(count=50):
             "baseline_mental_health": random.choice(MENTAL_HEALTH_STATES),
             "created_at": datetime.now(UTC)
         }
-        result = players_collection.insert_one(player_doc)
-        players.append({"_id": result.inserted_id, **player_doc})
+        players.append(player_doc)
+
+    # insert_many sets each document's _id in place
+    for start in range(0, len(players), INSERT_BATCH_SIZE):
+        get_players_collection().insert_many(players[start:start + INSERT_BATCH_SIZE], ordered=False)
     
     print(f"Successfully inserted {count} player documents (fallback)")
     return players
 
+@metrics.timed("generate_game_data")
 def generate_game_data():
     """Generate common game data"""
     print("Generating game data...")
-    
-    # Common games that most people would recognize
-    games = [
-        {"name": "Candy Crush", "genre": "Puzzle", "type": "Singleplayer", "avg_session_duration_minutes": 15, "difficulty": "Easy"},
-        {"name": "PUBG Mobile", "genre": "Action", "type": "Multiplayer", "avg_session_duration_minutes": 25, "difficulty": "Medium"},
-        {"name": "Minecraft", "genre": "Simulation", "type": "Both", "avg_session_duration_minutes": 60, "difficulty": "Medium"},
-        {"name": "Subway Surfers", "genre": "Action", "type": "Singleplayer", "avg_session_duration_minutes": 10, "difficulty": "Easy"},
-        {"name": "Ludo King", "genre": "Board", "type": "Multiplayer", "avg_session_duration_minutes": 20, "difficulty": "Easy"},
-        {"name": "Chess", "genre": "Strategy", "type": "Multiplayer", "avg_session_duration_minutes": 30, "difficulty": "Hard"},
-        {"name": "FIFA Mobile", "genre": "Sports", "type": "Both", "avg_session_duration_minutes": 20, "difficulty": "Medium"},
-        {"name": "Call of Duty Mobile", "genre": "Action", "type": "Multiplayer", "avg_session_duration_minutes": 25, "difficulty": "Medium"},
-        {"name": "Temple Run", "genre": "Action", "type": "Singleplayer", "avg_session_duration_minutes": 8, "difficulty": "Easy"},
-        {"name": "Among Us", "genre": "Strategy", "type": "Multiplayer", "avg_session_duration_minutes": 15, "difficulty": "Medium"},
-        {"name": "Angry Birds", "genre": "Puzzle", "type": "Singleplayer", "avg_session_duration_minutes": 12, "difficulty": "Easy"},
-        {"name": "Wordle", "genre": "Puzzle", "type": "Singleplayer", "avg_session_duration_minutes": 5, "difficulty": "Medium"},
-        {"name": "Clash of Clans", "genre": "Strategy", "type": "Multiplayer", "avg_session_duration_minutes": 15, "difficulty": "Medium"},
-        {"name": "Roblox", "genre": "Simulation", "type": "Multiplayer", "avg_session_duration_minutes": 40, "difficulty": "Easy"},
-        {"name": "Free Fire", "genre": "Action", "type": "Multiplayer", "avg_session_duration_minutes": 20, "difficulty": "Medium"},
-        {"name": "Tetris", "genre": "Puzzle", "type": "Singleplayer", "avg_session_duration_minutes": 10, "difficulty": "Medium"},
-        {"name": "Sudoku", "genre": "Puzzle", "type": "Singleplayer", "avg_session_duration_minutes": 15, "difficulty": "Medium"},
-        {"name": "8 Ball Pool", "genre": "Sports", "type": "Multiplayer", "avg_session_duration_minutes": 10, "difficulty": "Easy"},
-        {"name": "Fruit Ninja", "genre": "Action", "type": "Singleplayer", "avg_session_duration_minutes": 5, "difficulty": "Easy"},
-        {"name": "Asphalt 9", "genre": "Racing", "type": "Both", "avg_session_duration_minutes": 15, "difficulty": "Medium"},
-        {"name": "CalmQuest", "genre": "Puzzle", "type": "Singleplayer", "avg_session_duration_minutes": 45, "difficulty": "Medium"},
-        {"name": "MindfulMaze", "genre": "Puzzle", "type": "Singleplayer", "avg_session_duration_minutes": 30, "difficulty": "Easy"},
-        {"name": "ZenGarden", "genre": "Simulation", "type": "Singleplayer", "avg_session_duration_minutes": 25, "difficulty": "Easy"},
-        {"name": "RelaxRiver", "genre": "Adventure", "type": "Singleplayer", "avg_session_duration_minutes": 20, "difficulty": "Easy"},
-        {"name": "ThoughtfulThicket", "genre": "RPG", "type": "Singleplayer", "avg_session_duration_minutes": 45, "difficulty": "Medium"}
-    ]
-      # Add created_at and insert into collection
+    games = GAME_CATALOG
+
+    # Add created_at and insert into collection
     game_ids = []
     for game in tqdm(games):
         game_doc = {
             **game,
             "created_at": datetime.now(UTC)
         }
-        result = games_collection.insert_one(game_doc)
+        result = get_games_collection().insert_one(game_doc)
         game_ids.append({"_id": result.inserted_id, **game_doc})
     
     print(f"Successfully inserted {len(games)} game documents")
     return game_ids
 
-def generate_session_data(players, games, count_per_player=5):
-    """Generate session data with mental health effects"""
+@metrics.timed("generate_session_data")
+def generate_session_data(players, games, count_per_player=5, use_llm=True):
+    """Generate session data with mental health effects and return the number of sessions inserted
+
+    With use_llm=False every session comes from the heuristic model, so a seeded run is reproducible.
+    Once the LLM token budget is exhausted the remaining sessions use the heuristic model too.
+    """
     print("Generating session data...")
       # Generate session data for mental health study
     prompt = """
@@ -178,8 +219,10 @@ def generate_session_data(players, games, count_per_player=5):
     Make sure to use double quotes, not single quotes, and avoid using special characters or line breaks in the values.
     """
     
-    model = genai.GenerativeModel('gemini-2.0-flash')
-    sessions = []
+    llm = get_llm_provider() if use_llm else None
+    # Sessions are inserted INSERT_BATCH_SIZE at a time
+    pending = []
+    inserted = 0
     # Current date for reference
     current_date = datetime.now(UTC)
     
@@ -189,6 +232,11 @@ def generate_session_data(players, games, count_per_player=5):
         player_games = random.sample(games, min(count_per_player, len(games)))
         
         for game in player_games:
+            if len(pending) >= INSERT_BATCH_SIZE:
+                get_sessions_collection().insert_many(pending, ordered=False)
+                inserted += len(pending)
+                pending = []
+
             # Randomize the session date (within the last 30 days)
             days_ago = random.randint(0, 30)
             session_date = current_date - timedelta(days=days_ago)
@@ -197,67 +245,34 @@ def generate_session_data(players, games, count_per_player=5):
             base_duration = game["avg_session_duration_minutes"]
             duration_variance = base_duration * 0.4  # 40% variance
             duration = max(5, int(base_duration + random.uniform(-duration_variance, duration_variance)))
+
+            if not use_llm:
+                pending.append(generate_session_fallback(player, game, session_date, duration))
+                continue
             
             try:
-                # Get mental health effect from Gemini
-                response = model.generate_content(
-                    prompt.format(
-                        baseline_mental_health=player["baseline_mental_health"],
-                        game_genre=game["genre"],
-                        game_name=game["name"],
-                        difficulty=game["difficulty"],
-                        duration=duration
-                    )
-                )                # Extract JSON from the response
-                json_text = response.text
-                
-                # Try to find and clean JSON data
+                # Get mental health effect from the LLM, parsed and validated as it streams in
                 try:
-                    # Try to extract from code blocks
-                    if "```json" in json_text:
-                        json_text = json_text.split("```json")[1].split("```")[0].strip()
-                    elif "```" in json_text:
-                        json_text = json_text.split("```")[1].split("```")[0].strip()
-                    
-                    # Manual JSON extraction as a last resort
-                    if "{" in json_text and "}" in json_text:
-                        # Extract text between the first { and last }
-                        start_idx = json_text.find('{')
-                        end_idx = json_text.rfind('}') + 1
-                        json_text = json_text[start_idx:end_idx]
-                    
-                    # Fix common issues with JSON
-                    json_text = re.sub(r'//.*?(\n|$)', '', json_text)  # Remove comments
-                    json_text = json_text.replace("'", '"')  # Replace single quotes with double quotes
-                    json_text = json_text.replace('\n', ' ')  # Remove newlines
-                    
-                    # Remove trailing commas before closing brackets
-                    json_text = re.sub(r',\s*}', '}', json_text)
-                    json_text = re.sub(r',\s*]', ']', json_text)
-                    
-                    # Fix missing quotes around keys
-                    json_text = re.sub(r'([{,]\s*)([a-zA-Z0-9_]+)(\s*:)', r'\1"\2"\3', json_text)
-                    
-                    # Try to parse the JSON
-                    effect_data = json.loads(json_text)
-                    
-                    # Validate expected structure
-                    if not isinstance(effect_data, dict):
-                        raise ValueError("Invalid JSON structure")
-                    
-                    # Make sure required fields exist
-                    mental_health_after = effect_data.get("mental_health_after")
-                    notes = effect_data.get("notes")
+                    effect = generate_json(
+                        llm,
+                        prompt.format(
+                            baseline_mental_health=player["baseline_mental_health"],
+                            game_genre=game["genre"],
+                            game_name=game["name"],
+                            difficulty=game["difficulty"],
+                            duration=duration
+                        ),
+                        SessionEffect
+                    )
+                    effect_data = effect.model_dump()
                     
-                    if not mental_health_after or not notes:
-                        raise ValueError("Missing required fields in JSON")
-                      # Ensure mental_health_after is valid
-                    if mental_health_after not in MENTAL_HEALTH_STATES:
-                        mental_health_after = random.choice(MENTAL_HEALTH_STATES)
-                        effect_data["mental_health_after"] = mental_health_after
+                    # Ensure mental_health_after is valid
+                    if effect.mental_health_after not in MENTAL_HEALTH_STATES:
+                        effect_data["mental_health_after"] = random.choice(MENTAL_HEALTH_STATES)
                     
-                except Exception as json_error:
+                except LLMParseError as json_error:
                     print(f"JSON parsing error: {json_error}, falling back to simple structure")
+                    metrics.inc("llm_parse_failures_total", path="generate_session_data")
                     # Create a simple fallback response if JSON parsing fails
                     effect_data = {
                         "mental_health_after": random.choice(MENTAL_HEALTH_STATES),
@@ -273,18 +288,27 @@ def generate_session_data(players, games, count_per_player=5):
                     "notes": effect_data["notes"]
                 }
                 
-                sessions_collection.insert_one(session_doc)
-                sessions.append(session_doc)
+                pending.append(session_doc)
+                
+            except BudgetExceeded as e:
+                # Waiting out a daily budget isn't an option for a bulk load, so stop calling the LLM
+                print(f"{e}, generating the remaining sessions with the heuristic model")
+                metrics.inc("llm_fallbacks_total", path="generate_session_data")
+                use_llm = False
+                pending.append(generate_session_fallback(player, game, session_date, duration))
                 
             except Exception as e:
                 print(f"Error generating session data: {e}")
+                metrics.inc("llm_fallbacks_total", path="generate_session_data")
                 # Fallback to a simple heuristic model
-                session_doc = generate_session_fallback(player, game, session_date, duration)
-                sessions_collection.insert_one(session_doc)
-                sessions.append(session_doc)
+                pending.append(generate_session_fallback(player, game, session_date, duration))
+
+    if pending:
+        get_sessions_collection().insert_many(pending, ordered=False)
+        inserted += len(pending)
     
-    print(f"Successfully inserted {len(sessions)} session documents")
-    return sessions
+    print(f"Successfully inserted {inserted} session documents")
+    return inserted
 
 def generate_session_fallback(player, game, session_date, duration):
     """Fallback method for generating session data using simple heuristics"""
@@ -439,25 +463,65 @@ def generate_note_for_transition(before, after, game, duration):
     
     return random.choice(notes)
 
-def run_data_generation():
+def seed_generation(seed, stage):
+    """Seed random and Faker for one generation stage, so it is reproducible on its own"""
+    random.seed(f"{seed}:{stage}")
+    get_faker().seed_instance(seed)
+
+def add_generation_stages(pipeline, player_count=PLAYER_COUNT, sessions_per_player=SESSIONS_PER_PLAYER,
+                          seed=GENERATE_SEED):
+    """Add the players, games and sessions stages to a pipeline.Pipeline
+
+    Each stage replaces the contents of its own collection. Players and games
+    don't depend on each other, so they run concurrently; sessions need both.
+    With a seed, players come from Faker and sessions from the heuristic model
+    instead of the LLM, so the same seed always produces the same data.
+    """
+    provider = os.getenv("LLM_PROVIDER", "gemini").lower() if seed is None else None
+
+    def players_stage(context):
+        get_players_collection().delete_many({})
+        if seed is None:
+            context["players"] = list(generate_player_data(player_count))
+        else:
+            seed_generation(seed, "players")
+            context["players"] = generate_player_data_fallback(player_count)
+        return len(context["players"])
+
+    def games_stage(context):
+        get_games_collection().delete_many({})
+        context["games"] = generate_game_data()
+        return len(context["games"])
+
+    def sessions_stage(context):
+        # A skipped upstream stage leaves its documents in MongoDB rather than in the context
+        players = context.get("players") or list(get_players_collection().find())
+        games = context.get("games") or list(get_games_collection().find())
+        get_sessions_collection().delete_many({})
+        if seed is not None:
+            seed_generation(seed, "sessions")
+        return generate_session_data(players, games, sessions_per_player, use_llm=seed is None)
+
+    pipeline.add("players", players_stage, fingerprint={"count": player_count, "llm": provider, "seed": seed},
+                 outputs=["players"])
+    pipeline.add("games", games_stage, fingerprint={"catalog": GAME_CATALOG}, outputs=["games"])
+    pipeline.add("sessions", sessions_stage, deps=["players", "games"],
+                 fingerprint={"per_player": sessions_per_player, "llm": provider, "seed": seed},
+                 inputs=["players", "games"], outputs=["sessions"])
+    return pipeline
+
+def run_data_generation(force=False, seed=GENERATE_SEED):
     """Run the full data generation process"""
     print("Starting data generation process...")
-    
-    # Clear existing collections if they exist
-    players_collection.delete_many({})
-    games_collection.delete_many({})
-    sessions_collection.delete_many({})
-    
-    # Generate and load data
-    players = list(generate_player_data())
-    games = generate_game_data()
-    sessions = generate_session_data(players, games)
-    
+
+    # Stage timings and throughput are printed by the pipeline
+    add_generation_stages(Pipeline(get_db), seed=seed).run(force=force)
+
     # Summary
     print("\nData Generation Complete!")
-    print(f"Generated {len(players)} players")
-    print(f"Generated {len(games)} games")
-    print(f"Generated {len(sessions)} gaming sessions")
+    print(f"{get_players_collection().count_documents({})} players")
+    print(f"{get_games_collection().count_documents({})} games")
+    print(f"{get_sessions_collection().count_documents({})} gaming sessions")
     
     # Example queries
     print("\nExample Summary Queries:")
@@ -469,7 +533,7 @@ def run_data_generation():
         {"$group": {"_id": "$game_info.genre", "count": {"$sum": 1}}},
         {"$sort": {"count": -1}}
     ]
-    genre_counts = list(sessions_collection.aggregate(pipeline))
+    genre_counts = list(get_sessions_collection().aggregate(pipeline))
     print("\nSessions by Game Genre:")
     for genre in genre_counts:
         print(f"{genre['_id']}: {genre['count']} sessions")
@@ -487,10 +551,20 @@ def run_data_generation():
         }},
         {"$sort": {"count": -1}}
     ]
-    transition_counts = list(sessions_collection.aggregate(pipeline))
+    transition_counts = list(get_sessions_collection().aggregate(pipeline))
     print("\nMental Health Transitions (Before -> After):")
     for transition in transition_counts:
         print(f"{transition['_id']['before']} -> {transition['_id']['after']}: {transition['count']} instances")
+    
+    # Query plans for anything slower than MONGO_SLOW_QUERY_MS
+    if mongo_monitor.listener:
+        print()
+        print(mongo_monitor.format_report(mongo_monitor.build_report(database.get_client())))
 
 if __name__ == "__main__":
-    run_data_generation()
+    parser = argparse.ArgumentParser(description="Generate synthetic players, games and gaming sessions")
+    parser.add_argument("--force", action="store_true", help="Regenerate every collection even if it is up to date")
+    parser.add_argument("--seed", type=int, default=GENERATE_SEED,
+                        help="Generate reproducible data with Faker and the heuristic model instead of the LLM")
+    args = parser.parse_args()
+    run_data_generation(force=args.force, seed=args.seed)
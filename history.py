@@ -0,0 +1,128 @@
+"""
+Per-player session history with keyset pagination.
+
+GET /players/{player_id}/history returns a player's sessions newest first.
+Pages are cut with a keyset cursor on (session_date, _id) instead of
+skip/limit: the next page starts strictly after the last session of this
+one, so every page is one range scan of the (player_id, session_date, _id)
+index however deep the client pages, and sessions inserted meanwhile don't
+shift the pages.
+"""
+
+import os
+import base64
+from datetime import datetime, UTC
+from typing import List, Optional
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel
+
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 50))
+HISTORY_MAX_PAGE_SIZE = 500
+
+SESSION_FIELDS = {"game_id": 1, "session_date": 1, "duration_minutes": 1, "mental_health_after": 1, "notes": 1}
+
+
+class HistorySession(BaseModel):
+    session_id: str
+    game_id: str
+    game_name: Optional[str] = None
+    session_date: datetime
+    duration_minutes: int
+    mental_health_after: str
+    notes: Optional[str] = None
+
+
+class PlayerHistoryResponse(BaseModel):
+    player_id: str
+    baseline_mental_health: Optional[str] = None
+    sessions: List[HistorySession]
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(session):
+    """Opaque cursor pointing just past a session"""
+    millis = int(session["session_date"].replace(tzinfo=UTC).timestamp() * 1000)
+    return base64.urlsafe_b64encode(f"{millis}:{session['_id']}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(session_date, _id) of the last session of the previous page"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        millis, session_id = raw.split(":")
+        return datetime.fromtimestamp(int(millis) / 1000, UTC), ObjectId(session_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def history_query(player_id, cursor=None):
+    """Filter for one page; with a cursor, only sessions strictly older than its position"""
+    query = {"player_id": player_id}
+    if cursor:
+        session_date, session_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"session_date": {"$lt": session_date}},
+            {"session_date": session_date, "_id": {"$lt": session_id}}
+        ]
+    return query
+
+
+def player_history(db, player_id, limit=HISTORY_PAGE_SIZE, cursor=None):
+    """One page of a player's sessions, newest first, or None if the player doesn't exist"""
+    player = db["players"].find_one({"_id": player_id}, {"baseline_mental_health": 1})
+    if player is None:
+        return None
+
+    # One extra session tells us whether there is a next page
+    sessions = list(
+        db["sessions"].find(history_query(player_id, cursor), SESSION_FIELDS)
+        .sort([("session_date", -1), ("_id", -1)])
+        .limit(limit + 1)
+    )
+    has_more = len(sessions) > limit
+    sessions = sessions[:limit]
+
+    game_ids = list({session["game_id"] for session in sessions})
+    names = {game["_id"]: game["name"] for game in db["games"].find({"_id": {"$in": game_ids}}, {"name": 1})}
+    return {
+        "player_id": str(player_id),
+        "baseline_mental_health": player.get("baseline_mental_health"),
+        "sessions": [
+            {
+                "session_id": str(session["_id"]),
+                "game_id": str(session["game_id"]),
+                "game_name": names.get(session["game_id"]),
+                "session_date": session["session_date"],
+                "duration_minutes": session["duration_minutes"],
+                "mental_health_after": session["mental_health_after"],
+                "notes": session.get("notes")
+            }
+            for session in sessions
+        ],
+        "next_cursor": encode_cursor(sessions[-1]) if has_more else None
+    }
+
+
+def create_router(get_db):
+    """Build the player history route"""
+    router = APIRouter(tags=["players"])
+
+    @router.get("/players/{player_id}/history", response_model=PlayerHistoryResponse)
+    def get_player_history(player_id: str,
+                           limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+                           cursor: Optional[str] = None):
+        """A player's sessions, newest first; pass next_cursor back as cursor for the following page"""
+        if not ObjectId.is_valid(player_id):
+            raise HTTPException(status_code=404, detail=f"Player '{player_id}' not found")
+        history = player_history(get_db(), ObjectId(player_id), limit, cursor)
+        if history is None:
+            raise HTTPException(status_code=404, detail=f"Player '{player_id}' not found")
+        return history
+
+    return router
+
+
+def add_history(app, get_db):
+    """Register the player history route"""
+    app.include_router(create_router(get_db))
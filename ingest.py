@@ -0,0 +1,262 @@
+"""
+High-throughput session ingestion for the Gaming and Mental Health Analysis Platform.
+
+POST /sessions and POST /sessions/bulk validate incoming sessions and hand
+them to an in-process micro-batcher. A background thread flushes the queue to
+MongoDB with insert_many whenever INGEST_BATCH_SIZE sessions are waiting or
+INGEST_FLUSH_MS has passed, increments the per-game counters in the
+game_stats collection and hands the stored sessions to its listeners (the
+API's in-memory indexes). When INGEST_MAX_QUEUE sessions are already
+waiting, requests are rejected with 429 so clients back off.
+"""
+
+import os
+import queue
+import threading
+import time
+from datetime import datetime, UTC
+from typing import List, Literal, Optional
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field, field_validator, model_validator
+from pymongo.errors import BulkWriteError, ConnectionFailure, PyMongoError
+from game_stats import counter_updates
+import metrics
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 1000))
+INGEST_FLUSH_MS = float(os.getenv("INGEST_FLUSH_MS", 50))
+INGEST_MAX_QUEUE = int(os.getenv("INGEST_MAX_QUEUE", 50000))
+INGEST_MAX_BULK = int(os.getenv("INGEST_MAX_BULK", 5000))
+# Backoff between attempts to insert a batch after a network error or failover, doubling up to the maximum
+INGEST_RETRY_MS = float(os.getenv("INGEST_RETRY_MS", 100))
+INGEST_MAX_RETRY_MS = float(os.getenv("INGEST_MAX_RETRY_MS", 5000))
+# Attempts left for a failing batch once the batcher is stopping, so shutdown can't hang on a dead server
+INGEST_SHUTDOWN_RETRIES = 3
+DUPLICATE_KEY = 11000
+
+MentalHealthState = Literal["Stressed", "Neutral", "Relaxed", "Excited", "Anxious"]
+
+
+def validate_object_id(value):
+    if value is not None and not ObjectId.is_valid(value):
+        raise ValueError(f"'{value}' is not a valid ObjectId")
+    return value
+
+
+class SessionIn(BaseModel):
+    player_id: str
+    game_id: Optional[str] = None
+    game_name: Optional[str] = None
+    session_date: Optional[datetime] = None
+    duration_minutes: int = Field(gt=0, le=1440)
+    mental_health_after: MentalHealthState
+    notes: str = Field("", max_length=1000)
+
+    _check_ids = field_validator("player_id", "game_id")(validate_object_id)
+
+    @model_validator(mode="after")
+    def require_game(self):
+        if not self.game_id and not self.game_name:
+            raise ValueError("Either game_id or game_name is required")
+        return self
+
+
+class BulkSessionsIn(BaseModel):
+    sessions: List[SessionIn] = Field(min_length=1, max_length=INGEST_MAX_BULK)
+
+
+class IngestResponse(BaseModel):
+    accepted: int
+
+
+class SessionBatcher:
+    """Queue sessions and flush them to MongoDB in batches from a background thread"""
+
+    def __init__(self, get_db, batch_size=INGEST_BATCH_SIZE, flush_ms=INGEST_FLUSH_MS, max_queue=INGEST_MAX_QUEUE):
+        # get_db is called on use, so the MongoDB client isn't needed until the first request
+        self.get_db = get_db
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.submit_lock = threading.Lock()
+        self.listeners = []
+        self.game_ids = {}
+        self.game_ids_lock = threading.Lock()
+        self.thread = None
+        self.stopping = threading.Event()
+
+    @property
+    def sessions_collection(self):
+        return self.get_db()["sessions"]
+
+    @property
+    def players_collection(self):
+        return self.get_db()["players"]
+
+    @property
+    def games_collection(self):
+        return self.get_db()["games"]
+
+    @property
+    def game_stats_collection(self):
+        return self.get_db()["game_stats"]
+
+    def add_listener(self, listener):
+        """Call listener(sessions) after every flush; sessions carry their player's baseline"""
+        self.listeners.append(listener)
+
+    def resolve_game_id(self, session):
+        """Return the game ObjectId for a SessionIn, looking names up through a small cache"""
+        if session.game_id:
+            return ObjectId(session.game_id)
+        with self.game_ids_lock:
+            game_id = self.game_ids.get(session.game_name)
+        if game_id is None:
+            game = self.games_collection.find_one({"name": session.game_name}, {"_id": 1})
+            if not game:
+                raise HTTPException(status_code=404, detail=f"Game '{session.game_name}' not found")
+            with self.game_ids_lock:
+                game_id = self.game_ids.setdefault(session.game_name, game["_id"])
+        return game_id
+
+    def to_document(self, session):
+        return {
+            "player_id": ObjectId(session.player_id),
+            "game_id": self.resolve_game_id(session),
+            "session_date": session.session_date or datetime.now(UTC),
+            "duration_minutes": session.duration_minutes,
+            "mental_health_after": session.mental_health_after,
+            "notes": session.notes
+        }
+
+    def submit(self, sessions):
+        """Queue validated sessions; returns False without queueing any if there is no room"""
+        documents = [self.to_document(session) for session in sessions]
+        with self.submit_lock:
+            if self.queue.maxsize - self.queue.qsize() < len(documents):
+                metrics.inc("ingest_rejected_total", value=len(documents))
+                return False
+            for document in documents:
+                self.queue.put_nowait(document)
+        metrics.inc("ingest_accepted_total", value=len(documents))
+        return True
+
+    def start(self):
+        if self.thread is None:
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self.run, name="session-batcher", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Stop the background thread after flushing everything still queued"""
+        if self.thread is not None:
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        while not (self.stopping.is_set() and self.queue.empty()):
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self.flush(batch)
+                except Exception as e:
+                    print(f"Error flushing session batch: {e}")
+                    metrics.inc("ingest_flush_errors_total")
+
+    def insert(self, batch):
+        """Insert a batch, retrying network errors and failovers; returns the documents stored
+
+        The sessions were already answered with 202, so a transient error keeps the batcher retrying (and the
+        queue filling up, so new requests get 429) rather than dropping them. Documents keep the _id set by the
+        first attempt, so a duplicate key error on a retry means an earlier attempt already stored that one.
+        """
+        delay = INGEST_RETRY_MS / 1000
+        shutdown_retries = INGEST_SHUTDOWN_RETRIES
+        while True:
+            try:
+                self.sessions_collection.insert_many(batch, ordered=False)
+                return batch
+            except BulkWriteError as e:
+                failed = {error["index"] for error in e.details.get("writeErrors", []) if error["code"] != DUPLICATE_KEY}
+                if failed:
+                    print(f"Failed to insert {len(failed)} of {len(batch)} sessions")
+                return [doc for i, doc in enumerate(batch) if i not in failed]
+            except PyMongoError as e:
+                transient = isinstance(e, ConnectionFailure) or e.has_error_label("RetryableWriteError")
+                if not transient or (self.stopping.is_set() and shutdown_retries == 0):
+                    raise
+                if self.stopping.is_set():
+                    shutdown_retries -= 1
+                print(f"Inserting session batch failed ({e}), retrying in {delay:.1f}s")
+                metrics.inc("ingest_flush_retries_total")
+                time.sleep(delay)
+                delay = min(delay * 2, INGEST_MAX_RETRY_MS / 1000)
+
+    def flush(self, batch):
+        """Insert a batch, update per-game counters and notify listeners"""
+        with metrics.span("ingest_flush"):
+            inserted = self.insert(batch)
+            metrics.inc("ingest_sessions_total", value=len(inserted))
+            if not inserted:
+                return
+
+            try:
+                for doc in inserted:
+                    doc["baseline"] = None
+                player_ids = list({doc["player_id"] for doc in inserted})
+                baselines = {
+                    player["_id"]: player.get("baseline_mental_health")
+                    for player in self.players_collection.find({"_id": {"$in": player_ids}}, {"baseline_mental_health": 1})
+                }
+                for doc in inserted:
+                    doc["baseline"] = baselines.get(doc["player_id"])
+
+                self.game_stats_collection.bulk_write(counter_updates(inserted), ordered=False)
+            finally:
+                # The sessions are stored, so the in-memory indexes get them even if the follow-up work failed
+                for listener in self.listeners:
+                    try:
+                        listener(inserted)
+                    except Exception as e:
+                        print(f"Ingest listener failed: {e}")
+
+
+def create_router(batcher):
+    """Build the ingestion routes for a batcher"""
+    router = APIRouter(tags=["ingest"])
+
+    # Plain def: resolving a game name may query MongoDB, so FastAPI runs these in its threadpool
+    @router.post("/sessions", response_model=IngestResponse, status_code=202)
+    def ingest_session(session: SessionIn):
+        """Queue a single play session"""
+        if not batcher.submit([session]):
+            raise HTTPException(status_code=429, detail="Ingest queue is full, retry later",
+                                headers={"Retry-After": "1"})
+        return {"accepted": 1}
+
+    @router.post("/sessions/bulk", response_model=IngestResponse, status_code=202)
+    def ingest_sessions_bulk(payload: BulkSessionsIn):
+        """Queue many play sessions at once; all or none are accepted"""
+        if not batcher.submit(payload.sessions):
+            raise HTTPException(status_code=429, detail="Ingest queue is full, retry later",
+                                headers={"Retry-After": "1"})
+        return {"accepted": len(payload.sessions)}
+
+    return router
+
+
+def add_ingestion(app, batcher):
+    """Register the ingestion routes and tie the batcher to the app lifecycle"""
+    app.include_router(create_router(batcher))
+    app.add_event_handler("startup", batcher.start)
+    app.add_event_handler("shutdown", batcher.stop)
@@ -0,0 +1,299 @@
+"""
+Real-time per-game counters pushed over WebSockets.
+
+A background thread seeds per-game counters with one grouped aggregation,
+then follows a MongoDB change stream on the sessions collection. Inserted
+sessions are folded into the counters and, every LIVE_COALESCE_MS, one delta
+per changed game is fanned out to clients connected to
+/ws/games/{game_name}. Clients receive a snapshot on connect and deltas
+afterwards, so dashboards never need to poll /analyze.
+
+Change streams need a replica set; a single-node one is enough:
+
+    mongod --replSet rs0 --dbpath data/
+    mongosh --eval "rs.initiate()"
+
+Enabled with LIVE_UPDATES=1.
+
+The seeding aggregation reads a snapshot of the sessions at one cluster
+time, and the change stream starts at that same time, so every session is
+counted exactly once: inserts up to the snapshot are in the seed (the stream
+skips any event at or before it), later ones arrive on the stream. Snapshot
+reads need MongoDB 5.0 or later.
+"""
+
+import os
+import time
+import asyncio
+import threading
+from datetime import datetime, UTC
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from pymongo.errors import OperationFailure, PyMongoError
+from analytics import new_game_counters, add_to_counters, compute_impact_stats, aggregate_game_counters
+import metrics
+
+LIVE_UPDATES = os.getenv("LIVE_UPDATES", "0") == "1"
+LIVE_COALESCE_MS = float(os.getenv("LIVE_COALESCE_MS", 250))
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Change stream errors that mean the deployment can't support change streams at all
+UNSUPPORTED_CODES = {40573, 40324}
+
+
+def offer(queue, message):
+    """Queue a message for a subscriber, dropping the oldest one if it is falling behind"""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(message)
+
+
+class GameCounterStream:
+    """Per-game counters kept current from the sessions change stream"""
+
+    def __init__(self, get_db, coalesce_ms=LIVE_COALESCE_MS):
+        # get_db is called on use, so the MongoDB client isn't needed until the stream starts
+        self.get_db = get_db
+        self.coalesce_interval = coalesce_ms / 1000
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.games = {}
+        self.baselines = {}
+        self.subscribers = {}
+        self.listeners = []
+        self.resume_token = None
+        # Cluster time of the seeding snapshot; the stream starts there
+        self.seeded_at = None
+        self.active = False
+        self.stopping = threading.Event()
+        self.thread = None
+
+    @property
+    def sessions_collection(self):
+        return self.get_db()["sessions"]
+
+    @property
+    def players_collection(self):
+        return self.get_db()["players"]
+
+    @property
+    def games_collection(self):
+        return self.get_db()["games"]
+
+    def add_listener(self, listener):
+        """Call listener(sessions) for every batch of inserted sessions seen on the stream"""
+        self.listeners.append(listener)
+
+    def start(self):
+        if self.thread is None:
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self.run, name="session-change-stream", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    # -- counters ---------------------------------------------------------
+
+    def game_by_name(self, game_name):
+        """Return the game document for a name, loading new games on a miss"""
+        for game in self.games.values():
+            if game["name"] == game_name:
+                return game
+        game = self.games_collection.find_one({"name": game_name})
+        if game:
+            self.games[game["_id"]] = game
+        return game
+
+    def snapshot(self, game_id):
+        """Current counters for a game plus derived impact percentages"""
+        with self.lock:
+            counters = self.counters.get(game_id, new_game_counters())
+            counters = {**counters, "transitions": dict(counters["transitions"])}
+        counters["mental_health_impact"] = compute_impact_stats(counters["transitions"], counters["sessions"])
+        return counters
+
+    def compute_snapshot(self, game_id):
+        """Counters for one game straight from MongoDB, for when the stream isn't running"""
+        counters = aggregate_game_counters(self.sessions_collection, match={"game_id": game_id})
+        counters = counters.get(game_id, new_game_counters())
+        counters["mental_health_impact"] = compute_impact_stats(counters["transitions"], counters["sessions"])
+        return counters
+
+    def seed(self):
+        """Load the games and compute starting counters for every game from one snapshot"""
+        self.games = {game["_id"]: game for game in self.games_collection.find()}
+        with self.get_db().client.start_session(snapshot=True) as session:
+            counters = aggregate_game_counters(self.sessions_collection, session=session)
+            # A snapshot read answers with the cluster time it read at as its operationTime
+            seeded_at = session.operation_time
+        with self.lock:
+            self.counters = counters
+            self.seeded_at = seeded_at
+
+    def resolve_baselines(self, sessions):
+        """Attach each session's player baseline, fetching unseen players in one query"""
+        missing = list({s["player_id"] for s in sessions if s["player_id"] not in self.baselines})
+        if missing:
+            for player in self.players_collection.find({"_id": {"$in": missing}}, {"baseline_mental_health": 1}):
+                self.baselines[player["_id"]] = player.get("baseline_mental_health")
+        for session in sessions:
+            session["baseline"] = self.baselines.get(session["player_id"])
+
+    def apply(self, sessions):
+        """Fold inserted sessions into the counters and return per-game deltas"""
+        self.resolve_baselines(sessions)
+        deltas = {}
+        with self.lock:
+            for session in sessions:
+                game_counters = self.counters.setdefault(session["game_id"], new_game_counters())
+                add_to_counters(game_counters, session["baseline"], session["mental_health_after"], session["duration_minutes"])
+                delta = deltas.setdefault(session["game_id"], new_game_counters())
+                add_to_counters(delta, session["baseline"], session["mental_health_after"], session["duration_minutes"])
+        return deltas
+
+    # -- fan-out ----------------------------------------------------------
+
+    def subscribe(self, game_id, loop):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self.lock:
+            self.subscribers.setdefault(game_id, set()).add((loop, queue))
+        return queue
+
+    def unsubscribe(self, game_id, loop, queue):
+        with self.lock:
+            self.subscribers.get(game_id, set()).discard((loop, queue))
+
+    def broadcast(self, deltas):
+        now = datetime.now(UTC).isoformat()
+        for game_id, delta in deltas.items():
+            with self.lock:
+                targets = list(self.subscribers.get(game_id, ()))
+            if not targets:
+                continue
+            game = self.games.get(game_id) or {}
+            message = {
+                "type": "delta",
+                "game": game.get("name"),
+                "at": now,
+                "delta": delta,
+                "totals": self.snapshot(game_id)
+            }
+            for loop, queue in targets:
+                loop.call_soon_threadsafe(offer, queue, message)
+
+    # -- change stream ----------------------------------------------------
+
+    def run(self):
+        try:
+            self.seed()
+        except PyMongoError as e:
+            print(f"Live updates disabled, could not seed counters: {e}")
+            return
+
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        while not self.stopping.is_set():
+            try:
+                # Resume where the last stream stopped, or pick up right at the seeding snapshot
+                start_at = self.seeded_at if self.resume_token is None else None
+                with self.sessions_collection.watch(pipeline, resume_after=self.resume_token,
+                                                    start_at_operation_time=start_at,
+                                                    max_await_time_ms=int(self.coalesce_interval * 1000)) as stream:
+                    self.active = True
+                    print("Live updates: following the sessions change stream")
+                    self.follow(stream)
+            except OperationFailure as e:
+                if e.code in UNSUPPORTED_CODES:
+                    print(f"Live updates disabled, change streams need a replica set: {e}")
+                    break
+                print(f"Change stream error, resuming: {e}")
+                time.sleep(1)
+            except PyMongoError as e:
+                print(f"Change stream error, resuming: {e}")
+                time.sleep(1)
+        self.active = False
+
+    def follow(self, stream):
+        """Read the stream, applying and broadcasting inserts every coalesce interval"""
+        pending = []
+        deadline = time.monotonic() + self.coalesce_interval
+        while not self.stopping.is_set() and stream.alive:
+            change = stream.try_next()
+            if change is not None:
+                # Events at the snapshot time itself are already in the seeded counters
+                if self.seeded_at is None or change["clusterTime"] > self.seeded_at:
+                    pending.append(change["fullDocument"])
+                self.resume_token = stream.resume_token
+            if pending and (time.monotonic() >= deadline or len(pending) >= 10_000):
+                with metrics.span("live_updates_apply"):
+                    deltas = self.apply(pending)
+                for listener in self.listeners:
+                    try:
+                        listener(pending)
+                    except Exception as e:
+                        print(f"Live update listener failed: {e}")
+                self.broadcast(deltas)
+                metrics.inc("live_update_sessions_total", value=len(pending))
+                pending = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.coalesce_interval
+            # Persist the position even when no inserts matched
+            if change is None and stream.resume_token is not None:
+                self.resume_token = stream.resume_token
+
+
+def create_router(stream):
+    """Build the WebSocket route for a GameCounterStream"""
+    router = APIRouter(tags=["live"])
+
+    @router.websocket("/ws/games/{game_name}")
+    async def game_updates(websocket: WebSocket, game_name: str):
+        """Send a counter snapshot for a game, then a delta whenever new sessions arrive"""
+        game = await run_in_threadpool(stream.game_by_name, game_name)
+        if not game:
+            await websocket.close(code=4404, reason=f"Game '{game_name}' not found")
+            return
+
+        await websocket.accept()
+        loop = asyncio.get_running_loop()
+        queue = stream.subscribe(game["_id"], loop)
+        try:
+            if stream.active:
+                totals = stream.snapshot(game["_id"])
+            else:
+                totals = await run_in_threadpool(stream.compute_snapshot, game["_id"])
+            await websocket.send_json({
+                "type": "snapshot",
+                "game": game_name,
+                "live": stream.active,
+                "totals": totals
+            })
+
+            async def send_deltas():
+                while True:
+                    await websocket.send_json(await queue.get())
+
+            sender = asyncio.create_task(send_deltas())
+            try:
+                # Clients don't send anything; reading just notices when they go away
+                while True:
+                    await websocket.receive_text()
+            finally:
+                sender.cancel()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            stream.unsubscribe(game["_id"], loop, queue)
+
+    return router
+
+
+def add_live_updates(app, stream):
+    """Register the WebSocket route and, when LIVE_UPDATES=1, run the change stream with the app"""
+    app.include_router(create_router(stream))
+    if LIVE_UPDATES:
+        app.add_event_handler("startup", stream.start)
+        app.add_event_handler("shutdown", stream.stop)
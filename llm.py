@@ -0,0 +1,285 @@
+"""
+LLM provider interface for the Gaming and Mental Health Analysis Platform.
+
+The backend is selected with the LLM_PROVIDER environment variable:
+- "gemini" (default): Google Gemini via google-generativeai
+- "fake": a local, network-free provider returning JSON in the shape of the
+  schema the caller will validate it into, with configurable latency, error
+  and rate-limit behaviour for load testing
+
+Fake provider settings:
+- FAKE_LLM_LATENCY: latency distribution in milliseconds, one of
+  "fixed:MS", "uniform:LOW,HIGH", "normal:MEAN,STDDEV" or "lognormal:MEDIAN,SIGMA"
+- FAKE_LLM_ERROR_RATE: probability (0-1) of raising LLMError
+- FAKE_LLM_RATE_LIMIT_RATE: probability (0-1) of raising RateLimitError
+- FAKE_LLM_MALFORMED_RATE: probability (0-1) of returning slightly broken JSON
+- FAKE_LLM_SEED: seed for reproducible responses and latencies
+- FAKE_LLM_STREAM_CHUNKS: number of chunks stream() splits a response into
+
+get_llm_provider() wraps the backend in llm_budget.BudgetedProvider, which
+counts tokens and enforces the LLM_TOKENS_PER_* budgets.
+"""
+
+import os
+import re
+import json
+import math
+import time
+import random
+import threading
+from dotenv import load_dotenv
+import metrics
+from analytics import MENTAL_HEALTH_STATES
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+
+
+class LLMError(Exception):
+    """Raised when the LLM backend fails to produce a response"""
+
+
+class RateLimitError(LLMError):
+    """Raised when the LLM backend rejects a call because of rate limiting (HTTP 429)"""
+
+
+class LLMProvider:
+    """Base class for LLM backends; subclasses implement _generate() and optionally _stream()"""
+
+    name = "base"
+
+    def generate(self, prompt, schema=None):
+        """Return the text response for prompt, recording call metrics
+
+        schema is the pydantic model or TypeAdapter the answer will be validated into, if any.
+        """
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            return self._generate(prompt, schema)
+        except RateLimitError:
+            outcome = "rate_limited"
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            metrics.observe("span_duration_seconds", time.perf_counter() - start, span="llm_generate")
+            metrics.inc("llm_calls_total", provider=self.name, outcome=outcome)
+
+    def stream(self, prompt, schema=None):
+        """Yield the text response for prompt in chunks as it arrives, recording call metrics
+
+        Closing the generator early (once the caller has what it needs) counts as a successful call.
+        """
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield from self._stream(prompt, schema)
+        except RateLimitError:
+            outcome = "rate_limited"
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            metrics.observe("span_duration_seconds", time.perf_counter() - start, span="llm_generate")
+            metrics.inc("llm_calls_total", provider=self.name, outcome=outcome)
+
+    def _generate(self, prompt, schema=None):
+        raise NotImplementedError
+
+    def _stream(self, prompt, schema=None):
+        # Backends without streaming answer in one chunk
+        yield self._generate(prompt, schema)
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini backend"""
+
+    name = "gemini"
+
+    def __init__(self, model_name=DEFAULT_MODEL):
+        # Imported here because google.generativeai takes ~0.5s to import
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        self.model = genai.GenerativeModel(model_name)
+
+    def _generate(self, prompt, schema=None):
+        return self.model.generate_content(prompt).text
+
+    def _stream(self, prompt, schema=None):
+        for chunk in self.model.generate_content(prompt, stream=True):
+            yield chunk.text
+
+
+def parse_latency_spec(spec):
+    """Parse a FAKE_LLM_LATENCY spec into a (kind, params) tuple"""
+    if not spec:
+        return ("fixed", [0.0])
+    kind, _, values = spec.partition(":")
+    params = [float(v) for v in values.split(",") if v.strip()]
+    expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+    if kind not in expected or len(params) != expected[kind]:
+        raise ValueError(f"Invalid FAKE_LLM_LATENCY '{spec}'")
+    return (kind, params)
+
+
+class FakeProvider(LLMProvider):
+    """Offline backend that answers the platform's prompts with schema-valid JSON"""
+
+    name = "fake"
+
+    def __init__(self, latency=None, error_rate=None, rate_limit_rate=None, malformed_rate=None, seed=None):
+        self.latency = parse_latency_spec(latency if latency is not None else os.getenv("FAKE_LLM_LATENCY", "fixed:0"))
+        self.error_rate = float(error_rate if error_rate is not None else os.getenv("FAKE_LLM_ERROR_RATE", 0))
+        self.rate_limit_rate = float(rate_limit_rate if rate_limit_rate is not None else os.getenv("FAKE_LLM_RATE_LIMIT_RATE", 0))
+        self.malformed_rate = float(malformed_rate if malformed_rate is not None else os.getenv("FAKE_LLM_MALFORMED_RATE", 0))
+        self.stream_chunks = max(1, int(os.getenv("FAKE_LLM_STREAM_CHUNKS", 8)))
+        seed = seed if seed is not None else os.getenv("FAKE_LLM_SEED")
+        self.random = random.Random(int(seed) if seed is not None else None)
+        self.lock = threading.Lock()
+
+    def sample_latency(self):
+        """Draw a latency in seconds from the configured distribution"""
+        kind, params = self.latency
+        with self.lock:
+            if kind == "fixed":
+                ms = params[0]
+            elif kind == "uniform":
+                ms = self.random.uniform(params[0], params[1])
+            elif kind == "normal":
+                ms = self.random.gauss(params[0], params[1])
+            else:
+                ms = self.random.lognormvariate(math.log(max(params[0], 1e-6)), params[1])
+        return max(0.0, ms) / 1000
+
+    def _generate(self, prompt, schema=None):
+        """Return a schema-valid JSON response for prompt after a simulated delay"""
+        delay = self.sample_latency()
+        if delay:
+            time.sleep(delay)
+        return self.respond(prompt, schema)
+
+    def _stream(self, prompt, schema=None):
+        """Yield the response in FAKE_LLM_STREAM_CHUNKS chunks, spreading the simulated delay across them"""
+        delay = self.sample_latency()
+        text = self.respond(prompt, schema)
+        size = max(1, -(-len(text) // self.stream_chunks))
+        for start in range(0, len(text), size):
+            if delay:
+                time.sleep(delay / self.stream_chunks)
+            yield text[start:start + size]
+
+    def respond(self, prompt, schema=None):
+        """Roll for errors, then build the (possibly malformed) response text"""
+        with self.lock:
+            roll = self.random.random()
+            malformed = self.random.random() < self.malformed_rate
+        if roll < self.rate_limit_rate:
+            raise RateLimitError("429 Resource has been exhausted (fake provider)")
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise LLMError("500 Internal error (fake provider)")
+
+        with self.lock:
+            payload = self.build_payload(prompt, schema)
+        text = json.dumps(payload)
+        if malformed:
+            # Mimic the sloppy output the JSON repair code has to deal with
+            text = text.replace('"', "'").replace("}", ",}")
+        return f"```json\n{text}\n```"
+
+    def build_payload(self, prompt, schema=None):
+        """Build a response shaped by schema (a pydantic model class or TypeAdapter), whatever the prompt's wording"""
+        if schema is None:
+            return {"text": "Fake provider response"}
+        json_schema = schema.json_schema() if hasattr(schema, "json_schema") else schema.model_json_schema()
+        return self.fake_value(json_schema, json_schema.get("$defs", {}), None, prompt, 0)
+
+    def fake_value(self, spec, defs, name, prompt, index):
+        """A value for one node of a JSON schema; named fields get plausible values, others a placeholder"""
+        if "$ref" in spec:
+            spec = defs[spec["$ref"].rsplit("/", 1)[-1]]
+        kind = spec.get("type")
+        if kind == "object":
+            value = {}
+            for field, field_spec in spec.get("properties", {}).items():
+                value[field] = FAKE_FIELDS[field](self, prompt, index, value) if field in FAKE_FIELDS else \
+                    self.fake_value(field_spec, defs, field, prompt, index)
+            return value
+        if kind == "array":
+            # A top-level list is as long as the first number in the prompt ("Generate 50 ...")
+            match = re.search(r"\d+", prompt) if name is None else None
+            count = int(match.group()) if match else 3
+            return [self.fake_value(spec.get("items", {}), defs, name, prompt, i) for i in range(count)]
+        if kind == "integer":
+            return self.random.randint(spec.get("minimum", 0), spec.get("maximum", 100))
+        if kind == "number":
+            return round(self.random.uniform(spec.get("minimum", 0), spec.get("maximum", 1)), 3)
+        if kind == "boolean":
+            return self.random.random() < 0.5
+        return f"Fake {name or 'value'} {index}"
+
+
+def prompt_baseline(prompt):
+    """The first mental health state a prompt mentions, which is the player's baseline in a session prompt"""
+    found = [(prompt.find(state), state) for state in MENTAL_HEALTH_STATES if state in prompt]
+    return min(found)[1] if found else "Neutral"
+
+
+def fake_after(provider, prompt, index, value):
+    return provider.random.choice(MENTAL_HEALTH_STATES + [prompt_baseline(prompt)])
+
+
+def fake_notes(provider, prompt, index, value):
+    baseline, after = prompt_baseline(prompt), value.get("mental_health_after", "Neutral")
+    return f"Player moved from {baseline.lower()} to {after.lower()} (fake provider)."
+
+
+# Values for the fields of the platform's response models, keyed by field name
+FAKE_FIELDS = {
+    "first": lambda provider, prompt, index, value: f"Player{index}",
+    "last": lambda provider, prompt, index, value: "Fake",
+    "age": lambda provider, prompt, index, value: provider.random.randint(18, 65),
+    "gender": lambda provider, prompt, index, value: provider.random.choice(["Male", "Female"]),
+    "mental_health_after": fake_after,
+    "notes": fake_notes,
+    "summary": lambda provider, prompt, index, value: "Simulated analysis generated by the fake LLM provider.",
+    "recommendations": lambda provider, prompt, index, value: [
+        "Keep sessions within the designed duration",
+        "Take regular breaks to stretch and rest your eyes",
+        "Set clear time limits before starting play sessions"
+    ],
+}
+
+
+PROVIDERS = {
+    "gemini": GeminiProvider,
+    "fake": FakeProvider,
+}
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_llm_provider():
+    """Return the process-wide LLM provider selected by LLM_PROVIDER, with token budgeting applied"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                name = os.getenv("LLM_PROVIDER", "gemini").lower()
+                if name not in PROVIDERS:
+                    raise ValueError(f"Unknown LLM_PROVIDER '{name}', expected one of {sorted(PROVIDERS)}")
+                # Imported here because llm_budget builds on this module
+                from llm_budget import BudgetedProvider
+                _provider = BudgetedProvider(PROVIDERS[name]())
+    return _provider
+
+
+def set_llm_provider(provider):
+    """Override the process-wide provider (useful for benchmarks and load tests)"""
+    global _provider
+    _provider = provider
@@ -0,0 +1,223 @@
+"""
+Token accounting and quota enforcement for LLM calls.
+
+get_llm_provider() wraps the configured backend in a BudgetedProvider, which
+for every call:
+- compacts the prompt (dedent, no trailing spaces or repeated blank lines)
+- estimates its input tokens (LLM_CHARS_PER_TOKEN characters per token) and
+  reserves them plus LLM_EXPECTED_OUTPUT_TOKENS against the budget
+- settles the reservation with the output tokens actually received
+- counts both directions in llm_tokens_total
+
+The budget has a sliding one-minute window (LLM_TOKENS_PER_MINUTE,
+LLM_REQUESTS_PER_MINUTE) and a UTC calendar day (LLM_TOKENS_PER_DAY); 0
+means unlimited. Every call has a priority, set with the priority() context
+manager:
+- interactive (/analyze) may use the whole budget and never waits
+- background (data generation, reports, the default) may only use
+  LLM_BACKGROUND_SHARE of each limit, so interactive calls always have
+  headroom; when the minute window is full it waits up to
+  LLM_BUDGET_MAX_WAIT_SECONDS for it to free up
+
+A call that doesn't fit raises BudgetExceeded, an LLMError, so the caller's
+existing fallback (cached or heuristic output) takes over.
+Budgets are per process: divide the API quota between workers.
+"""
+
+import os
+import math
+import time
+import textwrap
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, UTC
+import metrics
+from llm import LLMError
+
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", 0))
+LLM_TOKENS_PER_DAY = int(os.getenv("LLM_TOKENS_PER_DAY", 0))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", 0))
+LLM_BACKGROUND_SHARE = float(os.getenv("LLM_BACKGROUND_SHARE", 0.7))
+LLM_BUDGET_MAX_WAIT_SECONDS = float(os.getenv("LLM_BUDGET_MAX_WAIT_SECONDS", 60))
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", 256))
+LLM_CHARS_PER_TOKEN = float(os.getenv("LLM_CHARS_PER_TOKEN", 4))
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+WINDOW_SECONDS = 60
+
+_priority = ContextVar("llm_priority", default=BACKGROUND)
+
+
+class BudgetExceeded(LLMError):
+    """Raised instead of calling the LLM when the call doesn't fit the token budget"""
+
+    def __init__(self, message, window):
+        super().__init__(message)
+        self.window = window
+
+
+@contextmanager
+def priority(level):
+    """Run LLM calls made inside the block at the given priority"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / LLM_CHARS_PER_TOKEN) if text else 0
+
+
+def compact_prompt(prompt):
+    """Drop the indentation and blank-line padding of a triple-quoted prompt, keeping its content"""
+    lines = [line.rstrip() for line in textwrap.dedent(prompt).strip().splitlines()]
+    compacted = []
+    for line in lines:
+        if line or (compacted and compacted[-1]):
+            compacted.append(line)
+    return "\n".join(compacted)
+
+
+class TokenBudget:
+    """Per-minute and per-day token and request limits, shared by all threads of a process"""
+
+    def __init__(self, tokens_per_minute=LLM_TOKENS_PER_MINUTE, tokens_per_day=LLM_TOKENS_PER_DAY,
+                 requests_per_minute=LLM_REQUESTS_PER_MINUTE, background_share=LLM_BACKGROUND_SHARE,
+                 max_wait=LLM_BUDGET_MAX_WAIT_SECONDS, expected_output=LLM_EXPECTED_OUTPUT_TOKENS):
+        self.tokens_per_minute = tokens_per_minute
+        self.tokens_per_day = tokens_per_day
+        self.requests_per_minute = requests_per_minute
+        self.background_share = background_share
+        self.max_wait = max_wait
+        self.expected_output = expected_output
+        self.lock = threading.Lock()
+        # [monotonic time, tokens] per call in the last minute; entries are settled in place
+        self.window = deque()
+        self.day = None
+        self.day_tokens = 0
+
+    def prune(self, now):
+        while self.window and now - self.window[0][0] >= WINDOW_SECONDS:
+            self.window.popleft()
+        today = datetime.now(UTC).date()
+        if today != self.day:
+            self.day = today
+            self.day_tokens = 0
+
+    def share(self, level):
+        return 1.0 if level == INTERACTIVE else self.background_share
+
+    def blocked_by(self, cost, level):
+        """The window a call of cost tokens would overrun ("minute" or "day"), or None"""
+        share = self.share(level)
+        if self.tokens_per_day and self.day_tokens + cost > share * self.tokens_per_day:
+            return "day"
+        if self.tokens_per_minute and sum(entry[1] for entry in self.window) + cost > share * self.tokens_per_minute:
+            return "minute"
+        if self.requests_per_minute and len(self.window) + 1 > share * self.requests_per_minute:
+            return "minute"
+        return None
+
+    def ready_at(self, cost, level):
+        """When enough of the minute window will have expired for the call to fit, or None if it never can"""
+        share = self.share(level)
+        token_limit = share * self.tokens_per_minute if self.tokens_per_minute else None
+        request_limit = share * self.requests_per_minute if self.requests_per_minute else None
+        if (token_limit is not None and cost > token_limit) or (request_limit is not None and request_limit < 1):
+            return None
+        # Expire the oldest calls until both limits have room
+        tokens = sum(entry[1] for entry in self.window)
+        requests = len(self.window)
+        ready = time.monotonic()
+        for started, entry_tokens in self.window:
+            if ((token_limit is None or tokens + cost <= token_limit)
+                    and (request_limit is None or requests + 1 <= request_limit)):
+                break
+            tokens -= entry_tokens
+            requests -= 1
+            ready = started + WINDOW_SECONDS
+        return ready
+
+    def acquire(self, input_tokens, level):
+        """Reserve a call's tokens, waiting for the minute window if the priority allows; returns the reservation"""
+        cost = input_tokens + self.expected_output
+        deadline = time.monotonic() + (self.max_wait if level == BACKGROUND else 0)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.prune(now)
+                window = self.blocked_by(cost, level)
+                if window is None:
+                    entry = [now, cost]
+                    self.window.append(entry)
+                    self.day_tokens += cost
+                    return entry
+                # Waiting only helps for the minute window, and only if enough calls expire before the deadline
+                retry_at = self.ready_at(cost, level) if window == "minute" else None
+                if retry_at is None or retry_at > deadline:
+                    metrics.inc("llm_budget_rejections_total", priority=level, window=window)
+                    raise BudgetExceeded(f"LLM {window} token budget exhausted for {level} calls", window)
+            time.sleep(max(retry_at - now, 0.01))
+
+    def settle(self, entry, input_tokens, output_tokens):
+        """Replace a reservation's estimate with the tokens actually used"""
+        with self.lock:
+            delta = input_tokens + output_tokens - entry[1]
+            entry[1] += delta
+            self.day_tokens += delta
+
+    def usage(self):
+        with self.lock:
+            self.prune(time.monotonic())
+            return {
+                "minute_tokens": sum(entry[1] for entry in self.window),
+                "minute_requests": len(self.window),
+                "day_tokens": self.day_tokens
+            }
+
+
+class BudgetedProvider:
+    """LLM provider wrapper that compacts prompts, counts tokens and enforces a TokenBudget"""
+
+    def __init__(self, provider, budget=None):
+        self.provider = provider
+        self.budget = budget or TokenBudget()
+        self.name = provider.name
+
+    def admit(self, prompt):
+        level = _priority.get()
+        prompt = compact_prompt(prompt)
+        input_tokens = estimate_tokens(prompt)
+        entry = self.budget.acquire(input_tokens, level)
+        metrics.inc("llm_tokens_total", input_tokens, direction="input", priority=level)
+        return prompt, level, input_tokens, entry
+
+    def finish(self, level, input_tokens, entry, output):
+        output_tokens = estimate_tokens(output)
+        self.budget.settle(entry, input_tokens, output_tokens)
+        metrics.inc("llm_tokens_total", output_tokens, direction="output", priority=level)
+
+    def generate(self, prompt, schema=None):
+        prompt, level, input_tokens, entry = self.admit(prompt)
+        text = ""
+        try:
+            text = self.provider.generate(prompt, schema)
+            return text
+        finally:
+            self.finish(level, input_tokens, entry, text)
+
+    def stream(self, prompt, schema=None):
+        prompt, level, input_tokens, entry = self.admit(prompt)
+        chunks = []
+        try:
+            for chunk in self.provider.stream(prompt, schema):
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            # A stream closed early only pays for what was received
+            self.finish(level, input_tokens, entry, "".join(chunks))
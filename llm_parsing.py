@@ -0,0 +1,277 @@
+"""
+Tolerant, incremental JSON extraction for LLM responses.
+
+LLM answers wrap their JSON in prose or ```json fences and often get the
+syntax slightly wrong: single quotes, unquoted keys, trailing commas,
+// comments, Python literals.
+
+JSONExtractor tries the C decoder (json.JSONDecoder.raw_decode) once, on
+the first chunk that contains a { or [. That parses a well-formed answer
+that arrived whole in one call and ignores whatever follows it. A value the
+decoder can't finish, whether malformed or still streaming, goes through
+RepairScanner instead, so each chunk is scanned once rather than the whole
+buffer being re-decoded on every chunk. There, one precompiled pattern
+splits the text into tokens, and a small state machine rewrites them into
+strict JSON as they arrive:
+
+- everything before the first { or [ is skipped, so fences and prose don't matter
+- single-quoted strings are re-quoted; an apostrophe inside one is kept as long
+  as it isn't followed by , } ] or :
+- bare keys are quoted only in key position, so text inside strings is never touched
+- a comma is only written once the next token shows it isn't trailing, and a
+  missing one between two values is put back, so `[1 2]` never becomes `[12]`
+- True/False/None become true/false/null; comments are dropped
+
+feed() accepts the response in chunks, as a streaming provider produces it,
+and returns the value as soon as its closing bracket arrives, so the rest of
+the stream can be abandoned. validate() turns the value into a pydantic model.
+"""
+
+import re
+import json
+
+# Leading whitespace is folded into every token, so it costs no iteration of its own
+TOKEN = re.compile(r"""
+    \s*
+    (?:
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<dq>"(?:[^"\\]|\\.)*")
+  | (?P<sq>'(?:[^'\\]|\\.|'(?!\s*[,}\]:]))*')
+  | (?P<fence>```[A-Za-z]*)
+  | (?P<punct>[{}\[\]:,])
+  | (?P<word>[A-Za-z0-9_.+\-]+)
+  | (?P<other>.)
+    )
+""", re.S | re.X)
+
+# Tokens that more text could still extend, so one ending at the buffer's end waits for the next chunk
+EXTENSIBLE = {"comment", "dq", "sq", "fence", "word"}
+LITERALS = {"true": "true", "false": "false", "null": "null", "True": "true", "False": "false", "None": "null"}
+NUMBER = re.compile(r"-?\d+(\.\d+)?([eE][+-]?\d+)?")
+OPEN = re.compile(r"[{\[]")
+UNESCAPED_QUOTE = re.compile(r'(?<!\\)"')
+DECODER = json.JSONDecoder(strict=False)
+
+
+class LLMParseError(ValueError):
+    """Raised when a response holds no usable JSON value or it doesn't match the schema"""
+
+
+def requote(token):
+    """Turn a single-quoted string token into a JSON string"""
+    return '"' + UNESCAPED_QUOTE.sub('\\\\"', token[1:-1].replace("\\'", "'")) + '"'
+
+
+class JSONExtractor:
+    """Incrementally extract the first JSON object or array from a response"""
+
+    def __init__(self):
+        self.buffer = ""
+        self.start = None
+        self.repair = None
+        self.done = False
+        self.value = None
+
+    def feed(self, chunk):
+        """Add a chunk of the response; returns the parsed value once it is complete, else None"""
+        if self.done:
+            return self.value
+        if self.repair is not None:
+            self.finish_from(self.repair.feed(chunk), self.repair)
+            return self.value
+        self.buffer += chunk
+        if self.start is None:
+            match = OPEN.search(self.buffer)
+            if match is None:
+                return None
+            self.start = match.start()
+        try:
+            self.value, _ = DECODER.raw_decode(self.buffer, self.start)
+            self.done = True
+        except json.JSONDecodeError:
+            # Re-decoding the growing buffer on every chunk would be quadratic; scan the rest incrementally
+            self.start_repair()
+        return self.value
+
+    def close(self):
+        """Finish the response; returns the value or raises LLMParseError"""
+        if not self.done:
+            if self.repair is None:
+                if self.start is None:
+                    raise LLMParseError("Couldn't find a JSON object or array in the response")
+                self.start_repair()
+            self.finish_from(self.repair.close(), self.repair)
+        return self.value
+
+    def start_repair(self):
+        self.repair = RepairScanner()
+        self.finish_from(self.repair.feed(self.buffer[self.start:]), self.repair)
+        self.buffer = ""
+
+    def finish_from(self, value, scanner):
+        if scanner.done:
+            self.value = value
+            self.done = True
+
+
+class RepairScanner:
+    """Tokenize a malformed response and rewrite it into strict JSON, chunk by chunk"""
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.out = []
+        # One entry per open container: "{" or "["
+        self.stack = []
+        self.expect_key = False
+        self.pending_comma = False
+        self.done = False
+        self.value = None
+
+    def feed(self, chunk):
+        """Add a chunk of the response; returns the parsed value once it is complete, else None"""
+        if not self.done:
+            self.buffer += chunk
+            self.scan(final=False)
+        return self.value
+
+    def close(self):
+        """Finish the response; returns the value or raises LLMParseError"""
+        if not self.done:
+            self.scan(final=True)
+        if not self.done:
+            raise LLMParseError("Couldn't find a complete JSON value in the response")
+        return self.value
+
+    def scan(self, final):
+        buffer = self.buffer
+        if not self.stack:
+            # Skip fences and prose until the value opens; they aren't tokenized, so an apostrophe can't swallow the bracket
+            start = OPEN.search(buffer, self.pos)
+            if start is None:
+                self.buffer = ""
+                self.pos = 0
+                return
+            self.pos = start.start()
+        while not self.done:
+            match = TOKEN.match(buffer, self.pos)
+            if match is None:
+                break
+            kind = match.lastgroup
+            token = match.group(kind)
+            if not final and self.incomplete(kind, token, match.end()):
+                break
+            self.pos = match.end()
+            self.token(kind, token)
+        # Drop what has been consumed so a long stream doesn't keep rescanning it
+        self.buffer = buffer[self.pos:]
+        self.pos = 0
+
+    def incomplete(self, kind, token, end):
+        """Whether the next chunk could still change how this token reads"""
+        if kind == "other" and token in "\"'":
+            # An unterminated string
+            return True
+        if kind == "other" and token == "/":
+            # The start of a comment, or an unterminated block comment
+            return self.buffer[end:end + 1] in ("", "/", "*")
+        if kind == "sq":
+            # A quote only closes the string when a delimiter follows, otherwise it may be an apostrophe
+            rest = self.buffer[end:].lstrip()
+            return not rest or rest[0] not in ",}]:"
+        return kind in EXTENSIBLE and end == len(self.buffer)
+
+    def emit(self, text):
+        if self.pending_comma:
+            self.out.append(",")
+            self.pending_comma = False
+        self.out.append(text)
+
+    def token(self, kind, token):
+        if not self.stack:
+            self.open(token)
+            return
+        if kind in ("comment", "fence", "other"):
+            return
+        if kind == "punct":
+            if token in "{[":
+                self.missing_comma()
+                self.open(token)
+            elif token in "}]":
+                self.pending_comma = False
+                self.stack.pop()
+                self.out.append(token)
+                if not self.stack:
+                    self.finish()
+                else:
+                    self.expect_key = False
+            elif token == ":":
+                self.out.append(":")
+                self.expect_key = False
+            elif self.out[-1] not in "{[,":
+                self.pending_comma = True
+                self.expect_key = self.stack[-1] == "{"
+            return
+        self.missing_comma()
+        if kind == "sq":
+            token = requote(token)
+        elif kind == "word":
+            if self.expect_key:
+                token = json.dumps(token)
+            elif token in LITERALS:
+                token = LITERALS[token]
+            elif not NUMBER.fullmatch(token):
+                token = json.dumps(token)
+        self.emit(token)
+
+    def missing_comma(self):
+        """A value straight after another one is separated by a comma; in an object it starts the next key"""
+        if not self.pending_comma and self.out[-1][-1] not in "{[,:":
+            self.pending_comma = True
+            self.expect_key = self.stack[-1] == "{"
+
+    def open(self, bracket):
+        self.emit(bracket)
+        self.stack.append(bracket)
+        self.expect_key = bracket == "{"
+
+    def finish(self):
+        self.done = True
+        try:
+            self.value = json.loads("".join(self.out), strict=False)
+        except ValueError as e:
+            raise LLMParseError(f"Invalid JSON in response: {e}") from e
+
+
+def extract_json(text):
+    """The first JSON object or array in text, repairing common LLM syntax mistakes"""
+    extractor = JSONExtractor()
+    extractor.feed(text)
+    return extractor.close()
+
+
+def validate(value, schema):
+    """Validate a parsed value into a pydantic model class or TypeAdapter"""
+    from pydantic import ValidationError
+    try:
+        if hasattr(schema, "validate_python"):
+            return schema.validate_python(value)
+        return schema.model_validate(value)
+    except ValidationError as e:
+        raise LLMParseError(f"Response doesn't match {getattr(schema, '__name__', 'the schema')}: {e}") from e
+
+
+def generate_json(llm, prompt, schema=None):
+    """Stream a response from llm, parsing it as it arrives, and stop reading once the JSON value is complete"""
+    extractor = JSONExtractor()
+    # The schema goes to the provider too, so the fake provider can answer in its shape
+    stream = llm.stream(prompt, schema)
+    try:
+        for chunk in stream:
+            extractor.feed(chunk)
+            if extractor.done:
+                break
+    finally:
+        stream.close()
+    value = extractor.close()
+    return validate(value, schema) if schema is not None else value
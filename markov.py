@@ -0,0 +1,161 @@
+"""
+Longitudinal Markov transitions between a player's consecutive sessions.
+
+For every pair of consecutive sessions of the same player, the state after
+the earlier session is taken as the state going into the later one, and the
+pair is counted against the later session's game. Normalising each game's
+5 x 5 count matrix by row gives its estimated transition matrix: the
+probability of ending in each state given the state the player came in with.
+
+The batch job streams sessions in (player_id, session_date, _id) order, which
+the compound sessions index serves without an in-memory sort, and processes
+them in chunks of MARKOV_CHUNK_SIZE. Each chunk is a NumPy diff: rows whose
+player equals the previous row's player form a pair, and the pairs are
+counted with one bincount. The last row of each chunk is carried into the
+next, so pairs that straddle a chunk boundary are kept. Memory stays at one
+chunk plus the games x 25 count table.
+
+Results go to the markov_transitions collection, one document per game keyed
+by game _id, so serving a game's matrix is a single _id lookup.
+
+Usage:
+    python markov.py [--chunk-size 100000]
+"""
+
+import os
+import time
+import argparse
+from datetime import datetime, UTC
+import numpy as np
+from pymongo import ReplaceOne
+from analytics import MENTAL_HEALTH_STATES
+import database
+
+MARKOV_CHUNK_SIZE = int(os.getenv("MARKOV_CHUNK_SIZE", 100_000))
+MARKOV_COLLECTION = "markov_transitions"
+
+STATE_CODES = {state: code for code, state in enumerate(MENTAL_HEALTH_STATES)}
+N_STATES = len(MENTAL_HEALTH_STATES)
+UNKNOWN_STATE = N_STATES
+CELLS_PER_GAME = N_STATES * N_STATES
+
+SESSION_PROJECTION = {"_id": 0, "player_id": 1, "game_id": 1, "mental_health_after": 1}
+SESSION_ORDER = [("player_id", 1), ("session_date", 1), ("_id", 1)]
+
+
+class TransitionCounter:
+    """Per-game counts of (state before, state after) over consecutive session pairs"""
+
+    def __init__(self):
+        self.game_codes = {}
+        self.game_ids = []
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.carry = None
+        self.sessions = 0
+        self.pairs = 0
+
+    def game_code(self, game_id):
+        code = self.game_codes.get(game_id)
+        if code is None:
+            code = self.game_codes[game_id] = len(self.game_ids)
+            self.game_ids.append(game_id)
+        return code
+
+    def add_chunk(self, sessions):
+        """Count the consecutive pairs in a chunk of sessions sorted by player and date"""
+        if not sessions:
+            return
+        players = np.array([session["player_id"].binary for session in sessions], dtype="S12")
+        games = np.array([self.game_code(session["game_id"]) for session in sessions], dtype=np.int64)
+        states = np.array([STATE_CODES.get(session["mental_health_after"], UNKNOWN_STATE) for session in sessions],
+                          dtype=np.int64)
+        self.sessions += len(sessions)
+
+        if self.carry is not None:
+            # The previous chunk's last session may pair with this chunk's first
+            players = np.concatenate([self.carry[0], players])
+            games = np.concatenate([self.carry[1], games])
+            states = np.concatenate([self.carry[2], states])
+        self.carry = (players[-1:], games[-1:], states[-1:])
+
+        same_player = players[1:] == players[:-1]
+        before = states[:-1][same_player]
+        after = states[1:][same_player]
+        game = games[1:][same_player]
+        known = (before != UNKNOWN_STATE) & (after != UNKNOWN_STATE)
+        cells = game[known] * CELLS_PER_GAME + before[known] * N_STATES + after[known]
+
+        size = len(self.game_ids) * CELLS_PER_GAME
+        if len(self.counts) < size:
+            self.counts = np.concatenate([self.counts, np.zeros(size - len(self.counts), dtype=np.int64)])
+        self.counts += np.bincount(cells, minlength=size)
+        self.pairs += int(known.sum())
+
+    def matrices(self):
+        """{game_id: 5 x 5 count matrix}"""
+        table = self.counts.reshape(-1, N_STATES, N_STATES)
+        return {game_id: table[code] for code, game_id in enumerate(self.game_ids)}
+
+
+def transition_probabilities(counts):
+    """Row-normalise a count matrix; states never seen going in get an all-zero row"""
+    totals = counts.sum(axis=1, keepdims=True)
+    return np.divide(counts, totals, out=np.zeros(counts.shape), where=totals > 0)
+
+
+def count_transitions(sessions_collection, chunk_size=MARKOV_CHUNK_SIZE):
+    """Stream every session in player order through a TransitionCounter"""
+    counter = TransitionCounter()
+    cursor = sessions_collection.find({}, SESSION_PROJECTION, sort=SESSION_ORDER,
+                                      allow_disk_use=True).batch_size(chunk_size)
+    chunk = []
+    for session in cursor:
+        chunk.append(session)
+        if len(chunk) >= chunk_size:
+            counter.add_chunk(chunk)
+            chunk = []
+    counter.add_chunk(chunk)
+    return counter
+
+
+def store_transitions(db, counter):
+    """Write one markov_transitions document per game and drop those for deleted games"""
+    computed_at = datetime.now(UTC)
+    matrices = counter.matrices()
+    games = list(db["games"].find({}, {"name": 1}))
+    zeros = np.zeros((N_STATES, N_STATES), dtype=np.int64)
+
+    requests = []
+    for game in games:
+        counts = matrices.get(game["_id"], zeros)
+        requests.append(ReplaceOne({"_id": game["_id"]}, {
+            "game_name": game["name"],
+            "states": MENTAL_HEALTH_STATES,
+            "counts": counts.tolist(),
+            "probabilities": transition_probabilities(counts).tolist(),
+            "pairs": int(counts.sum()),
+            "computed_at": computed_at
+        }, upsert=True))
+
+    collection = db[MARKOV_COLLECTION]
+    if requests:
+        collection.bulk_write(requests, ordered=False)
+    collection.delete_many({"_id": {"$nin": [game["_id"] for game in games]}})
+    return len(requests)
+
+
+def run_markov_job(db, chunk_size=MARKOV_CHUNK_SIZE):
+    """Recompute and store the transition matrices of every game"""
+    start = time.perf_counter()
+    counter = count_transitions(db["sessions"], chunk_size)
+    stored = store_transitions(db, counter)
+    print(f"Counted {counter.pairs} consecutive session pairs from {counter.sessions} sessions "
+          f"and stored matrices for {stored} games in {time.perf_counter() - start:.2f}s")
+    return counter
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimate per-game Markov transition matrices from consecutive sessions")
+    parser.add_argument("--chunk-size", type=int, default=MARKOV_CHUNK_SIZE, help="Sessions per NumPy chunk")
+    args = parser.parse_args()
+    run_markov_job(database.get_database(), args.chunk_size)
@@ -0,0 +1,142 @@
+"""
+Lightweight in-process metrics for the Gaming and Mental Health Analysis Platform.
+
+Counters and latency histograms are kept in memory and rendered in the
+Prometheus text exposition format, so the API can serve them at /metrics
+without an extra dependency.
+"""
+
+import time
+import threading
+from functools import wraps
+from contextlib import contextmanager
+
+# Histogram buckets in seconds, from sub-millisecond Python loops up to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    "span_duration_seconds": "Time spent in instrumented hot-path spans",
+    "http_request_duration_seconds": "HTTP request latency by route",
+    "http_requests_total": "HTTP requests by route and status code",
+    "llm_calls_total": "LLM calls by provider and outcome",
+    "llm_fallbacks_total": "Times a heuristic fallback replaced an LLM result",
+    "llm_parse_failures_total": "LLM responses that could not be parsed as JSON",
+    "llm_tokens_total": "Estimated LLM tokens by direction (input/output) and priority",
+    "llm_budget_rejections_total": "LLM calls refused because the minute or day token budget was exhausted",
+    "cache_hits_total": "Cache lookups that found a value",
+    "cache_misses_total": "Cache lookups that found nothing",
+    "ingest_accepted_total": "Sessions accepted into the ingest queue",
+    "ingest_rejected_total": "Sessions rejected with 429 because the ingest queue was full",
+    "ingest_sessions_total": "Sessions written to MongoDB by the ingest batcher",
+    "ingest_flush_errors_total": "Ingest batches that failed to flush",
+    "ingest_flush_retries_total": "Ingest batch inserts retried after a network error or failover",
+    "live_update_sessions_total": "Inserted sessions received from the sessions change stream",
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Increment a counter"""
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    """Record a duration in a histogram"""
+    key = (name, _label_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": [0] * len(DEFAULT_BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as a hot-path span"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("span_duration_seconds", time.perf_counter() - start, span=name)
+
+
+def timed(name):
+    """Decorator version of span()"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def reset():
+    """Clear all recorded metrics"""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def render_prometheus():
+    """Render all metrics in the Prometheus text exposition format"""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: {"buckets": list(h["buckets"]), "sum": h["sum"], "count": h["count"]}
+                      for key, h in _histograms.items()}
+
+    lines = []
+    for name in sorted({key[0] for key in counters}):
+        lines.append(f"# HELP {name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} counter")
+        for (metric, label_key), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{_format_labels(label_key)} {value}")
+
+    for name in sorted({key[0] for key in histograms}):
+        lines.append(f"# HELP {name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} histogram")
+        for (metric, label_key), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(DEFAULT_BUCKETS, histogram["buckets"]):
+                lines.append(f"{name}_bucket{_format_labels(label_key, [('le', repr(bound))])} {count}")
+            lines.append(f"{name}_bucket{_format_labels(label_key, [('le', '+Inf')])} {histogram['count']}")
+            lines.append(f"{name}_sum{_format_labels(label_key)} {histogram['sum']}")
+            lines.append(f"{name}_count{_format_labels(label_key)} {histogram['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def span_summary():
+    """Return {span: (count, total_seconds)} for printing stage timings"""
+    with _lock:
+        return {
+            dict(label_key).get("span"): (h["count"], h["sum"])
+            for (name, label_key), h in _histograms.items()
+            if name == "span_duration_seconds"
+        }
@@ -0,0 +1,239 @@
+"""
+Slow-query capture and explain-plan reporting for MongoDB.
+
+A pymongo CommandListener records the duration of every command. Reads that
+exceed MONGO_SLOW_QUERY_MS are kept, and build_report() re-runs them through
+explain() to flag collection scans and $lookup joins without a supporting
+index on the foreign collection. A find or aggregate that returns a cursor
+is timed until the cursor is exhausted or killed: the getMore batches, where
+a large scan spends most of its time, count towards the originating command.
+
+Monitoring is off unless MONGO_SLOW_QUERY_MS is set. To profile the API's
+queries against a local mongod in one go:
+
+    MONGO_SLOW_QUERY_MS=0 python mongo_monitor.py
+"""
+
+import os
+import threading
+from collections import deque
+from datetime import datetime, UTC
+from bson.son import SON
+from pymongo import monitoring
+
+# Commands that explain() understands
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "delete", "update", "findAndModify"}
+
+# Open cursors followed at once; the oldest is dropped beyond this (a cursor abandoned without killCursors)
+MAX_OPEN_CURSORS = 10_000
+
+# Session/cluster bookkeeping that must not be passed back into explain()
+IGNORED_FIELDS = {"lsid", "txnNumber", "$clusterTime", "$db", "$readPreference", "readConcern",
+                  "writeConcern", "startTransaction", "autocommit"}
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """Record command durations and keep the commands that exceed a threshold"""
+
+    def __init__(self, threshold_ms, max_records=500):
+        self.threshold_ms = threshold_ms
+        self.lock = threading.Lock()
+        self.pending = {}
+        # (server, cursor id) -> the originating command's record, accumulating its getMore time
+        self.cursors = {}
+        self.slow_commands = deque(maxlen=max_records)
+        self.command_stats = {}
+
+    def started(self, event):
+        if event.command_name in EXPLAINABLE_COMMANDS:
+            command = SON((key, value) for key, value in event.command.items() if key not in IGNORED_FIELDS)
+            with self.lock:
+                self.pending[(event.connection_id, event.request_id)] = (event.database_name, command)
+        elif event.command_name == "getMore":
+            with self.lock:
+                self.pending[(event.connection_id, event.request_id)] = (None, event.command.get("getMore"))
+        elif event.command_name == "killCursors":
+            with self.lock:
+                for cursor_id in event.command.get("cursors", []):
+                    self.close_cursor((event.connection_id, cursor_id))
+
+    def succeeded(self, event):
+        duration_ms = event.duration_micros / 1000
+        cursor_id = (event.reply.get("cursor") or {}).get("id", 0) if isinstance(event.reply, dict) else 0
+        with self.lock:
+            pending = self.pending.pop((event.connection_id, event.request_id), None)
+            stats = self.command_stats.setdefault(event.command_name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stats["count"] += 1
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            if event.command_name == "getMore":
+                key = (event.connection_id, pending[1] if pending else None)
+                record = self.cursors.get(key)
+                if record is not None:
+                    record["duration_ms"] += duration_ms
+                    record["getmore_ms"] += duration_ms
+                    record["batches"] += 1
+                    if not cursor_id:
+                        self.close_cursor(key)
+                return
+            if pending:
+                database, command = pending
+                record = {
+                    "database": database,
+                    "command_name": event.command_name,
+                    "collection": command.get(event.command_name),
+                    "command": command,
+                    "duration_ms": duration_ms,
+                    "getmore_ms": 0.0,
+                    "batches": 1,
+                    "at": datetime.now(UTC).isoformat()
+                }
+                if cursor_id:
+                    # Judged once the cursor is exhausted or killed, with its getMore time included
+                    self.cursors[(event.connection_id, cursor_id)] = record
+                    if len(self.cursors) > MAX_OPEN_CURSORS:
+                        self.close_cursor(next(iter(self.cursors)))
+                elif duration_ms >= self.threshold_ms:
+                    self.slow_commands.append(record)
+
+    def close_cursor(self, key):
+        """Stop following a cursor, keeping its command if it was slow in total; call with the lock held"""
+        record = self.cursors.pop(key, None)
+        if record is not None and record["duration_ms"] >= self.threshold_ms:
+            self.slow_commands.append(record)
+
+    def failed(self, event):
+        with self.lock:
+            pending = self.pending.pop((event.connection_id, event.request_id), None)
+            if event.command_name == "getMore" and pending:
+                self.close_cursor((event.connection_id, pending[1]))
+
+
+_threshold = os.getenv("MONGO_SLOW_QUERY_MS")
+listener = SlowQueryListener(float(_threshold)) if _threshold is not None else None
+
+
+def get_event_listeners():
+    """Return the event_listeners argument for MongoClient"""
+    return [listener] if listener else []
+
+
+def find_stages(plan, found=None):
+    """Collect every execution stage name in an explain() document"""
+    if found is None:
+        found = []
+    if isinstance(plan, dict):
+        if isinstance(plan.get("stage"), str):
+            found.append(plan["stage"])
+        for value in plan.values():
+            find_stages(value, found)
+    elif isinstance(plan, list):
+        for value in plan:
+            find_stages(value, found)
+    return found
+
+
+def has_index_on(collection, field):
+    """True if some index on collection has field as its leading key"""
+    if field == "_id":
+        return True
+    for index in collection.index_information().values():
+        if index["key"][0][0] == field:
+            return True
+    return False
+
+
+def query_shape(record):
+    """Group commands by collection, command and filter keys so each shape is explained once"""
+    command = record["command"]
+    filter_keys = tuple(sorted((command.get("filter") or command.get("query") or {}).keys()))
+    pipeline_stages = tuple(next(iter(stage)) for stage in command.get("pipeline", []))
+    return (record["database"], record["command_name"], record["collection"], filter_keys, pipeline_stages)
+
+
+def build_report(client, records=None):
+    """Explain each slow query shape and flag COLLSCANs and unindexed $lookups"""
+    if records is None:
+        with listener.lock:
+            records = list(listener.slow_commands)
+
+    shapes = {}
+    for record in records:
+        shape = query_shape(record)
+        entry = shapes.setdefault(shape, {"record": record, "count": 0, "max_ms": 0.0})
+        entry["count"] += 1
+        entry["max_ms"] = max(entry["max_ms"], record["duration_ms"])
+
+    findings = []
+    for (database, command_name, collection, filter_keys, _), entry in shapes.items():
+        db = client[database]
+        command = entry["record"]["command"]
+        finding = {
+            "database": database,
+            "collection": collection,
+            "command": command_name,
+            "filter_keys": list(filter_keys),
+            "occurrences": entry["count"],
+            "max_ms": entry["max_ms"],
+            "stages": [],
+            "problems": []
+        }
+        try:
+            plan = db.command(SON([("explain", command), ("verbosity", "queryPlanner")]))
+            finding["stages"] = sorted(set(find_stages(plan)))
+        except Exception as e:
+            finding["problems"].append(f"explain failed: {e}")
+            findings.append(finding)
+            continue
+
+        if "COLLSCAN" in finding["stages"]:
+            suggestion = f" - consider an index on {list(filter_keys)}" if filter_keys else ""
+            finding["problems"].append(f"COLLSCAN on {collection}{suggestion}")
+
+        for stage in command.get("pipeline", []):
+            lookup = stage.get("$lookup")
+            if lookup and "foreignField" in lookup and not has_index_on(db[lookup["from"]], lookup["foreignField"]):
+                finding["problems"].append(
+                    f"$lookup into {lookup['from']} has no index on {lookup['foreignField']}"
+                )
+
+        findings.append(finding)
+
+    findings.sort(key=lambda f: (not f["problems"], -f["max_ms"]))
+    with listener.lock:
+        command_stats = {name: dict(stats) for name, stats in listener.command_stats.items()}
+    return {"threshold_ms": listener.threshold_ms, "command_stats": command_stats, "findings": findings}
+
+
+def format_report(report):
+    """Render a report as plain text"""
+    lines = [f"Slow query report (threshold {report['threshold_ms']}ms)", ""]
+    lines.append("Command timings:")
+    for name, stats in sorted(report["command_stats"].items(), key=lambda item: -item[1]["total_ms"]):
+        avg = stats["total_ms"] / stats["count"] if stats["count"] else 0
+        lines.append(f"  {name:<16} count {stats['count']:>7}  avg {avg:>9.2f}ms  max {stats['max_ms']:>9.2f}ms")
+    lines.append("")
+    lines.append("Slow query shapes:")
+    if not report["findings"]:
+        lines.append("  none")
+    for finding in report["findings"]:
+        status = "PROBLEM" if finding["problems"] else "ok"
+        lines.append(f"  [{status}] {finding['command']} {finding['collection']} filter={finding['filter_keys']} "
+                     f"x{finding['occurrences']} max {finding['max_ms']:.2f}ms stages={finding['stages']}")
+        for problem in finding["problems"]:
+            lines.append(f"      - {problem}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if listener is None:
+        print("Set MONGO_SLOW_QUERY_MS (e.g. MONGO_SLOW_QUERY_MS=0) to capture queries")
+        sys.exit(1)
+
+    import analyze_data
+
+    for game in analyze_data.get_games_collection().find({}, {"name": 1}):
+        analyze_data.extract_game_statistics(game["name"])
+    print(format_report(build_report(analyze_data.get_client())))
@@ -0,0 +1,184 @@
+"""
+In-process stage runner with a dependency DAG.
+
+Stages run in a thread pool as soon as the stages they depend on have
+finished, so independent work (index creation and game generation, say)
+overlaps. Every stage is timed, and a stage that returns an item count also
+gets its throughput reported.
+
+A stage can declare a fingerprint of its settings (sizes, provider...) and
+the MongoDB collections it reads and fills. After a successful run the
+fingerprint and those collections' document counts are recorded in the
+pipeline_state collection, along with when each of its dependencies last
+ran. The next run skips the stage if all of that still matches, so rerunning
+bring-up against a database that is already populated costs a few queries.
+Input counts must match exactly; an output only has to be non-empty, since
+sessions posted to the API grow it without making the stage's work stale.
+Dropping the database drops that state with it, so nothing is skipped
+against an empty database. A stage without a fingerprint always runs.
+force=True runs every stage.
+"""
+
+import time
+from datetime import datetime, UTC
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import metrics
+
+STATE_COLLECTION = "pipeline_state"
+
+
+class PipelineError(Exception):
+    """Raised when a stage fails; the stages depending on it are not run"""
+
+
+class Stage:
+    """One step of a pipeline"""
+
+    def __init__(self, name, func, deps=(), fingerprint=None, inputs=(), outputs=()):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.fingerprint = fingerprint
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+
+
+class Pipeline:
+    """A DAG of stages sharing a context dict"""
+
+    def __init__(self, get_db=None, max_workers=4):
+        # get_db gives the database holding pipeline_state; without it no stage is ever skipped
+        self.get_db = get_db
+        self.max_workers = max_workers
+        self.stages = {}
+        self.results = {}
+        self.context = {}
+        self.total_seconds = 0.0
+
+    def add(self, name, func, deps=(), fingerprint=None, inputs=(), outputs=()):
+        """Add a stage; func(context) may return the number of items it processed"""
+        missing = [dep for dep in deps if dep not in self.stages]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on unknown stages {missing}")
+        self.stages[name] = Stage(name, func, deps, fingerprint, inputs, outputs)
+        return self
+
+    # -- state ------------------------------------------------------------
+
+    def collection_counts(self, collections):
+        db = self.get_db()
+        return {collection: db[collection].count_documents({}) for collection in collections}
+
+    def outputs_present(self, stage, recorded):
+        """Outputs may have grown since the stage ran; only one emptied since then makes it stale"""
+        counts = self.collection_counts(stage.outputs)
+        return all(counts[collection] > 0 or not recorded.get(collection) for collection in stage.outputs)
+
+    def upstream_runs(self, stage):
+        """When each dependency last completed, so a dependency rerun by another invocation is noticed"""
+        states = self.get_db()[STATE_COLLECTION].find({"_id": {"$in": list(stage.deps)}}, {"completed_at": 1})
+        runs = {state["_id"]: state["completed_at"] for state in states}
+        return {dep: runs.get(dep) for dep in stage.deps}
+
+    def is_current(self, stage):
+        """True if the stage last ran with the same fingerprint, after the same upstream runs,
+        with the same inputs, and its outputs are still there"""
+        if self.get_db is None or stage.fingerprint is None:
+            return False
+        state = self.get_db()[STATE_COLLECTION].find_one({"_id": stage.name})
+        if state is None:
+            return False
+        # Records written before inputs and outputs were split keep every count under "collections"
+        counts = state.get("collections", {})
+        inputs = state.get("inputs", {collection: counts.get(collection) for collection in stage.inputs})
+        return (state["fingerprint"] == stage.fingerprint
+                and state["upstream"] == self.upstream_runs(stage)
+                and inputs == self.collection_counts(stage.inputs)
+                and self.outputs_present(stage, state.get("outputs", counts)))
+
+    def record(self, stage):
+        if self.get_db is None or stage.fingerprint is None:
+            return
+        self.get_db()[STATE_COLLECTION].replace_one({"_id": stage.name}, {
+            "fingerprint": stage.fingerprint,
+            "upstream": self.upstream_runs(stage),
+            "inputs": self.collection_counts(stage.inputs),
+            "outputs": self.collection_counts(stage.outputs),
+            "completed_at": datetime.now(UTC)
+        }, upsert=True)
+
+    # -- running ----------------------------------------------------------
+
+    def run_stage(self, stage, force):
+        upstream_ran = any(self.results.get(dep, {}).get("status") == "ran" for dep in stage.deps)
+        if not force and not upstream_ran and self.is_current(stage):
+            print(f"[{stage.name}] up to date, skipped")
+            return {"status": "skipped", "seconds": 0.0, "items": None}
+        print(f"[{stage.name}] started")
+        start = time.perf_counter()
+        with metrics.span(f"pipeline_{stage.name}"):
+            items = stage.func(self.context)
+        seconds = time.perf_counter() - start
+        self.record(stage)
+        print(f"[{stage.name}] finished in {seconds:.2f}s")
+        return {"status": "ran", "seconds": seconds, "items": items}
+
+    def run(self, force=False, only=None):
+        """Run every stage (or those in only, plus what they depend on) in dependency order"""
+        selected = self.with_dependencies(only) if only else set(self.stages)
+        pending = {name: stage for name, stage in self.stages.items() if name in selected}
+        done = set()
+        failed = None
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            running = {}
+            while pending or running:
+                if failed is None:
+                    for name, stage in list(pending.items()):
+                        if all(dep in done for dep in stage.deps):
+                            running[pool.submit(self.run_stage, stage, force)] = name
+                            del pending[name]
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        self.results[name] = future.result()
+                        done.add(name)
+                    except Exception as e:
+                        print(f"[{name}] failed: {e}")
+                        self.results[name] = {"status": "failed", "seconds": 0.0, "items": None}
+                        failed = failed or PipelineError(f"Stage '{name}' failed: {e}")
+
+        self.total_seconds = time.perf_counter() - start
+        self.print_summary()
+        if failed:
+            raise failed
+        return self.results
+
+    def with_dependencies(self, names):
+        selected = set()
+        stack = list(names)
+        while stack:
+            name = stack.pop()
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage '{name}'")
+            if name not in selected:
+                selected.add(name)
+                stack.extend(self.stages[name].deps)
+        return selected
+
+    def print_summary(self):
+        print(f"\n{'Stage':<20} {'Status':<8} {'Seconds':>9} {'Items':>9} {'Items/s':>10}")
+        for name in self.stages:
+            result = self.results.get(name)
+            if result is None:
+                print(f"{name:<20} {'not run':<8}")
+                continue
+            items = result["items"]
+            rate = f"{items / result['seconds']:.1f}" if items and result["seconds"] else "-"
+            print(f"{name:<20} {result['status']:<8} {result['seconds']:>9.2f} "
+                  f"{items if items is not None else '-':>9} {rate:>10}")
+        print(f"Total: {self.total_seconds:.2f}s")
@@ -0,0 +1,179 @@
+"""
+Opt-in per-request profiling for the FastAPI service.
+
+A request is profiled with cProfile when it carries an "X-Profile: 1" header
+or a "?profile=1" query flag together with a valid "X-Admin-Token" header.
+Setting PROFILE_SAMPLE_RATE additionally profiles that fraction of all
+requests in the background. Profiles are kept in memory (PROFILE_MAX_STORED,
+default 50) and can be listed, summarized and downloaded under /admin/profiles.
+
+Profiling is disabled unless PROFILE_ADMIN_TOKEN is set. Only one request is
+profiled at a time; cProfile follows the event loop thread, so work from
+other requests interleaved on the same loop can show up in a profile.
+Blocking work the handler hands to a worker thread through this module's
+run_in_threadpool shows up too: from Python 3.12 cProfile runs on
+sys.monitoring, which already sees every thread; before that the call is
+profiled in its worker thread and merged into the request's profile.
+"""
+
+import os
+import hmac
+import time
+import uuid
+import random
+import marshal
+import cProfile
+import pstats
+import threading
+import sys
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, UTC
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool as fastapi_run_in_threadpool
+
+TOP_FUNCTIONS = 15
+# Before 3.12 a cProfile.Profile only sees its own thread; from 3.12 a second one can't be enabled while it runs
+PROFILE_THREADS = sys.version_info < (3, 12)
+
+admin_token = os.getenv("PROFILE_ADMIN_TOKEN")
+sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+_profiles = deque(maxlen=int(os.getenv("PROFILE_MAX_STORED", 50)))
+_profiling_lock = threading.Lock()
+# Profilers of the worker-thread calls made by the request being profiled
+_thread_profilers = ContextVar("thread_profilers", default=None)
+
+router = APIRouter(prefix="/admin/profiles", tags=["admin"])
+
+
+def is_admin(request: Request):
+    """Check the request's X-Admin-Token against PROFILE_ADMIN_TOKEN"""
+    token = request.headers.get("x-admin-token", "")
+    return bool(admin_token) and hmac.compare_digest(token, admin_token)
+
+
+def wants_profile(request: Request):
+    """Decide whether this request should be profiled"""
+    if not admin_token:
+        return False
+    flagged = request.headers.get("x-profile") == "1" or request.query_params.get("profile") == "1"
+    if flagged:
+        return is_admin(request)
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+def summarize(stats):
+    """Return the hottest functions of a finished profile (a pstats.Stats), by own time"""
+    rows = []
+    for (filename, line, name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{line}({name})",
+            "ncalls": ncalls,
+            "tottime": round(tottime, 6),
+            "cumtime": round(cumtime, 6)
+        })
+    rows.sort(key=lambda row: row["tottime"], reverse=True)
+    return rows[:TOP_FUNCTIONS]
+
+
+async def profile_request(request: Request, call_next):
+    """HTTP middleware that wraps selected requests in cProfile"""
+    if not wants_profile(request) or not _profiling_lock.acquire(blocking=False):
+        return await call_next(request)
+
+    profiler = cProfile.Profile()
+    thread_profilers = []
+    context_token = _thread_profilers.set(thread_profilers)
+    start = time.perf_counter()
+    try:
+        profiler.enable()
+        try:
+            response = await call_next(request)
+        finally:
+            profiler.disable()
+    finally:
+        _thread_profilers.reset(context_token)
+        _profiling_lock.release()
+
+    stats = pstats.Stats(profiler)
+    for thread_profiler in thread_profilers:
+        stats.add(thread_profiler)
+    profile_id = uuid.uuid4().hex
+    _profiles.append({
+        "id": profile_id,
+        "method": request.method,
+        "path": request.url.path,
+        "status": response.status_code,
+        "duration_seconds": time.perf_counter() - start,
+        "created_at": datetime.now(UTC).isoformat(),
+        "top_functions": summarize(stats),
+        "stats": marshal.dumps(stats.stats)
+    })
+    response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
+async def run_in_threadpool(func, *args, **kwargs):
+    """fastapi.concurrency.run_in_threadpool that, before Python 3.12, profiles func in its thread when the request is being profiled"""
+    thread_profilers = _thread_profilers.get()
+    if thread_profilers is None or not PROFILE_THREADS:
+        return await fastapi_run_in_threadpool(func, *args, **kwargs)
+
+    def profiled():
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            thread_profilers.append(profiler)
+
+    return await fastapi_run_in_threadpool(profiled)
+
+
+def require_admin(request: Request):
+    if not is_admin(request):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def find_profile(profile_id):
+    for profile in _profiles:
+        if profile["id"] == profile_id:
+            return profile
+    raise HTTPException(status_code=404, detail=f"Profile '{profile_id}' not found")
+
+
+@router.get("")
+async def list_profiles(request: Request):
+    """List stored profiles, most recent first"""
+    require_admin(request)
+    return [
+        {key: value for key, value in profile.items() if key not in ("stats", "top_functions")}
+        for profile in reversed(_profiles)
+    ]
+
+
+@router.get("/{profile_id}")
+async def get_profile(profile_id: str, request: Request):
+    """Return a profile's metadata and its top hot functions"""
+    require_admin(request)
+    profile = find_profile(profile_id)
+    return {key: value for key, value in profile.items() if key != "stats"}
+
+
+@router.get("/{profile_id}/download")
+async def download_profile(profile_id: str, request: Request):
+    """Download the raw profile, loadable with pstats.Stats(path) or snakeviz"""
+    require_admin(request)
+    profile = find_profile(profile_id)
+    return Response(
+        content=profile["stats"],
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.prof"'}
+    )
+
+
+def add_profiling(app):
+    """Register the profiling middleware and admin routes on app"""
+    app.middleware("http")(profile_request)
+    app.include_router(router)
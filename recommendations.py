@@ -0,0 +1,193 @@
+"""
+Game recommendations for a player's current mental health state.
+
+RecommendationIndex keeps a (baseline, game) outcome table built from one
+grouped aggregation and updated incrementally from published sessions.
+Games are ranked per baseline by the Wilson lower bound of their
+positive-transition rate, so a game with 3 positive sessions out of 3 doesn't
+outrank one with 90 out of 100. Requests only read the ranked table; the
+table is rebuilt in the background every RECOMMEND_REFRESH_SECONDS to pick
+up sessions written by other processes.
+"""
+
+import os
+import time
+import threading
+from typing import Callable, List, Literal, Optional
+from fastapi import APIRouter, Depends, Query
+from pydantic import BaseModel
+from analytics import (MENTAL_HEALTH_STATES, IMPACT_CLASSES, classify_transition, aggregate_game_counters,
+                       wilson_lower_bound)
+from ingest import MentalHealthState
+import metrics
+
+RECOMMEND_REFRESH_SECONDS = float(os.getenv("RECOMMEND_REFRESH_SECONDS", 300))
+WILSON_Z = float(os.getenv("WILSON_Z", 1.96))
+
+Difficulty = Literal["Easy", "Medium", "Hard"]
+AgeBand = Literal["18-24", "25-34", "35-44", "45-54", "55+"]
+
+
+class Recommendation(BaseModel):
+    game_name: str
+    genre: str
+    difficulty: str
+    avg_session_duration_minutes: int
+    sessions: int
+    positive_rate: float
+    score: float
+    outcomes: dict
+
+
+class RecommendationResponse(BaseModel):
+    baseline: str
+    cohort: dict = {}
+    recommendations: List[Recommendation]
+
+
+def cohort_query(age_band: List[AgeBand] = Query(None), gender: List[str] = Query(None)):
+    """Query parameters for a player cohort (repeat a parameter to select several values)"""
+    return {dim: values for dim, values in (("age_band", age_band), ("gender", gender)) if values}
+
+
+def new_cell():
+    return {"sessions": 0, "positive": 0, "negative": 0, "neutral": 0}
+
+
+def rank_cells(cells, games, z=WILSON_Z):
+    """[(game_id, score)] best first, scored by the Wilson lower bound of the positive rate"""
+    scored = [(wilson_lower_bound(cell["positive"], cell["sessions"], z), game_id)
+              for game_id, cell in cells.items() if game_id in games]
+    return [(game_id, score) for score, game_id in sorted(scored, reverse=True)]
+
+
+def select_recommendations(ranking, cells, games, max_minutes=None, difficulty=None, limit=5):
+    """Apply the game filters to a ranking and build the response entries"""
+    results = []
+    for game_id, score in ranking:
+        game = games[game_id]
+        if max_minutes is not None and game.get("avg_session_duration_minutes", 0) > max_minutes:
+            continue
+        if difficulty is not None and game.get("difficulty") != difficulty:
+            continue
+        cell = cells[game_id]
+        results.append({
+            "game_name": game["name"],
+            "genre": game.get("genre", ""),
+            "difficulty": game.get("difficulty", ""),
+            "avg_session_duration_minutes": game.get("avg_session_duration_minutes", 0),
+            "sessions": cell["sessions"],
+            "positive_rate": cell["positive"] / cell["sessions"] if cell["sessions"] else 0.0,
+            "score": score,
+            "outcomes": {impact: cell[impact] for impact in IMPACT_CLASSES}
+        })
+        if len(results) >= limit:
+            break
+    return results
+
+
+class RecommendationIndex:
+    """Per-(baseline, game) outcome counts with a ranking per baseline"""
+
+    def __init__(self, get_db, refresh_seconds=RECOMMEND_REFRESH_SECONDS, z=WILSON_Z):
+        # get_db is called on use, like the ingest batcher, so creating the index doesn't connect
+        self.get_db = get_db
+        self.refresh_seconds = refresh_seconds
+        self.z = z
+        self.lock = threading.Lock()
+        self.games = {}
+        self.table = {baseline: {} for baseline in MENTAL_HEALTH_STATES}
+        self.rankings = {}
+        self.built_at = None
+        self.rebuilding = False
+
+    def rebuild(self):
+        """Recompute the whole table with one grouped aggregation"""
+        with metrics.span("recommendations_rebuild"):
+            games = {game["_id"]: game for game in self.get_db()["games"].find()}
+            table = {baseline: {} for baseline in MENTAL_HEALTH_STATES}
+            for game_id, counters in aggregate_game_counters(self.get_db()["sessions"]).items():
+                for key, count in counters["transitions"].items():
+                    baseline, after = key.split(" -> ")
+                    cell = table.setdefault(baseline, {}).setdefault(game_id, new_cell())
+                    cell["sessions"] += count
+                    cell[classify_transition(baseline, after)] += count
+        with self.lock:
+            self.games = games
+            self.table = table
+            self.rankings = {}
+            self.built_at = time.monotonic()
+
+    def rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception as e:
+            print(f"Error rebuilding recommendations: {e}")
+        finally:
+            self.rebuilding = False
+
+    def ensure_fresh(self):
+        """Build the table on first use, and refresh it in the background once it is stale"""
+        if self.built_at is None:
+            self.rebuild()
+        elif time.monotonic() - self.built_at > self.refresh_seconds and not self.rebuilding:
+            self.rebuilding = True
+            threading.Thread(target=self.rebuild_in_background, name="recommendations-rebuild", daemon=True).start()
+
+    def apply(self, sessions):
+        """Fold published sessions (which carry their player's baseline) into the table"""
+        if self.built_at is None:
+            return
+        with self.lock:
+            for session in sessions:
+                baseline = session.get("baseline")
+                if baseline not in self.table:
+                    continue
+                cell = self.table[baseline].setdefault(session["game_id"], new_cell())
+                cell["sessions"] += 1
+                cell[classify_transition(baseline, session["mental_health_after"])] += 1
+                self.rankings.pop(baseline, None)
+
+    def ranking(self, baseline):
+        """Game ids for a baseline, best first; re-sorted only after the table changed"""
+        with self.lock:
+            ranking = self.rankings.get(baseline)
+            if ranking is None:
+                ranking = self.rankings[baseline] = rank_cells(self.table.get(baseline, {}), self.games, self.z)
+            return ranking
+
+    def recommend(self, baseline, max_minutes=None, difficulty=None, limit=5):
+        """Best games for a baseline state, optionally limited by design session length and difficulty"""
+        self.ensure_fresh()
+        return select_recommendations(self.ranking(baseline), self.table[baseline], self.games,
+                                      max_minutes, difficulty, limit)
+
+    def recommend_for_cohort(self, cells, games, max_minutes=None, difficulty=None, limit=5):
+        """Rank an ad-hoc outcome table, e.g. one restricted to a player cohort"""
+        return select_recommendations(rank_cells(cells, games, self.z), cells, games, max_minutes, difficulty, limit)
+
+
+def create_router(index, cohort_outcomes: Optional[Callable] = None):
+    """Build the /recommend route; cohort_outcomes(baseline, cohort) returns (cells, games) for cohort filters"""
+    router = APIRouter(tags=["recommendations"])
+
+    @router.get("/recommend", response_model=RecommendationResponse)
+    def recommend(baseline: MentalHealthState,
+                  max_minutes: Optional[int] = Query(None, gt=0),
+                  difficulty: Optional[Difficulty] = None,
+                  limit: int = Query(5, ge=1, le=50),
+                  cohort: dict = Depends(cohort_query)):
+        """Games most likely to improve or keep a good mental state, ranked with a small-sample penalty"""
+        if cohort and cohort_outcomes is not None:
+            cells, games = cohort_outcomes(baseline, cohort)
+            recommendations = index.recommend_for_cohort(cells, games, max_minutes, difficulty, limit)
+        else:
+            recommendations = index.recommend(baseline, max_minutes, difficulty, limit)
+        return {"baseline": baseline, "cohort": cohort, "recommendations": recommendations}
+
+    return router
+
+
+def add_recommendations(app, index, cohort_outcomes=None):
+    """Register the /recommend route"""
+    app.include_router(create_router(index, cohort_outcomes))
@@ -0,0 +1,205 @@
+"""
+Batch report over the whole game catalog: game_mental_health_analysis.md and .html.
+
+generate_report() computes every game's statistics with one grouped
+aggregation (instead of one /analyze call per game), then writes the report
+from per-game sections. Each game has a fingerprint of its inputs (game
+details, counters and duration curve). A manifest under REPORT_CACHE_DIR
+records the fingerprint each cached section was rendered from, so a rerun
+only regenerates the sections of games whose data changed; the rest are
+reused as they are. Sections that fell back to the heuristic analysis are
+retried on the next run.
+
+The Gemini narratives for changed games run concurrently, at most
+REPORT_CONCURRENCY at a time, and go through the shared result cache keyed
+by fingerprint, so API workers and later runs reuse them.
+
+Usage:
+    python analyze_data.py report [--force] [--concurrency 8]
+"""
+
+import os
+import json
+import html
+import time
+import hashlib
+from datetime import datetime, UTC
+from concurrent.futures import ThreadPoolExecutor
+from analytics import aggregate_game_counters, counters_to_statistics, build_statistics
+import analyze_data
+
+REPORT_CONCURRENCY = int(os.getenv("REPORT_CONCURRENCY", 8))
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", ".cache/report")
+REPORT_PATH = os.getenv("REPORT_PATH", "game_mental_health_analysis.md")
+# Bump when the section layout changes, so every cached section is re-rendered
+SECTION_FORMAT = 1
+
+
+def fingerprint(game, counters, duration_effect):
+    """Hash of everything a game's section is rendered from"""
+    payload = {
+        "format": SECTION_FORMAT,
+        "game": {key: value for key, value in game.items() if key != "created_at"},
+        "counters": counters,
+        "durations": [bucket["sessions"] for bucket in (duration_effect or {}).get("curve", [])]
+                     + [bucket["positive_rate"] for bucket in (duration_effect or {}).get("curve", [])]
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+def collect_statistics(db):
+    """Statistics, confidence intervals and duration curves for every game from grouped aggregations"""
+    games = list(db["games"].find())
+    counters = aggregate_game_counters(db["sessions"])
+    analyze_data.duration_effect_index.ensure_fresh()
+
+    entries = []
+    for game in games:
+        game_counters = counters.get(game["_id"])
+        statistics = counters_to_statistics(game, game_counters) if game_counters else build_statistics(game, {}, 0, 0)
+        duration_effect = analyze_data.get_duration_effect(game["name"])
+        entries.append({
+            "game": game,
+            "statistics": statistics,
+            "duration_effect": duration_effect,
+            "fingerprint": fingerprint(game, game_counters, duration_effect)
+        })
+
+    from confidence import add_confidence
+    add_confidence([entry["statistics"] for entry in entries])
+    return entries
+
+
+def narrative(entry):
+    """Gemini analysis for a game, cached by fingerprint"""
+    return analyze_data.result_cache.get_or_compute(
+        f"report:{entry['game']['name']}:{entry['fingerprint']}",
+        lambda: analyze_data.analyze_game_with_gemini(entry["statistics"], entry["duration_effect"]),
+        ttl=lambda analysis: (analyze_data.CACHE_FALLBACK_TTL_SECONDS if analysis.get("fallback")
+                              else analyze_data.CACHE_ANALYSIS_TTL_SECONDS)
+    )
+
+
+def format_rate(confidence, impact):
+    interval = confidence[impact]
+    return f"{interval['rate']:.1f}% ({interval['low']:.1f}-{interval['high']:.1f})"
+
+
+def render_section(entry, analysis):
+    """Markdown and HTML sections for one game"""
+    game = entry["game"]
+    statistics = entry["statistics"]
+    details = f"{game.get('genre', '')} · {game.get('type', '')} · {game.get('difficulty', '')} · " \
+              f"designed for {game.get('avg_session_duration_minutes', 0)} minute sessions"
+    optimal = analyze_data.describe_optimal(entry["duration_effect"])
+
+    md = [f"## {game['name']}", "", f"*{details}*", ""]
+    body = [f"<h2>{html.escape(game['name'])}</h2>", f"<p><em>{html.escape(details)}</em></p>"]
+    if not statistics.get("no_data"):
+        confidence = statistics["impact_confidence"]
+        cells = [str(statistics["sessions"]["total"]), f"{statistics['sessions']['avg_duration']:.1f} min",
+                 format_rate(confidence, "positive"), format_rate(confidence, "negative"), format_rate(confidence, "neutral")]
+        headers = ["Sessions", "Avg duration", "Positive (95% CI)", "Negative (95% CI)", "Neutral (95% CI)"]
+        md += ["| " + " | ".join(headers) + " |", "|" + "---|" * len(headers), "| " + " | ".join(cells) + " |", ""]
+        body.append("<table><tr>" + "".join(f"<th>{html.escape(h)}</th>" for h in headers) + "</tr><tr>"
+                    + "".join(f"<td>{html.escape(c)}</td>" for c in cells) + "</tr></table>")
+    if optimal:
+        md += [f"**Best session length:** {optimal}", ""]
+        body.append(f"<p><strong>Best session length:</strong> {html.escape(optimal)}</p>")
+    md += [analysis["summary"], "", "**Recommendations**", ""]
+    md += [f"- {recommendation}" for recommendation in analysis["recommendations"]] + [""]
+    body.append(f"<p>{html.escape(analysis['summary'])}</p>")
+    body.append("<h3>Recommendations</h3><ul>"
+                + "".join(f"<li>{html.escape(r)}</li>" for r in analysis["recommendations"]) + "</ul>")
+    return "\n".join(md), "\n".join(body)
+
+
+def render_overview(entries):
+    """Catalog table, best positive rate first"""
+    ranked = sorted(entries, key=lambda entry: entry["statistics"].get("impact_confidence", {})
+                    .get("positive", {}).get("low", 0), reverse=True)
+    headers = ["Game", "Genre", "Sessions", "Positive (95% CI)", "Negative (95% CI)"]
+    rows = []
+    for entry in ranked:
+        statistics = entry["statistics"]
+        if statistics.get("no_data"):
+            rows.append([entry["game"]["name"], entry["game"].get("genre", ""), "0", "-", "-"])
+        else:
+            confidence = statistics["impact_confidence"]
+            rows.append([entry["game"]["name"], entry["game"].get("genre", ""), str(statistics["sessions"]["total"]),
+                         format_rate(confidence, "positive"), format_rate(confidence, "negative")])
+    md = ["| " + " | ".join(headers) + " |", "|" + "---|" * len(headers)]
+    md += ["| " + " | ".join(row) + " |" for row in rows]
+    body = ["<table><tr>" + "".join(f"<th>{html.escape(h)}</th>" for h in headers) + "</tr>"]
+    body += ["<tr>" + "".join(f"<td>{html.escape(c)}</td>" for c in row) + "</tr>" for row in rows]
+    body.append("</table>")
+    return "\n".join(md), "\n".join(body)
+
+
+def load_manifest(cache_dir):
+    path = os.path.join(cache_dir, "manifest.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def section_path(cache_dir, fingerprint_value, extension):
+    return os.path.join(cache_dir, "sections", f"{fingerprint_value}.{extension}")
+
+
+def generate_report(db, path=REPORT_PATH, cache_dir=REPORT_CACHE_DIR, concurrency=REPORT_CONCURRENCY, force=False):
+    """Write the Markdown and HTML reports, regenerating only the sections of changed games"""
+    start = time.perf_counter()
+    os.makedirs(os.path.join(cache_dir, "sections"), exist_ok=True)
+    entries = collect_statistics(db)
+    manifest = {} if force else load_manifest(cache_dir)
+
+    def is_current(entry):
+        cached = manifest.get(entry["game"]["name"])
+        return (cached and cached["fingerprint"] == entry["fingerprint"] and not cached["fallback"]
+                and os.path.exists(section_path(cache_dir, entry["fingerprint"], "md"))
+                and os.path.exists(section_path(cache_dir, entry["fingerprint"], "html")))
+
+    stale = [entry for entry in entries if not is_current(entry)]
+    print(f"Report: {len(entries) - len(stale)} sections unchanged, {len(stale)} to generate "
+          f"with up to {concurrency} concurrent LLM calls")
+
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+        for entry, analysis in zip(stale, pool.map(narrative, stale)):
+            md, body = render_section(entry, analysis)
+            for extension, content in (("md", md), ("html", body)):
+                with open(section_path(cache_dir, entry["fingerprint"], extension), "w") as f:
+                    f.write(content)
+            manifest[entry["game"]["name"]] = {"fingerprint": entry["fingerprint"], "fallback": bool(analysis.get("fallback"))}
+
+    # Forget games that no longer exist, then assemble the documents from the sections
+    names = {entry["game"]["name"] for entry in entries}
+    manifest = {name: value for name, value in manifest.items() if name in names}
+    with open(os.path.join(cache_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    def sections(extension):
+        for entry in sorted(entries, key=lambda entry: entry["game"]["name"]):
+            with open(section_path(cache_dir, entry["fingerprint"], extension)) as f:
+                yield f.read()
+
+    generated = datetime.now(UTC).strftime("%Y-%m-%d")
+    overview_md, overview_html = render_overview(entries)
+    with open(path, "w") as f:
+        f.write(f"# Gaming and Mental Health Analysis\n\n*Generated on {generated}*\n\n## Overview\n\n{overview_md}\n\n")
+        for section in sections("md"):
+            f.write(section + "\n")
+    with open(os.path.splitext(path)[0] + ".html", "w") as f:
+        f.write("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Gaming and Mental Health Analysis</title>"
+                "<style>body{font-family:sans-serif;max-width:960px;margin:auto}table{border-collapse:collapse}"
+                "td,th{border:1px solid #ccc;padding:4px 8px}</style></head><body>\n"
+                f"<h1>Gaming and Mental Health Analysis</h1><p><em>Generated on {generated}</em></p>\n"
+                f"<h2>Overview</h2>\n{overview_html}\n")
+        for section in sections("html"):
+            f.write(section + "\n")
+        f.write("</body></html>\n")
+
+    print(f"Report for {len(entries)} games written to {path} in {time.perf_counter() - start:.2f}s")
+    return len(stale)
@@ -1,25 +1,90 @@
+"""
+Bring up a populated environment in one process: indexes, players, games,
+sessions, Markov transitions and the analysis report.
+
+The stages form a dependency DAG run by pipeline.Pipeline, so index creation
+and player and game generation run concurrently, and the Markov job runs
+alongside the report. Stages whose outputs are already up to date are
+skipped; pass --force to rerun everything.
+
+--seed generates reproducible data without the LLM, and --snapshot replaces
+generation with a restore of a snapshot.py export (indexes are built after
+the load).
+
+Usage:
+    python run_all.py [--force] [--only report] [--workers 4] [--seed 42 | --snapshot snapshots/latest]
+"""
+
 import os
 import sys
-import time
-
-def run_script(script_name, description):
-    """Run a Python script and handle any errors"""
-    print(f"\n{'=' * 50}")
-    print(f"RUNNING: {description}")
-    print(f"{'=' * 50}\n")
-    
-    exit_code = os.system(f"python {script_name}")
-    
-    if exit_code != 0:
-        print(f"\nERROR: {description} failed with exit code {exit_code}")
-        sys.exit(exit_code)
+import argparse
+from pymongo.errors import ConnectionFailure
+import database
+import setup_database
+from generate_data import add_generation_stages, GENERATE_SEED
+from pipeline import Pipeline, PipelineError
+
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", 4))
+
+
+def indexes_stage(context):
+    return setup_database.create_indexes(database.get_database())
+
+
+def restore_stage(snapshot_dir):
+    def run(context):
+        from snapshot import restore_snapshot
+        counts = restore_snapshot(database.get_database("seed"), snapshot_dir, build_indexes=False)
+        return sum(counts.values())
+    return run
+
+
+def markov_stage(context):
+    from markov import run_markov_job
+    return run_markov_job(database.get_database()).sessions
+
+
+def report_stage(context):
+    # The report keeps its own per-game section cache, so it always runs and only regenerates what changed
+    import analyze_data
+    from report import generate_report
+    generate_report(analyze_data.get_db())
+    return analyze_data.get_db()["games"].count_documents({})
+
+
+def build_pipeline(max_workers=PIPELINE_WORKERS, seed=GENERATE_SEED, snapshot_dir=None):
+    """The full bring-up DAG, generating the data or restoring it from snapshot_dir"""
+    pipeline = Pipeline(database.get_database, max_workers=max_workers)
+    index_fingerprint = {"indexes": repr(setup_database.INDEXES)}
+    if snapshot_dir:
+        from snapshot import read_manifest
+        created_at = read_manifest(snapshot_dir)["created_at"]
+        pipeline.add("restore", restore_stage(snapshot_dir),
+                     fingerprint={"snapshot": os.path.abspath(snapshot_dir), "created_at": created_at},
+                     outputs=["players", "games", "sessions"])
+        # The restore drops the collections, so the indexes are built once the data is in
+        pipeline.add("indexes", indexes_stage, deps=["restore"], fingerprint=index_fingerprint)
+        data_stage = "restore"
     else:
-        print(f"\nSUCCESS: {description} completed")
+        pipeline.add("indexes", indexes_stage, fingerprint=index_fingerprint)
+        add_generation_stages(pipeline, seed=seed)
+        data_stage = "sessions"
+    pipeline.add("markov", markov_stage, deps=[data_stage, "indexes"], fingerprint={},
+                 inputs=["games", "sessions"], outputs=["markov_transitions"])
+    pipeline.add("report", report_stage, deps=[data_stage, "indexes"])
+    return pipeline
+
 
 def main():
-    # Start timing
-    start_time = time.time()
-    
+    parser = argparse.ArgumentParser(description="Set up the database, generate data and write the analysis report")
+    parser.add_argument("--force", action="store_true", help="Run every stage even if its outputs are up to date")
+    parser.add_argument("--only", nargs="+", help="Run only these stages (and the stages they depend on)")
+    parser.add_argument("--workers", type=int, default=PIPELINE_WORKERS, help="Stages to run at the same time")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--seed", type=int, default=GENERATE_SEED, help="Generate reproducible data without the LLM")
+    source.add_argument("--snapshot", help="Restore players, games and sessions from this snapshot directory")
+    args = parser.parse_args()
+
     # Check for .env file
     if not os.path.exists(".env"):
         print("ERROR: .env file not found. Please create it with your API keys and MongoDB connection string.")
@@ -28,25 +93,22 @@ def main():
         print("MONGODB_URI=mongodb://localhost:27017/")
         print("DATABASE_NAME=gaming_mental_health")
         sys.exit(1)
-    
-    # Step 1: Set up database
-    run_script("setup_database.py", "Database setup")
-    
-    # Step 2: Generate data
-    run_script("generate_data.py", "Data generation")
-    
-    # Step 3: Analyze data
-    run_script("analyze_data.py", "Data analysis")
-    
-    # Calculate total runtime
-    total_time = time.time() - start_time
-    minutes = int(total_time // 60)
-    seconds = int(total_time % 60)
-    
-    print(f"\n{'=' * 50}")
-    print(f"All processes completed successfully in {minutes} minutes and {seconds} seconds!")
-    print(f"{'=' * 50}\n")
-    print("You can find the analysis results in 'game_mental_health_analysis.md'")
+
+    try:
+        setup_database.check_connection()
+    except ConnectionFailure as e:
+        print(f"MongoDB Connection Failed: {e}")
+        print("Please check that MongoDB is running and your connection string is correct")
+        sys.exit(1)
+
+    try:
+        build_pipeline(args.workers, args.seed, args.snapshot).run(force=args.force, only=args.only)
+    except PipelineError as e:
+        print(f"\nERROR: {e}")
+        sys.exit(1)
+
+    print("\nYou can find the analysis results in 'game_mental_health_analysis.md'")
+
 
 if __name__ == "__main__":
     main()
@@ -3,12 +3,31 @@ Run script for the Gaming and Mental Health Analysis Platform
 This script provides a simple way to start both backend and frontend services
 """
 
-import os
 import subprocess
 import time
-import threading
 import webbrowser
 import sys
+import urllib.request
+import urllib.error
+
+BACKEND_HEALTH_URL = "http://localhost:8000/health"
+FRONTEND_HEALTH_URL = "http://localhost:8501/_stcore/health"
+STARTUP_TIMEOUT_SECONDS = 60
+
+def wait_until_ready(process, health_url, timeout=STARTUP_TIMEOUT_SECONDS, interval=0.1):
+    """Poll a health URL until it answers 200; returns False if the process exits or time runs out"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(health_url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            pass
+        time.sleep(interval)
+    return False
 
 def start_backend():
     """Start the FastAPI backend server"""
@@ -20,14 +39,16 @@ def start_backend():
         text=True
     )
     
-    # Wait for backend to start
-    time.sleep(2)
-    if backend_process.poll() is not None:
+    # Wait for backend to answer its health check
+    start = time.monotonic()
+    if not wait_until_ready(backend_process, BACKEND_HEALTH_URL):
         print("Error starting backend:")
+        if backend_process.poll() is None:
+            backend_process.terminate()
         print(backend_process.stderr.read())
         sys.exit(1)
     
-    print("Backend started successfully!")
+    print(f"Backend started successfully in {time.monotonic() - start:.2f}s!")
     return backend_process
 
 def start_frontend():
@@ -40,14 +61,16 @@ def start_frontend():
         text=True
     )
     
-    # Wait for frontend to start
-    time.sleep(5)
-    if frontend_process.poll() is not None:
+    # Wait for frontend to answer its health check
+    start = time.monotonic()
+    if not wait_until_ready(frontend_process, FRONTEND_HEALTH_URL):
         print("Error starting frontend:")
+        if frontend_process.poll() is None:
+            frontend_process.terminate()
         print(frontend_process.stderr.read())
         sys.exit(1)
         
-    print("Frontend started successfully!")
+    print(f"Frontend started successfully in {time.monotonic() - start:.2f}s!")
     return frontend_process
 
 def open_browser():
@@ -61,24 +84,21 @@ def main():
     print("Gaming and Mental Health Analysis Platform")
     print("="*50)
     
-    # Ensure database setup
-    if not os.path.exists(".database_initialized"):
-        print("\nSetting up database...")
-        subprocess.run([sys.executable, "setup_database.py"], check=True)
-        
-        print("\nGenerating sample data...")
-        subprocess.run([sys.executable, "generate_data.py"], check=True)
-        
-        # Create a marker file to avoid re-initializing
-        with open(".database_initialized", "w") as f:
-            f.write("Database initialized")
+    # Ensure the indexes exist; sample data is only generated into an empty database, never over existing data
+    print("\nSetting up database and sample data...")
+    import database
+    from run_all import build_pipeline
+    stages = ["indexes"]
+    if database.get_database()["sessions"].estimated_document_count() == 0:
+        stages.append("sessions")
+    build_pipeline().run(only=stages)
     
     # Start services
     backend = start_backend()
     frontend = start_frontend()
     
-    # Open browser after a short delay
-    threading.Timer(2, open_browser).start()
+    # Both services are ready, so the browser can open straight away
+    open_browser()
     
     print("\nApplication is now running!")
     print("- Backend API: http://localhost:8000")
@@ -1,56 +1,70 @@
 import os
 from dotenv import load_dotenv
-from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo import ASCENDING, DESCENDING
 from pymongo.errors import ConnectionFailure
+import database
 
 # Load environment variables
 load_dotenv()
 
+# Indexes per collection as (keys, options); the pipeline fingerprints this list
+INDEXES = {
+    "players": [
+        ([("name.first", ASCENDING), ("name.last", ASCENDING)], {}),
+        ([("baseline_mental_health", ASCENDING)], {}),
+    ],
+    "games": [
+        # Unique index with partial filter to exclude null values
+        ([("name", ASCENDING)], {"unique": True, "partialFilterExpression": {"name": {"$type": "string"}}}),
+        ([("genre", ASCENDING)], {}),
+    ],
+    "sessions": [
+        # Player history pages and the Markov job's player-ordered scan (also serves player_id lookups)
+        ([("player_id", ASCENDING), ("session_date", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("game_id", ASCENDING)], {}),
+        # Per-game data versions (session count and newest _id) for ETags
+        ([("game_id", ASCENDING), ("_id", DESCENDING)], {}),
+        ([("session_date", DESCENDING)], {}),
+        ([("mental_health_after", ASCENDING)], {}),
+    ],
+}
+
+def check_connection():
+    """Ping MongoDB, raising ConnectionFailure if it can't be reached"""
+    database.get_client().admin.command('ping')
+    print("Connected successfully to MongoDB")
+
+def drop_collections(db):
+    """Drop the players, games and sessions collections to start fresh (this fixes index issues)"""
+    for name in INDEXES:
+        db[name].drop()
+    print("Dropped existing collections to start fresh")
+
+def create_indexes(db):
+    """Create the indexes for better query performance; existing ones are left as they are"""
+    count = 0
+    for name, indexes in INDEXES.items():
+        for keys, options in indexes:
+            db[name].create_index(keys, **options)
+            count += 1
+    return count
+
 def setup_database():
     """Set up the MongoDB database and create necessary indexes"""
-    
-    mongo_uri = os.getenv("MONGODB_URI")
+
     db_name = os.getenv("DATABASE_NAME")
-    
+
     try:
-        # Connect to MongoDB
-        client = MongoClient(mongo_uri)
-        
-        # Test connection
-        client.admin.command('ping')
-        print("Connected successfully to MongoDB")
-        
+        check_connection()
+
         # Access or create the database
-        db = client[db_name]
-        
-        # Access or create collections
-        players = db["players"]
-        games = db["games"]
-        sessions = db["sessions"]
-        
-        # Drop existing collections to start fresh (this fixes index issues)
-        players.drop()
-        games.drop()
-        sessions.drop()
-        print("Dropped existing collections to start fresh")
-        
-        # Create indexes for better query performance
-        players.create_index([("name.first", ASCENDING), ("name.last", ASCENDING)])
-        players.create_index([("baseline_mental_health", ASCENDING)])
-        
-        # Create unique index with partial filter to exclude null values
-        games.create_index([("name", ASCENDING)], 
-                          unique=True, 
-                          partialFilterExpression={"name": {"$type": "string"}})
-        games.create_index([("genre", ASCENDING)])
-        
-        sessions.create_index([("player_id", ASCENDING)])
-        sessions.create_index([("game_id", ASCENDING)])
-        sessions.create_index([("session_date", DESCENDING)])
-        sessions.create_index([("mental_health_after", ASCENDING)])
-        
+        db = database.get_database()
+
+        drop_collections(db)
+        create_indexes(db)
+
         print(f"Database '{db_name}' is ready with all necessary collections and indexes")
-        
+
     except ConnectionFailure as e:
         print(f"MongoDB Connection Failed: {e}")
         print("Please check that MongoDB is running and your connection string is correct")
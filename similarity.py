@@ -0,0 +1,230 @@
+"""
+Similar-games index over game profile vectors.
+
+Each game's profile concatenates three L2-normalised, weighted blocks:
+- its baseline -> after transition distribution (the 5x5 matrix behind
+  extract_game_statistics)
+- its average session duration, scaled by DURATION_SCALE_MINUTES
+- a one-hot genre
+
+Profiles are unit vectors, so cosine similarity is a dot product. Instead of
+an n x n matrix, only the SIMILAR_TOP_K nearest neighbours of each game are
+kept, computed in row blocks. That keeps memory at n x k as the catalog grows.
+
+Published sessions only mark their game dirty. The next query recomputes the
+dirty rows and patches them into every other game's neighbour list. A full
+rebuild every SIMILAR_REBUILD_SECONDS, run in the background, corrects any
+drift from that patching and picks up new games and sessions written
+elsewhere. Only the first build runs on the request thread.
+"""
+
+import os
+import time
+import threading
+import numpy as np
+from analytics import MENTAL_HEALTH_STATES, aggregate_game_counters
+import metrics
+
+SIMILAR_TOP_K = int(os.getenv("SIMILAR_TOP_K", 50))
+SIMILAR_REBUILD_SECONDS = float(os.getenv("SIMILAR_REBUILD_SECONDS", 600))
+DURATION_SCALE_MINUTES = 120
+TRANSITION_WEIGHT = 1.0
+DURATION_WEIGHT = 0.5
+GENRE_WEIGHT = 0.5
+BLOCK_ROWS = 1024
+
+STATE_CODES = {state: code for code, state in enumerate(MENTAL_HEALTH_STATES)}
+N_STATES = len(MENTAL_HEALTH_STATES)
+
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def top_k(scores, k):
+    """Column indices and values of the k largest entries per row, best first"""
+    if k <= 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int32), np.zeros((scores.shape[0], 0), dtype=np.float32)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    return np.take_along_axis(part, order, axis=1).astype(np.int32), np.take_along_axis(part_scores, order, axis=1)
+
+
+class SimilarityIndex:
+    """Top-k cosine neighbours of every game's profile vector"""
+
+    def __init__(self, get_db, top_k=SIMILAR_TOP_K, rebuild_seconds=SIMILAR_REBUILD_SECONDS):
+        # get_db is called on use, like the ingest batcher, so creating the index doesn't connect
+        self.get_db = get_db
+        self.top_k = top_k
+        self.rebuild_seconds = rebuild_seconds
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+        self.built_at = None
+        self.rebuilding = False
+        self.dirty = set()
+        self.games = []
+        self.rows = {}
+        self.names = {}
+        self.genres = {}
+        self.counts = np.zeros((0, N_STATES * N_STATES), dtype=np.float64)
+        self.duration_sums = np.zeros(0, dtype=np.float64)
+        self.duration_counts = np.zeros(0, dtype=np.float64)
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.neighbors = np.zeros((0, 0), dtype=np.int32)
+        self.scores = np.zeros((0, 0), dtype=np.float32)
+
+    # -- profiles ---------------------------------------------------------
+
+    def profile_vectors(self, rows):
+        """Unit-length profile vectors for the given rows"""
+        counts = self.counts[rows]
+        transitions = normalize_rows(counts / np.maximum(counts.sum(axis=1, keepdims=True), 1))
+
+        design = np.array([self.games[row].get("avg_session_duration_minutes") or 0 for row in rows], dtype=np.float64)
+        observed = np.divide(self.duration_sums[rows], self.duration_counts[rows],
+                             out=design.copy(), where=self.duration_counts[rows] > 0)
+        duration = np.minimum(observed, DURATION_SCALE_MINUTES)[:, None] / DURATION_SCALE_MINUTES
+
+        genres = np.zeros((len(rows), max(len(self.genres), 1)))
+        for i, row in enumerate(rows):
+            genres[i, self.genres[self.games[row].get("genre") or ""]] = 1.0
+
+        vectors = np.hstack([TRANSITION_WEIGHT * transitions, DURATION_WEIGHT * duration, GENRE_WEIGHT * genres])
+        return normalize_rows(vectors).astype(np.float32)
+
+    def nearest(self, rows):
+        """Top-k neighbours for the given rows, excluding each game itself"""
+        k = min(self.top_k, len(self.games) - 1)
+        sims = self.vectors[rows] @ self.vectors.T
+        sims[np.arange(len(rows)), rows] = -np.inf
+        return top_k(sims, k)
+
+    # -- building ---------------------------------------------------------
+
+    def rebuild(self):
+        """Recompute every profile and neighbour list from MongoDB"""
+        with metrics.span("similarity_rebuild"):
+            games = list(self.get_db()["games"].find())
+            counters = aggregate_game_counters(self.get_db()["sessions"])
+            with self.lock:
+                self.games = games
+                self.rows = {game["_id"]: row for row, game in enumerate(games)}
+                self.names = {game["name"]: row for row, game in enumerate(games)}
+                self.genres = {genre: col for col, genre in enumerate(sorted({g.get("genre") or "" for g in games}))}
+                n = len(games)
+                self.counts = np.zeros((n, N_STATES * N_STATES), dtype=np.float64)
+                self.duration_sums = np.zeros(n, dtype=np.float64)
+                self.duration_counts = np.zeros(n, dtype=np.float64)
+                for game_id, game_counters in counters.items():
+                    row = self.rows.get(game_id)
+                    if row is None:
+                        continue
+                    for key, count in game_counters["transitions"].items():
+                        baseline, after = key.split(" -> ")
+                        if baseline in STATE_CODES and after in STATE_CODES:
+                            self.counts[row, STATE_CODES[baseline] * N_STATES + STATE_CODES[after]] = count
+                    self.duration_sums[row] = game_counters["duration_total"]
+                    self.duration_counts[row] = game_counters["duration_count"]
+
+                all_rows = np.arange(n)
+                self.vectors = self.profile_vectors(all_rows) if n else np.zeros((0, 0), dtype=np.float32)
+                k = max(min(self.top_k, n - 1), 0)
+                self.neighbors = np.zeros((n, k), dtype=np.int32)
+                self.scores = np.zeros((n, k), dtype=np.float32)
+                for start in range(0, n, BLOCK_ROWS):
+                    block = all_rows[start:start + BLOCK_ROWS]
+                    self.neighbors[block], self.scores[block] = self.nearest(block)
+                self.dirty.clear()
+                self.built_at = time.monotonic()
+
+    def apply(self, sessions):
+        """Fold published sessions (which carry their player's baseline) into the profiles"""
+        if self.built_at is None:
+            return
+        with self.lock:
+            for session in sessions:
+                row = self.rows.get(session["game_id"])
+                if row is None:
+                    # A game added since the last rebuild; the next rebuild will include it
+                    continue
+                baseline, after = session.get("baseline"), session["mental_health_after"]
+                if baseline in STATE_CODES and after in STATE_CODES:
+                    self.counts[row, STATE_CODES[baseline] * N_STATES + STATE_CODES[after]] += 1
+                    self.duration_sums[row] += session["duration_minutes"]
+                    self.duration_counts[row] += 1
+                    self.dirty.add(row)
+
+    def refresh_dirty(self):
+        """Recompute changed profiles and patch them into every neighbour list"""
+        with self.lock:
+            if not self.dirty or self.neighbors.shape[1] == 0:
+                self.dirty.clear()
+                return
+            rows = np.array(sorted(self.dirty))
+            self.dirty.clear()
+            with metrics.span("similarity_refresh"):
+                self.vectors[rows] = self.profile_vectors(rows)
+                k = self.neighbors.shape[1]
+
+                # Other games: drop stale scores for the changed games, then merge in their new ones
+                is_dirty = np.isin(self.neighbors, rows)
+                scores = np.where(is_dirty, -np.inf, self.scores)
+                new_scores = self.vectors @ self.vectors[rows].T
+                new_scores[rows, np.arange(len(rows))] = -np.inf
+                merged_ids = np.hstack([self.neighbors, np.broadcast_to(rows, (len(self.games), len(rows)))])
+                merged_scores = np.hstack([scores, new_scores])
+                order, self.scores = top_k(merged_scores, k)
+                self.neighbors = np.take_along_axis(merged_ids, order, axis=1).astype(np.int32)
+
+                # The changed games themselves get exact neighbour lists
+                self.neighbors[rows], self.scores[rows] = self.nearest(rows)
+
+    def rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception as e:
+            print(f"Error rebuilding similar games: {e}")
+        finally:
+            self.rebuilding = False
+
+    def start_rebuild(self):
+        """Rebuild in a background thread unless one is already running"""
+        with self.build_lock:
+            if self.rebuilding:
+                return
+            self.rebuilding = True
+        threading.Thread(target=self.rebuild_in_background, name="similarity-rebuild", daemon=True).start()
+
+    def ensure_fresh(self):
+        """Build the index on first use, and rebuild it in the background once it is stale"""
+        if self.built_at is None:
+            with self.build_lock:
+                # Concurrent first requests wait for one build instead of each running their own
+                if self.built_at is None:
+                    self.rebuild()
+        elif time.monotonic() - self.built_at > self.rebuild_seconds:
+            self.start_rebuild()
+        if self.dirty:
+            self.refresh_dirty()
+
+    def similar(self, game_name, limit=5):
+        """Most similar games to game_name, or None if the game isn't known"""
+        self.ensure_fresh()
+        # Row numbers change with every rebuild, so the lookup and the read happen under one lock
+        with self.lock:
+            row = self.names.get(game_name)
+            if row is not None:
+                neighbors = self.neighbors[row, :limit]
+                scores = self.scores[row, :limit]
+                return [
+                    {"game_name": self.games[n]["name"], "genre": self.games[n].get("genre") or "", "similarity": float(s)}
+                    for n, s in zip(neighbors, scores) if np.isfinite(s)
+                ]
+        if not self.get_db()["games"].find_one({"name": game_name}, {"_id": 1}):
+            return None
+        # A game added since the last rebuild has no neighbours until a background rebuild picks it up
+        self.start_rebuild()
+        return []
@@ -0,0 +1,258 @@
+"""
+Approximate per-game statistics from fixed-size sketches.
+
+For every game, SketchIndex keeps:
+- a HyperLogLog of player ids, for the number of distinct players
+- exact counts of the 25 baseline -> after transitions (a domain that small
+  needs no frequency sketch)
+- a reservoir sample of sessions, for the average duration
+- an exact session counter
+
+Each sketch has a fixed size, so answering /analyze?approx=true costs the
+same for a game with fifty sessions as for one with fifty million. Every
+estimate comes with its error bound:
+- HyperLogLog: relative standard error 1.04 / sqrt(2^SKETCH_HLL_PRECISION)
+- reservoir mean: normal-approximation margin with a finite population correction
+
+The sketches are seeded with one streamed pass over the sessions, which takes
+minutes at tens of millions of sessions, so it always runs in the background
+(started by warmup or the first approx request); until it is done, ready is
+False and the API serves exact statistics instead. They are updated from
+published sessions (ingest and the change stream) and rebuilt in the
+background every SKETCH_REBUILD_SECONDS to pick up writes made by other
+processes.
+"""
+
+import os
+import math
+import time
+import random
+import hashlib
+import threading
+from array import array
+from analytics import MENTAL_HEALTH_STATES, transition_key, build_statistics
+import metrics
+
+SKETCH_HLL_PRECISION = int(os.getenv("SKETCH_HLL_PRECISION", 12))
+SKETCH_RESERVOIR_SIZE = int(os.getenv("SKETCH_RESERVOIR_SIZE", 2000))
+SKETCH_REBUILD_SECONDS = float(os.getenv("SKETCH_REBUILD_SECONDS", 3600))
+Z_95 = 1.96
+
+STATE_CODES = {state: code for code, state in enumerate(MENTAL_HEALTH_STATES)}
+N_STATES = len(MENTAL_HEALTH_STATES)
+# Transition keys by cell, baseline * N_STATES + after
+TRANSITION_KEYS = [transition_key(before, after) for before in MENTAL_HEALTH_STATES for after in MENTAL_HEALTH_STATES]
+
+SESSION_PROJECTION = {"player_id": 1, "game_id": 1, "duration_minutes": 1, "mental_health_after": 1}
+
+
+def hash64(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """Distinct-count sketch with 2^precision one-byte registers"""
+
+    def __init__(self, precision=SKETCH_HLL_PRECISION):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+
+    def add(self, item):
+        h = hash64(item)
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        raw = alpha * self.m * self.m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * self.m and zeros:
+            # Small-range correction (linear counting)
+            return self.m * math.log(self.m / zeros)
+        return raw
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(self.m)
+
+
+class Reservoir:
+    """Uniform sample of at most capacity items from a stream (Algorithm R)"""
+
+    def __init__(self, capacity=SKETCH_RESERVOIR_SIZE, seed=None):
+        self.capacity = capacity
+        self.items = []
+        self.seen = 0
+        self.random = random.Random(seed)
+
+    def add(self, item):
+        self.seen += 1
+        if len(self.items) < self.capacity:
+            self.items.append(item)
+        else:
+            slot = self.random.randrange(self.seen)
+            if slot < self.capacity:
+                self.items[slot] = item
+
+    def mean(self):
+        """(mean, 95% margin) of the sampled values"""
+        n = len(self.items)
+        if not n:
+            return 0.0, 0.0
+        mean = sum(self.items) / n
+        if n < 2:
+            return mean, 0.0
+        variance = sum((item - mean) ** 2 for item in self.items) / (n - 1)
+        correction = math.sqrt((self.seen - n) / (self.seen - 1)) if self.seen > 1 else 0.0
+        return mean, Z_95 * math.sqrt(variance / n) * correction
+
+
+class GameSketch:
+    """All the sketches for one game"""
+
+    def __init__(self, seed=None):
+        self.sessions = 0
+        self.players = HyperLogLog()
+        self.transitions = array("Q", bytes(8 * N_STATES * N_STATES))
+        self.durations = Reservoir(seed=seed)
+
+    def add(self, player_id, baseline, after, duration):
+        self.sessions += 1
+        self.players.add(player_id.binary if hasattr(player_id, "binary") else str(player_id).encode())
+        # Like the exact engines, sessions from unknown players only count towards the total
+        if baseline:
+            # Outcomes outside the state vocabulary have no cell, as in the exact engines' transition matrices
+            if baseline in STATE_CODES and after in STATE_CODES:
+                self.transitions[STATE_CODES[baseline] * N_STATES + STATE_CODES[after]] += 1
+            self.durations.add(duration)
+
+    def statistics(self, game):
+        """extract_game_statistics-shaped result from the sketches, plus its error bounds"""
+        transitions = {key: count for key, count in zip(TRANSITION_KEYS, self.transitions) if count}
+        avg_duration, duration_margin = self.durations.mean()
+        stats = build_statistics(game, transitions, self.sessions, avg_duration)
+
+        stats["approximate"] = {
+            "sessions": self.sessions,
+            "distinct_players": {
+                "estimate": round(self.players.estimate()),
+                "relative_error": self.players.relative_error
+            },
+            "avg_duration": {
+                "estimate": avg_duration,
+                "margin": duration_margin,
+                "sample_size": len(self.durations.items)
+            }
+        }
+        return stats
+
+
+class SketchIndex:
+    """Per-game sketches for approximate statistics"""
+
+    def __init__(self, get_db, rebuild_seconds=SKETCH_REBUILD_SECONDS):
+        # get_db is called on use, like the ingest batcher, so creating the index doesn't connect
+        self.get_db = get_db
+        self.rebuild_seconds = rebuild_seconds
+        self.lock = threading.Lock()
+        self.games = {}
+        self.game_ids = {}
+        self.sketches = {}
+        self.built_at = None
+        self.rebuilding = False
+
+    def new_sketch(self, game_id):
+        # Seeded per game so repeated rebuilds sample the same way
+        return GameSketch(seed=str(game_id))
+
+    def rebuild(self, batch_size=10_000):
+        """Seed every game's sketches with one streamed pass over the sessions"""
+        with metrics.span("sketches_rebuild"):
+            db = self.get_db()
+            games = {game["_id"]: game for game in db["games"].find()}
+            baselines = {player["_id"]: player.get("baseline_mental_health")
+                         for player in db["players"].find({}, {"baseline_mental_health": 1}).batch_size(batch_size)}
+            sketches = {}
+            for session in db["sessions"].find({}, SESSION_PROJECTION).batch_size(batch_size):
+                sketch = sketches.get(session["game_id"])
+                if sketch is None:
+                    sketch = sketches[session["game_id"]] = self.new_sketch(session["game_id"])
+                sketch.add(session["player_id"], baselines.get(session["player_id"]),
+                           session["mental_health_after"], session["duration_minutes"])
+        with self.lock:
+            self.games = games
+            self.game_ids = {game["name"]: game_id for game_id, game in games.items()}
+            self.sketches = sketches
+            self.built_at = time.monotonic()
+
+    def rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception as e:
+            print(f"Error rebuilding sketches: {e}")
+        finally:
+            self.rebuilding = False
+
+    @property
+    def ready(self):
+        return self.built_at is not None
+
+    def ensure_fresh(self):
+        """Start a background build if the sketches are missing or stale; returns whether they can be read"""
+        stale = self.built_at is None or time.monotonic() - self.built_at > self.rebuild_seconds
+        if stale:
+            with self.lock:
+                start = not self.rebuilding
+                self.rebuilding = True
+            if start:
+                threading.Thread(target=self.rebuild_in_background, name="sketches-rebuild", daemon=True).start()
+        return self.ready
+
+    def apply(self, sessions):
+        """Fold published sessions (which carry their player's baseline) into the sketches"""
+        if self.built_at is None:
+            return
+        with self.lock:
+            for session in sessions:
+                sketch = self.sketches.get(session["game_id"])
+                if sketch is None:
+                    sketch = self.sketches[session["game_id"]] = self.new_sketch(session["game_id"])
+                sketch.add(session["player_id"], session.get("baseline"),
+                           session["mental_health_after"], session["duration_minutes"])
+
+    def refresh_games(self):
+        """Pick up games added since the last rebuild without rescanning sessions"""
+        games = {game["_id"]: game for game in self.get_db()["games"].find()}
+        with self.lock:
+            self.games = games
+            self.game_ids = {game["name"]: game_id for game_id, game in games.items()}
+
+    def version(self, game_name):
+        """Version string of a game's sketches for ETags, or None if the game isn't known or they aren't built yet"""
+        if not self.ensure_fresh():
+            return None
+        game_id = self.game_ids.get(game_name)
+        if game_id is None:
+            self.refresh_games()
+            game_id = self.game_ids.get(game_name)
+            if game_id is None:
+                return None
+        sketch = self.sketches.get(game_id)
+        return f"{game_id}-approx-{sketch.sessions if sketch else 0}"
+
+    def statistics(self, game_name):
+        """Approximate statistics for a game, or None if the game isn't known or the sketches aren't built yet"""
+        if not self.ensure_fresh():
+            return None
+        with self.lock:
+            game_id = self.game_ids.get(game_name)
+            if game_id is None:
+                return None
+            sketch = self.sketches.get(game_id)
+            if sketch is None:
+                return build_statistics(self.games[game_id], {}, 0, 0)
+            return sketch.statistics(self.games[game_id])
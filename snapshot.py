@@ -0,0 +1,389 @@
+"""
+Columnar snapshots of the players, games and sessions collections.
+
+export_snapshot() streams each collection through a large-batch cursor into
+Parquet or Arrow IPC files. Sessions are partitioned hive-style by
+session_date month and game:
+
+    <dir>/manifest.json
+    <dir>/players.parquet
+    <dir>/games.parquet
+    <dir>/sessions/month=2025-05/game=<game_id hex>/part-0.parquet
+
+The loaders open snapshots through a memory-mapped filesystem, so Arrow IPC
+snapshots are read without copying and partition filters only touch the
+files they need.
+
+restore_snapshot() loads a snapshot back into MongoDB: each collection is
+dropped, refilled with unordered insert_many calls from RESTORE_WORKERS
+threads, and only then indexed, so index builds happen once over the loaded
+data instead of on every insert.
+
+Usage:
+    python snapshot.py export snapshots/2025-05-20 --format ipc
+    python snapshot.py restore snapshots/2025-05-20 [--workers 8]
+"""
+
+import os
+import json
+import time
+import shutil
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, UTC
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from bson import ObjectId
+
+FORMATS = {"parquet": "parquet", "ipc": "arrow"}
+DEFAULT_BATCH_SIZE = 100_000
+RESTORE_WORKERS = int(os.getenv("RESTORE_WORKERS", 8))
+RESTORE_BATCH_SIZE = int(os.getenv("RESTORE_BATCH_SIZE", 10_000))
+# Session partition files: rows buffered per partition before a row group is written, and the file size cap
+MIN_ROWS_PER_GROUP = 16_384
+MAX_ROWS_PER_GROUP = 131_072
+MAX_ROWS_PER_FILE = 1_048_576
+
+OBJECT_ID = pa.binary(12)
+TIMESTAMP = pa.timestamp("ms", tz="UTC")
+STATE = pa.dictionary(pa.int8(), pa.string())
+
+PLAYER_SCHEMA = pa.schema([
+    ("_id", OBJECT_ID),
+    ("name_first", pa.string()),
+    ("name_last", pa.string()),
+    ("age", pa.int16()),
+    ("gender", pa.string()),
+    ("baseline_mental_health", STATE),
+    ("created_at", TIMESTAMP),
+])
+
+GAME_SCHEMA = pa.schema([
+    ("_id", OBJECT_ID),
+    ("name", pa.string()),
+    ("genre", pa.string()),
+    ("type", pa.string()),
+    ("avg_session_duration_minutes", pa.int16()),
+    ("difficulty", pa.string()),
+    ("created_at", TIMESTAMP),
+])
+
+SESSION_SCHEMA = pa.schema([
+    ("_id", OBJECT_ID),
+    ("player_id", OBJECT_ID),
+    ("game_id", OBJECT_ID),
+    ("session_date", TIMESTAMP),
+    ("duration_minutes", pa.int16()),
+    ("mental_health_after", STATE),
+    ("notes", pa.string()),
+    ("month", pa.string()),
+    ("game", pa.string()),
+])
+
+PARTITIONING = ds.partitioning(pa.schema([("month", pa.string()), ("game", pa.string())]), flavor="hive")
+
+
+def player_row(player):
+    name = player.get("name") or {}
+    return {
+        "_id": player["_id"].binary,
+        "name_first": name.get("first"),
+        "name_last": name.get("last"),
+        "age": player.get("age"),
+        "gender": player.get("gender"),
+        "baseline_mental_health": player.get("baseline_mental_health"),
+        "created_at": player.get("created_at"),
+    }
+
+
+def game_row(game):
+    return {
+        "_id": game["_id"].binary,
+        "name": game.get("name"),
+        "genre": game.get("genre"),
+        "type": game.get("type"),
+        "avg_session_duration_minutes": game.get("avg_session_duration_minutes"),
+        "difficulty": game.get("difficulty"),
+        "created_at": game.get("created_at"),
+    }
+
+
+def session_row(session):
+    session_date = session.get("session_date")
+    return {
+        "_id": session["_id"].binary,
+        "player_id": session["player_id"].binary,
+        "game_id": session["game_id"].binary,
+        "session_date": session_date,
+        "duration_minutes": session.get("duration_minutes"),
+        "mental_health_after": session.get("mental_health_after"),
+        "notes": session.get("notes"),
+        "month": session_date.strftime("%Y-%m") if session_date else "unknown",
+        "game": str(session["game_id"]),
+    }
+
+
+def player_document(row):
+    return {
+        "_id": ObjectId(row["_id"]),
+        "name": {"first": row["name_first"], "last": row["name_last"]},
+        "age": row["age"],
+        "gender": row["gender"],
+        "baseline_mental_health": row["baseline_mental_health"],
+        "created_at": row["created_at"],
+    }
+
+
+def game_document(row):
+    return {
+        "_id": ObjectId(row["_id"]),
+        "name": row["name"],
+        "genre": row["genre"],
+        "type": row["type"],
+        "avg_session_duration_minutes": row["avg_session_duration_minutes"],
+        "difficulty": row["difficulty"],
+        "created_at": row["created_at"],
+    }
+
+
+def session_document(row):
+    # month and game are partition columns, not part of the document
+    return {
+        "_id": ObjectId(row["_id"]),
+        "player_id": ObjectId(row["player_id"]),
+        "game_id": ObjectId(row["game_id"]),
+        "session_date": row["session_date"],
+        "duration_minutes": row["duration_minutes"],
+        "mental_health_after": row["mental_health_after"],
+        "notes": row["notes"],
+    }
+
+
+def iter_batches(cursor, to_row, schema, batch_size):
+    """Turn a pymongo cursor into Arrow record batches of batch_size rows
+
+    Dictionary columns share one growing dictionary across batches, so every batch's dictionary extends the
+    previous one; an Arrow IPC file can only store such deltas, not a different dictionary per batch.
+    """
+    vocabularies = {field.name: {} for field in schema if pa.types.is_dictionary(field.type)}
+
+    def to_batch(rows):
+        columns = []
+        for field in schema:
+            values = [row[field.name] for row in rows]
+            vocabulary = vocabularies.get(field.name)
+            if vocabulary is None:
+                columns.append(pa.array(values, type=field.type))
+                continue
+            indices = [None if value is None else vocabulary.setdefault(value, len(vocabulary)) for value in values]
+            columns.append(pa.DictionaryArray.from_arrays(
+                pa.array(indices, type=field.type.index_type), pa.array(list(vocabulary), type=field.type.value_type)
+            ))
+        return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+    rows = []
+    for document in cursor:
+        rows.append(to_row(document))
+        if len(rows) >= batch_size:
+            yield to_batch(rows)
+            rows = []
+    if rows:
+        yield to_batch(rows)
+
+
+def write_flat(path, batches, schema, fmt):
+    """Stream record batches into a single Parquet or Arrow IPC file"""
+    count = 0
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(path, schema, compression="zstd")
+    else:
+        writer = ipc.new_file(path, schema, options=ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+    with writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            count += batch.num_rows
+    return count
+
+
+def export_snapshot(db, out_dir, fmt="parquet", batch_size=DEFAULT_BATCH_SIZE):
+    """Export players, games and sessions from db into a snapshot directory"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}', expected one of {sorted(FORMATS)}")
+    extension = FORMATS[fmt]
+    sessions_dir = os.path.join(out_dir, "sessions")
+    if os.path.exists(sessions_dir):
+        shutil.rmtree(sessions_dir)
+    os.makedirs(out_dir, exist_ok=True)
+
+    counts = {}
+    print("Exporting players...")
+    counts["players"] = write_flat(
+        os.path.join(out_dir, f"players.{extension}"),
+        iter_batches(db["players"].find().batch_size(batch_size), player_row, PLAYER_SCHEMA, batch_size),
+        PLAYER_SCHEMA, fmt
+    )
+    print("Exporting games...")
+    counts["games"] = write_flat(
+        os.path.join(out_dir, f"games.{extension}"),
+        iter_batches(db["games"].find().batch_size(batch_size), game_row, GAME_SCHEMA, batch_size),
+        GAME_SCHEMA, fmt
+    )
+
+    print("Exporting sessions...")
+    counts["sessions"] = 0
+    file_format = ds.ParquetFileFormat() if fmt == "parquet" else ds.IpcFileFormat()
+    write_options = file_format.make_write_options(compression="zstd") if fmt == "parquet" else None
+    # In date order, so only the current month's partitions are open at any time
+    cursor = db["sessions"].find().sort("session_date", 1).batch_size(batch_size)
+
+    def counted(batches):
+        for batch in batches:
+            counts["sessions"] += batch.num_rows
+            yield batch
+
+    # One write over every batch, so each partition gets a few large files rather than one per batch
+    ds.write_dataset(
+        pa.RecordBatchReader.from_batches(
+            SESSION_SCHEMA, counted(iter_batches(cursor, session_row, SESSION_SCHEMA, batch_size))
+        ),
+        sessions_dir,
+        format=file_format,
+        file_options=write_options,
+        partitioning=PARTITIONING,
+        basename_template=f"part-{{i}}.{extension}",
+        min_rows_per_group=MIN_ROWS_PER_GROUP,
+        max_rows_per_group=MAX_ROWS_PER_GROUP,
+        max_rows_per_file=MAX_ROWS_PER_FILE,
+        existing_data_behavior="overwrite_or_ignore"
+    )
+
+    manifest = {
+        "format": fmt,
+        "created_at": datetime.now(UTC).isoformat(),
+        "database": db.name,
+        "counts": counts
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"Snapshot written to {out_dir}: {counts}")
+    return manifest
+
+
+def read_manifest(snapshot_dir):
+    with open(os.path.join(snapshot_dir, "manifest.json")) as f:
+        return json.load(f)
+
+
+def open_dataset(snapshot_dir, name):
+    """Open one collection of a snapshot as a memory-mapped Arrow dataset"""
+    fmt = read_manifest(snapshot_dir)["format"]
+    filesystem = pafs.LocalFileSystem(use_mmap=True)
+    if name == "sessions":
+        path = os.path.join(snapshot_dir, "sessions")
+        return ds.dataset(path, format="parquet" if fmt == "parquet" else "ipc",
+                          partitioning=PARTITIONING, filesystem=filesystem)
+    path = os.path.join(snapshot_dir, f"{name}.{FORMATS[fmt]}")
+    return ds.dataset(path, format="parquet" if fmt == "parquet" else "ipc", filesystem=filesystem)
+
+
+def load_table(snapshot_dir, name, columns=None, filter=None):
+    """Read a collection into an Arrow table (zero-copy for IPC snapshots)"""
+    return open_dataset(snapshot_dir, name).to_table(columns=columns, filter=filter)
+
+
+def load_sessions(snapshot_dir, months=None, game_ids=None, columns=None):
+    """Read sessions, pruning partitions by month ("YYYY-MM") and/or game ObjectId"""
+    expression = None
+    if months:
+        expression = ds.field("month").isin(list(months))
+    if game_ids:
+        games = ds.field("game").isin([str(game_id) for game_id in game_ids])
+        expression = games if expression is None else expression & games
+    return load_table(snapshot_dir, "sessions", columns=columns, filter=expression)
+
+
+def insert_batch(collection, batch, to_document):
+    documents = [to_document(row) for row in batch.to_pylist()]
+    if documents:
+        collection.insert_many(documents, ordered=False)
+    return len(documents)
+
+
+def insert_batches(collection, batches, to_document, workers):
+    """insert_many every record batch from a thread pool, with at most 2 * workers batches in memory"""
+    count = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        for batch in batches:
+            if len(in_flight) >= 2 * workers:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                count += sum(future.result() for future in done)
+            in_flight.add(pool.submit(insert_batch, collection, batch, to_document))
+        count += sum(future.result() for future in wait(in_flight).done)
+    return count
+
+
+def restore_snapshot(db, snapshot_dir, workers=RESTORE_WORKERS, batch_size=RESTORE_BATCH_SIZE, build_indexes=True):
+    """Replace players, games and sessions in db with the contents of a snapshot"""
+    manifest = read_manifest(snapshot_dir)
+    start = time.perf_counter()
+    counts = {}
+    for name, to_document in (("players", player_document), ("games", game_document), ("sessions", session_document)):
+        print(f"Restoring {name}...")
+        # Dropping the collection drops its indexes too, so inserts don't maintain them
+        db[name].drop()
+        batches = open_dataset(snapshot_dir, name).to_batches(batch_size=batch_size)
+        counts[name] = insert_batches(db[name], batches, to_document, workers)
+        if counts[name] != manifest["counts"][name]:
+            raise ValueError(f"Restored {counts[name]} {name} but the snapshot manifest lists {manifest['counts'][name]}")
+
+    if build_indexes:
+        import setup_database
+        print("Building indexes...")
+        setup_database.create_indexes(db)
+
+    print(f"Restored {snapshot_dir} into '{db.name}' in {time.perf_counter() - start:.2f}s: {counts}")
+    return counts
+
+
+def to_numpy(table, column):
+    """Return a column as a NumPy array, without copying when it is a single null-free chunk"""
+    chunked = table.column(column)
+    if chunked.num_chunks == 1:
+        return chunked.chunk(0).to_numpy(zero_copy_only=False)
+    return chunked.to_numpy()
+
+
+def to_pandas(table):
+    """Convert a table to pandas, letting Arrow reuse buffers where it can"""
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def object_ids(values):
+    """Convert 12-byte binary values from a snapshot back into ObjectIds"""
+    return [ObjectId(value) for value in values]
+
+
+if __name__ == "__main__":
+    import argparse
+    import database
+
+    parser = argparse.ArgumentParser(description="Export columnar snapshots of the database, or restore one")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Export players, games and sessions")
+    export_parser.add_argument("out_dir")
+    export_parser.add_argument("--format", choices=sorted(FORMATS), default="parquet")
+    export_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    restore_parser = subparsers.add_parser("restore", help="Replace players, games and sessions with a snapshot")
+    restore_parser.add_argument("snapshot_dir")
+    restore_parser.add_argument("--workers", type=int, default=RESTORE_WORKERS, help="Concurrent insert_many calls")
+    restore_parser.add_argument("--batch-size", type=int, default=RESTORE_BATCH_SIZE, help="Documents per insert_many")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_snapshot(database.get_database(), args.out_dir, args.format, args.batch_size)
+    elif args.command == "restore":
+        restore_snapshot(database.get_database("seed"), args.snapshot_dir, args.workers, args.batch_size)
@@ -191,6 +191,15 @@ if selected_game:
         # Mental Health Impact Stats
         st.markdown('<h3 class="subheader">Mental Health Impact</h3>', unsafe_allow_html=True)
         impact = analysis["mental_health_impact"]
+        confidence = analysis.get("impact_confidence") or {}
+        
+        def interval_label(kind):
+            # Raw rate with its confidence interval, so small samples are visible
+            if kind not in confidence:
+                return ""
+            level = round(confidence["level"] * 100)
+            interval = confidence[kind]
+            return f'raw {interval["rate"]:.1f}% ({level}% CI {interval["low"]:.1f}-{interval["high"]:.1f}, n={confidence["sessions"]})'
         
         cols = st.columns(3)
         with cols[0]:
@@ -198,6 +207,7 @@ if selected_game:
             <div class="stat-card positive">
                 <div class="metric-value">{impact["positive"]:.1f}%</div>
                 <div class="metric-label">Positive Impact</div>
+                <div class="metric-label">{interval_label("positive")}</div>
             </div>
             """, unsafe_allow_html=True)
         
@@ -206,6 +216,7 @@ if selected_game:
             <div class="stat-card negative">
                 <div class="metric-value">{impact["negative"]:.1f}%</div>
                 <div class="metric-label">Negative Impact</div>
+                <div class="metric-label">{interval_label("negative")}</div>
             </div>
             """, unsafe_allow_html=True)
             
@@ -214,6 +225,7 @@ if selected_game:
             <div class="stat-card neutral">
                 <div class="metric-value">{impact["neutral"]:.1f}%</div>
                 <div class="metric-label">Neutral Impact</div>
+                <div class="metric-label">{interval_label("neutral")}</div>
             </div>
             """, unsafe_allow_html=True)
         